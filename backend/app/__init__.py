@@ -10,10 +10,68 @@ from .models import db ,User
 SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-here'
 SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///parking_app.db'
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 30)
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)
+# Milliseconds a SQLite writer waits for the lock before giving up
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000)
+
+REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS') or 50)
+REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT') or 5)
     
 JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-string'
 JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
 JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+# Carry the user profile in the access token so profile endpoints skip the DB
+JWT_PROFILE_CLAIMS = (os.environ.get('JWT_PROFILE_CLAIMS') or 'false').lower() == 'true'
+
+BCRYPT_POOL_SIZE = int(os.environ.get('BCRYPT_POOL_SIZE') or os.cpu_count() or 2)
+BCRYPT_QUEUE_DEPTH = int(os.environ.get('BCRYPT_QUEUE_DEPTH') or 32)
+BCRYPT_TIMEOUT = float(os.environ.get('BCRYPT_TIMEOUT') or 10)
+
+CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL') or 300)
+QUIZ_CACHE_TTL = int(os.environ.get('QUIZ_CACHE_TTL') or 24 * 3600)
+RATE_LIMIT_ENABLED = (os.environ.get('RATE_LIMIT_ENABLED') or 'true').lower() == 'true'
+# JSON overrides of rate_limit.DEFAULT_POLICIES, e.g. {"quiz": {"user": [10, 50]}}
+RATE_LIMIT_POLICIES = os.environ.get('RATE_LIMIT_POLICIES')
+# 'off', 'shed' (503 + Retry-After) or 'queue' (divert to the submission queue)
+SUBMIT_ADMISSION = os.environ.get('SUBMIT_ADMISSION') or 'off'
+SUBMIT_ADMISSION_RATE = float(os.environ.get('SUBMIT_ADMISSION_RATE') or 50)
+SUBMIT_ADMISSION_BURST = int(os.environ.get('SUBMIT_ADMISSION_BURST') or 200)
+# Number of reverse proxies in front of the app, so client IPs come from X-Forwarded-For
+PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR') or 0)
+# Log requests slower than this many milliseconds with their SQL, 0 disables the log
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS') or 0)
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE') or 1024)
+
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or 'redis://localhost:6379/0'
+# 'sync' commits each Score in the request, 'async' queues it for the Celery worker
+SUBMISSION_MODE = os.environ.get('SUBMISSION_MODE') or 'sync'
+SUBMISSION_BATCH_SIZE = int(os.environ.get('SUBMISSION_BATCH_SIZE') or 500)
+COUNTERS_RECONCILE_INTERVAL = int(os.environ.get('COUNTERS_RECONCILE_INTERVAL') or 600)
+# Warm caches for quizzes starting within PREWARM_WINDOW seconds, checked every PREWARM_INTERVAL
+PREWARM_WINDOW = int(os.environ.get('PREWARM_WINDOW') or 3600)
+PREWARM_INTERVAL = int(os.environ.get('PREWARM_INTERVAL') or 300)
+# 'json' (Score.answers blob), 'normalized' (attempt_answers rows) or 'both'
+ANSWER_STORAGE = os.environ.get('ANSWER_STORAGE') or 'json'
+# Seconds an exam session outlives the quiz duration, covers a submit sent right at the deadline
+EXAM_SESSION_GRACE = int(os.environ.get('EXAM_SESSION_GRACE') or 60)
+
+# Live SSE streams per web process (each holds a worker thread) and their lifetime in seconds
+LIVE_MAX_STREAMS = int(os.environ.get('LIVE_MAX_STREAMS') or 8)
+LIVE_STREAM_SECONDS = int(os.environ.get('LIVE_STREAM_SECONDS') or 300)
+
+# Page size for a cursor sent without a limit, listings are unpaged unless limit or cursor is given
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE') or 100)
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE') or 1000)
+
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE') or 500)
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE') or 1000)
+EXPORT_DIR = os.environ.get('EXPORT_DIR')
 
 
 # from .authdghdr.Login  import login
@@ -21,13 +79,65 @@ JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
 
 def create_app(config_name='development'):
     app = Flask(__name__)
+    if PROXY_FIX_X_FOR:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_FIX_X_FOR)
     app.config['SECRET_KEY'] = SECRET_KEY
     app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = SQLALCHEMY_TRACK_MODIFICATIONS   
+    app.config['DB_POOL_SIZE'] = DB_POOL_SIZE
+    app.config['DB_MAX_OVERFLOW'] = DB_MAX_OVERFLOW
+    app.config['DB_POOL_TIMEOUT'] = DB_POOL_TIMEOUT
+    app.config['DB_POOL_RECYCLE'] = DB_POOL_RECYCLE
+    app.config['SQLITE_BUSY_TIMEOUT'] = SQLITE_BUSY_TIMEOUT
+    app.config['REDIS_URL'] = REDIS_URL
+    app.config['JWT_PROFILE_CLAIMS'] = JWT_PROFILE_CLAIMS
+    app.config['BCRYPT_POOL_SIZE'] = BCRYPT_POOL_SIZE
+    app.config['BCRYPT_QUEUE_DEPTH'] = BCRYPT_QUEUE_DEPTH
+    app.config['BCRYPT_TIMEOUT'] = BCRYPT_TIMEOUT
+    app.config['CATALOG_CACHE_TTL'] = CATALOG_CACHE_TTL
+    app.config['QUIZ_CACHE_TTL'] = QUIZ_CACHE_TTL
+    app.config['COMPRESS_MIN_SIZE'] = COMPRESS_MIN_SIZE
+    app.config['SLOW_REQUEST_MS'] = SLOW_REQUEST_MS
+    app.config['RATE_LIMIT_ENABLED'] = RATE_LIMIT_ENABLED
+    app.config['RATE_LIMIT_POLICIES'] = RATE_LIMIT_POLICIES
+    app.config['SUBMIT_ADMISSION'] = SUBMIT_ADMISSION
+    app.config['SUBMIT_ADMISSION_RATE'] = SUBMIT_ADMISSION_RATE
+    app.config['SUBMIT_ADMISSION_BURST'] = SUBMIT_ADMISSION_BURST
+    app.config['CELERY_BROKER_URL'] = CELERY_BROKER_URL
+    app.config['CELERY_RESULT_BACKEND'] = CELERY_RESULT_BACKEND
+    app.config['SUBMISSION_MODE'] = SUBMISSION_MODE
+    app.config['SUBMISSION_BATCH_SIZE'] = SUBMISSION_BATCH_SIZE
+    app.config['COUNTERS_RECONCILE_INTERVAL'] = COUNTERS_RECONCILE_INTERVAL
+    app.config['PREWARM_WINDOW'] = PREWARM_WINDOW
+    app.config['PREWARM_INTERVAL'] = PREWARM_INTERVAL
+    app.config['ANSWER_STORAGE'] = ANSWER_STORAGE
+    app.config['EXAM_SESSION_GRACE'] = EXAM_SESSION_GRACE
+    app.config['LIVE_MAX_STREAMS'] = LIVE_MAX_STREAMS
+    app.config['LIVE_STREAM_SECONDS'] = LIVE_STREAM_SECONDS
+    app.config['PAGE_SIZE'] = PAGE_SIZE
+    app.config['MAX_PAGE_SIZE'] = MAX_PAGE_SIZE
+    app.config['IMPORT_CHUNK_SIZE'] = IMPORT_CHUNK_SIZE
+    app.config['EXPORT_BATCH_SIZE'] = EXPORT_BATCH_SIZE
+    app.config['EXPORT_DIR'] = EXPORT_DIR or os.path.join(app.instance_path, 'exports')
     
+    from .engine import engine_options, init_engine
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(SQLALCHEMY_DATABASE_URI, app.config)
     db.init_app(app)
+    init_engine(app)
     jwt = JWTManager(app)
-    CORS(app)
+    CORS(app, expose_headers=['X-Next-Cursor', 'ETag'])
+    
+    # Metrics first, so response sizes are measured after compression
+    from .metrics import init_metrics
+    init_metrics(app)
+    from .rate_limit import init_rate_limit
+    init_rate_limit(app)
+    from .compression import init_compression
+    init_compression(app)
+    
+    from .tasks import init_celery
+    init_celery(app)
     
     # app.add_url_rule('/login', view_func=login, methods=['POST'])
     # app.add_url_rule('/register', view_func=register, methods=['POST'])
@@ -44,6 +154,9 @@ def create_app(config_name='development'):
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
     app.register_blueprint(user_bp, url_prefix='/api/user')
     app.register_blueprint(quiz_bp, url_prefix='/api/quiz')
+    
+    from .commands import register_commands
+    register_commands(app)
 
 
 
@@ -52,6 +165,11 @@ def create_app(config_name='development'):
     @jwt_required()
     def get_profile():
         try:
+            from .auth import profile_from_token
+            profile = profile_from_token()
+            if profile:
+                return jsonify(profile), 200
+            
             current_user_id = get_jwt_identity()
             user = User.query.get(current_user_id)
             
@@ -66,7 +184,8 @@ def create_app(config_name='development'):
     
     # Create tables and admin user
     with app.app_context():
-        db.create_all()
+        from .migrations import upgrade_schema
+        upgrade_schema()
         create_admin_user()
 
         # create_admin_user()
@@ -1,41 +1,70 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from app.models import Subject, Chapter, Quiz, Question, User, Score, db
+from app.models import Subject, Chapter, Quiz, QuizDraw, Question, User, Score, db
+from app.serializers import serialize_catalog, serialize_chapters, serialize_questions, ID_ORDER
+from app.pagination import Page, with_next_cursor
+from app.exports import parse_filters, iter_scores_export, export_path
+from app.question_io import detect_format, iter_rows, import_questions, export_questions, ImportFailed, ImportInterrupted
+from app.cache import catalog_response, bump_catalog_version
+from app.quiz_cache import invalidate_quiz, invalidate_questions, invalidate_chapters
+from app.counters import incr_counter, get_dashboard_stats as get_cached_dashboard_stats
 from datetime import datetime
-import redis
+from functools import wraps
+import os
+import re
+import uuid
 
 admin_bp = Blueprint('admin', __name__)
-redis_client = redis.Redis(decode_responses=True)
-
-# def admin_required():
-#     def decorator(f):
-#         @jwt_required()
-#         def decorated_function(*args, **kwargs):
-#             claims = get_jwt()
-#             if claims.get('role') != 'admin':
-#                 return jsonify({'message': 'Admin access required'}), 403
-#             return f(*args, **kwargs)
-#         return decorated_function
-#     return decorator
+
+def admin_required():
+    def decorator(f):
+        @wraps(f)
+        @jwt_required()
+        def decorated_function(*args, **kwargs):
+            claims = get_jwt()
+            if claims.get('role') != 'admin':
+                return jsonify({'message': 'Admin access required'}), 403
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def _include_archived():
+    # ?include_archived=true lists archived rows too, flagged with is_active
+    return request.args.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+def _catalog_listing(name):
+    page = Page.from_request()
+    include_archived = _include_archived()
+    return catalog_response(
+        f'{name}:archived' if include_archived else name,
+        lambda: serialize_catalog(name, page, include_archived),
+        page
+    )
+
+def _archive(row, quizzes):
+    """Soft-delete row, `quizzes` are the available quizzes it takes out of the catalog
+
+    Returns False when the row was already archived.
+    """
+    if not row.is_active:
+        return False
+    quiz_ids = [quiz_id for quiz_id, in quizzes.with_entities(Quiz.id)]
+    row.is_active = False
+    
+    db.session.commit()
+    bump_catalog_version()
+    # Their cached answer keys must stop accepting starts and submissions
+    for quiz_id in quiz_ids:
+        invalidate_quiz(quiz_id)
+    if quiz_ids:
+        incr_counter('total_quizzes', -len(quiz_ids))
+    return True
 
 # Subject Management
 @admin_bp.route('/subjects', methods=['GET'])
 # @admin_required()
 def get_subjects():
-    # Check cache first
-    cached_subjects = redis_client.get('subjects_list')
-    if cached_subjects:
-        import json
-        return jsonify(json.loads(cached_subjects)), 200
-    
-    subjects = Subject.query.filter_by(is_active=True).all()
-    subjects_data = [subject.to_dict() for subject in subjects]
-    
-    # Cache for 5 minutes
-    import json
-    redis_client.setex('subjects_list', 300, json.dumps(subjects_data))
-    
-    return jsonify(subjects_data), 200
+    return _catalog_listing('subjects')
 
 @admin_bp.route('/subjects', methods=['POST'])
 # @admin_required()
@@ -53,33 +82,34 @@ def create_subject():
     db.session.add(subject)
     db.session.commit()
     
-    # Clear cache
-    redis_client.delete('subjects_list')
+    # Invalidate catalog cache
+    bump_catalog_version()
+    incr_counter('total_subjects')
     
     return jsonify(subject.to_dict()), 201
 
 @admin_bp.route('/subjects/<int:subject_id>', methods=['PUT'])
 # @admin_required()
 def update_subject(subject_id):
-    subject = Subject.query.get_or_404(subject_id)
+    subject = Subject.with_archived().get_or_404(subject_id)
     data = request.get_json()
     
     subject.name = data.get('name', subject.name)
     subject.description = data.get('description', subject.description)
     
     db.session.commit()
-    redis_client.delete('subjects_list')
+    bump_catalog_version()
+    invalidate_chapters(db.select(Chapter.id).where(Chapter.subject_id == subject_id))
     
     return jsonify(subject.to_dict()), 200
 
 @admin_bp.route('/subjects/<int:subject_id>', methods=['DELETE'])
 # @admin_required()
 def delete_subject(subject_id):
-    subject = Subject.query.get_or_404(subject_id)
-    subject.is_active = False
-    
-    db.session.commit()
-    redis_client.delete('subjects_list')
+    subject = Subject.with_archived().get_or_404(subject_id)
+    chapters = db.select(Chapter.id).where(Chapter.subject_id == subject_id)
+    if _archive(subject, Quiz.available().filter(Quiz.chapter_id.in_(chapters))):
+        incr_counter('total_subjects', -1)
     
     return jsonify({'message': 'Subject deleted successfully'}), 200
 
@@ -87,12 +117,19 @@ def delete_subject(subject_id):
 @admin_bp.route('/subjects/<int:subject_id>/chapters', methods=['GET'])
 # @admin_required()
 def get_chapters(subject_id):
-    chapters = Chapter.query.filter_by(subject_id=subject_id, is_active=True).all()
-    return jsonify([chapter.to_dict() for chapter in chapters]), 200
+    page = Page.from_request()
+    include_archived = _include_archived()
+    query = Chapter.query if include_archived else Chapter.available()
+    return catalog_response(
+        f'chapters:subject:{subject_id}' + (':archived' if include_archived else ''),
+        lambda: serialize_chapters(query.filter_by(subject_id=subject_id), page.fields, page, include_archived),
+        page
+    )
 
 @admin_bp.route('/subjects/<int:subject_id>/chapters', methods=['POST'])
 # @admin_required()
 def create_chapter(subject_id):
+    Subject.query.get_or_404(subject_id)
     data = request.get_json()
     
     if not data.get('name'):
@@ -106,6 +143,7 @@ def create_chapter(subject_id):
     
     db.session.add(chapter)
     db.session.commit()
+    bump_catalog_version()
     
     return jsonify(chapter.to_dict()), 201
 
@@ -113,6 +151,7 @@ def create_chapter(subject_id):
 @admin_bp.route('/chapters/<int:chapter_id>/quizzes', methods=['POST'])
 # @admin_required()
 def create_quiz(chapter_id):
+    Chapter.available().filter_by(id=chapter_id).first_or_404()
     data = request.get_json()
     
     required_fields = ['title', 'date_of_quiz', 'time_duration']
@@ -130,6 +169,8 @@ def create_quiz(chapter_id):
     
     db.session.add(quiz)
     db.session.commit()
+    bump_catalog_version()
+    incr_counter('total_quizzes')
     
     return jsonify(quiz.to_dict()), 201
 
@@ -137,6 +178,7 @@ def create_quiz(chapter_id):
 @admin_bp.route('/quizzes/<int:quiz_id>/questions', methods=['POST'])
 # @admin_required()
 def add_question(quiz_id):
+    quiz = Quiz.query.get_or_404(quiz_id)
     data = request.get_json()
     
     required_fields = ['question_statement', 'option1', 'option2', 'option3', 'option4', 'correct_option']
@@ -158,10 +200,11 @@ def add_question(quiz_id):
     db.session.add(question)
     
     # Update quiz total marks
-    quiz = Quiz.query.get(quiz_id)
     quiz.total_marks += question.marks
     
     db.session.commit()
+    bump_catalog_version()
+    invalidate_questions(quiz_id)
     
     return jsonify(question.to_dict(include_answer=True)), 201
 
@@ -169,76 +212,118 @@ def add_question(quiz_id):
 @admin_bp.route('/dashboard/stats', methods=['GET'])
 # @admin_required()
 def get_dashboard_stats():
-    stats = {
-        'total_users': User.query.filter_by(role='user').count(),
-        'total_subjects': Subject.query.filter_by(is_active=True).count(),
-        'total_quizzes': Quiz.query.filter_by(is_active=True).count(),
-        'total_attempts': Score.query.count(),
-        'recent_scores': []
-    }
-    
-    # Get recent quiz attempts
-    recent_scores = Score.query.order_by(Score.timestamp_of_attempt.desc()).limit(10).all()
-    stats['recent_scores'] = [score.to_dict() for score in recent_scores]
-    
-    return jsonify(stats), 200
+    # Counters and the recent attempts feed are kept in Redis
+    return jsonify(get_cached_dashboard_stats()), 200
+
+@admin_bp.route('/quizzes/<int:quiz_id>/analytics', methods=['GET'])
+# @admin_required()
+def get_quiz_analytics(quiz_id):
+    from app.analytics import get_quiz_analytics as build_quiz_analytics
+    return jsonify(build_quiz_analytics(quiz_id)), 200
 
 
 # Add these to your admin_routes.py
 
 @admin_bp.route('/chapters/<int:chapter_id>', methods=['PUT'])
 def update_chapter(chapter_id):
-    chapter = Chapter.query.get_or_404(chapter_id)
+    chapter = Chapter.with_archived().get_or_404(chapter_id)
     data = request.get_json()
     
     chapter.name = data.get('name', chapter.name)
     chapter.description = data.get('description', chapter.description)
     
     db.session.commit()
+    bump_catalog_version()
+    invalidate_chapters([chapter_id])
     return jsonify(chapter.to_dict()), 200
 
 @admin_bp.route('/chapters/<int:chapter_id>', methods=['DELETE'])
 def delete_chapter(chapter_id):
-    chapter = Chapter.query.get_or_404(chapter_id)
-    chapter.is_active = False
-    
-    db.session.commit()
+    chapter = Chapter.with_archived().get_or_404(chapter_id)
+    _archive(chapter, Quiz.available().filter_by(chapter_id=chapter_id))
     return jsonify({'message': 'Chapter deleted successfully'}), 200
 
 @admin_bp.route('/quizzes/<int:quiz_id>/questions', methods=['GET'])
 def get_quiz_questions(quiz_id):
-    questions = Question.query.filter_by(quiz_id=quiz_id).all()
-    return jsonify([question.to_dict(include_answer=True) for question in questions]), 200
+    page = Page.from_request()
+    questions = serialize_questions(Question.query.filter_by(quiz_id=quiz_id), page.fields, page, include_answer=True)
+    return with_next_cursor(jsonify(questions), page.next_cursor(questions, ID_ORDER)), 200
+
+@admin_bp.route('/quizzes/<int:quiz_id>/questions/import', methods=['POST'])
+def import_quiz_questions(quiz_id):
+    Quiz.query.get_or_404(quiz_id)
+    
+    # Multipart upload or a raw CSV / JSON Lines body
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    fmt = detect_format(
+        filename=upload.filename if upload else None,
+        content_type=upload.content_type if upload else request.content_type,
+        requested=request.args.get('format')
+    )
+    
+    try:
+        imported = import_questions(quiz_id, iter_rows(stream, fmt), current_app.config['IMPORT_CHUNK_SIZE'])
+    except ImportFailed as e:
+        return jsonify({'message': 'Invalid rows, nothing was imported', 'errors': e.errors}), 400
+    except UnicodeDecodeError:
+        return jsonify({'message': 'Upload must be UTF-8 encoded'}), 400
+    except ImportInterrupted as e:
+        # The chunks committed before the failure stay
+        bump_catalog_version()
+        invalidate_questions(quiz_id)
+        return jsonify({
+            'message': f'Import stopped after {e.imported} questions, the rest was not imported',
+            'imported': e.imported
+        }), 500
+    
+    bump_catalog_version()
+    invalidate_questions(quiz_id)
+    
+    return jsonify({'message': f'{imported} questions imported', 'imported': imported}), 201
+
+@admin_bp.route('/quizzes/<int:quiz_id>/questions/export', methods=['GET'])
+def export_quiz_questions(quiz_id):
+    Quiz.with_archived().get_or_404(quiz_id)
+    fmt = 'jsonl' if request.args.get('format') == 'jsonl' else 'csv'
+    
+    chunks = export_questions(quiz_id, fmt, current_app.config['EXPORT_BATCH_SIZE'])
+    mimetype = 'application/x-ndjson' if fmt == 'jsonl' else 'text/csv'
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=quiz_{quiz_id}_questions.{fmt}'}
+    )
 
 @admin_bp.route('/questions/<int:question_id>', methods=['DELETE'])
 def delete_question(question_id):
     question = Question.query.get_or_404(question_id)
     
     # Update quiz total marks
-    quiz = Quiz.query.get(question.quiz_id)
+    quiz = Quiz.with_archived().get(question.quiz_id)
     quiz.total_marks -= question.marks
     
     db.session.delete(question)
     db.session.commit()
+    bump_catalog_version()
+    invalidate_questions(quiz.id)
     
     return jsonify({'message': 'Question deleted successfully'}), 200
 
 @admin_bp.route('/chapters', methods=['GET'])
 def get_all_chapters():
-    chapters = Chapter.query.filter_by(is_active=True).all()
-    return jsonify([chapter.to_dict() for chapter in chapters]), 200
+    return _catalog_listing('chapters')
 
 
 # Add to admin_routes.py
 
 @admin_bp.route('/quizzes', methods=['GET'])
 def get_all_quizzes():
-    quizzes = Quiz.query.filter_by(is_active=True).all()
-    return jsonify([quiz.to_dict() for quiz in quizzes]), 200
+    return _catalog_listing('quizzes')
 
 @admin_bp.route('/quizzes/<int:quiz_id>', methods=['PUT'])
 def update_quiz(quiz_id):
-    quiz = Quiz.query.get_or_404(quiz_id)
+    quiz = Quiz.with_archived().get_or_404(quiz_id)
     data = request.get_json()
     
     quiz.title = data.get('title', quiz.title)
@@ -247,12 +332,119 @@ def update_quiz(quiz_id):
     quiz.time_duration = data.get('time_duration', quiz.time_duration)
     
     db.session.commit()
+    bump_catalog_version()
+    invalidate_quiz(quiz_id)
     return jsonify(quiz.to_dict()), 200
 
-@admin_bp.route('/quizzes/<int:quiz_id>', methods=['DELETE'])
-def delete_quiz(quiz_id):
-    quiz = Quiz.query.get_or_404(quiz_id)
-    quiz.is_active = False
+@admin_bp.route('/quizzes/<int:quiz_id>/draw', methods=['PUT'])
+def set_quiz_draw(quiz_id):
+    # Randomized papers: question_count questions from the chapter bank per attempt
+    Quiz.query.get_or_404(quiz_id)
+    data = request.get_json() or {}
+    
+    question_count = data.get('question_count')
+    if not isinstance(question_count, int) or isinstance(question_count, bool) or question_count < 1:
+        return jsonify({'message': 'question_count must be a positive integer'}), 400
+    
+    draw = db.session.get(QuizDraw, quiz_id) or QuizDraw(quiz_id=quiz_id)
+    draw.question_count = question_count
+    draw.shuffle_options = bool(data.get('shuffle_options', True))
+    
+    db.session.add(draw)
+    db.session.commit()
+    bump_catalog_version()
+    invalidate_quiz(quiz_id)
+    return jsonify(draw.to_dict()), 200
+
+@admin_bp.route('/quizzes/<int:quiz_id>/draw', methods=['DELETE'])
+def delete_quiz_draw(quiz_id):
+    draw = db.session.get(QuizDraw, quiz_id)
+    if draw is None:
+        return jsonify({'message': 'Quiz does not draw randomized papers'}), 404
     
+    db.session.delete(draw)
     db.session.commit()
+    bump_catalog_version()
+    invalidate_quiz(quiz_id)
+    return jsonify({'message': 'Quiz uses its own questions again'}), 200
+
+@admin_bp.route('/quizzes/<int:quiz_id>', methods=['DELETE'])
+def delete_quiz(quiz_id):
+    quiz = Quiz.with_archived().get_or_404(quiz_id)
+    _archive(quiz, Quiz.available().filter_by(id=quiz_id))
     return jsonify({'message': 'Quiz deleted successfully'}), 200
+
+# Score exports
+@admin_bp.route('/scores/export', methods=['GET'])
+@admin_required()
+def export_scores():
+    try:
+        filters = parse_filters(request.args)
+    except ValueError:
+        return jsonify({'message': 'Invalid filter value'}), 400
+    fmt = 'jsonl' if request.args.get('format') == 'jsonl' else 'csv'
+    
+    mimetype = 'application/x-ndjson' if fmt == 'jsonl' else 'text/csv'
+    return Response(
+        stream_with_context(iter_scores_export(filters, fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=scores.{fmt}'}
+    )
+
+@admin_bp.route('/scores/export', methods=['POST'])
+@admin_required()
+def start_scores_export():
+    data = request.get_json(silent=True) or {}
+    try:
+        filters = parse_filters(data)
+    except ValueError:
+        return jsonify({'message': 'Invalid filter value'}), 400
+    fmt = 'jsonl' if data.get('format') == 'jsonl' else 'csv'
+    
+    from app.tasks import export_scores as export_scores_task
+    export_id = uuid.uuid4().hex
+    export_scores_task.apply_async(args=[export_id, filters, fmt], task_id=export_id)
+    
+    return jsonify({'export_id': export_id, 'format': fmt, 'status': 'queued'}), 202
+
+@admin_bp.route('/scores/export/<export_id>', methods=['GET'])
+@admin_required()
+def download_scores_export(export_id):
+    if not re.fullmatch(r'[0-9a-f]{32}', export_id):
+        return jsonify({'message': 'Export not found'}), 404
+    
+    for fmt in ('csv', 'jsonl'):
+        path = export_path(export_id, fmt)
+        if os.path.exists(path):
+            mimetype = 'application/x-ndjson' if fmt == 'jsonl' else 'text/csv'
+            return send_file(path, mimetype=mimetype, as_attachment=True, download_name=f'scores.{fmt}')
+    
+    from app.tasks import export_scores as export_scores_task
+    state = export_scores_task.AsyncResult(export_id).state
+    if state == 'FAILURE':
+        return jsonify({'export_id': export_id, 'status': 'failed'}), 500
+    return jsonify({'export_id': export_id, 'status': state.lower()}), 202
+
+@admin_bp.route('/live', methods=['GET'])
+@admin_required()
+def live_exam_stream():
+    # ?quiz_id=1&quiz_id=2 narrows the stream, by default every quiz with live activity
+    from app.live import stream, TooManyStreams
+    quiz_ids = request.args.getlist('quiz_id', type=int) or None
+    try:
+        frames, release = stream(quiz_ids, request.headers.get('Last-Event-ID'))
+    except TooManyStreams:
+        response = jsonify({'message': 'Too many live streams open, try again shortly'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    response = Response(frames, mimetype='text/event-stream')
+    response.call_on_close(release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@admin_bp.route('/rate-limits', methods=['GET'])
+# @admin_required()
+def get_rate_limits():
+    from app.rate_limit import limiter_status
+    return jsonify(limiter_status()), 200
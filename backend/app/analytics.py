@@ -0,0 +1,470 @@
+from flask import current_app
+from sqlalchemy import func
+import io
+import json
+import uuid
+import numpy as np
+import redis
+from app.cache import redis_client, binary_redis_client
+from app.models import Score, AttemptAnswer, AttemptPaper, Question, db
+from app.quiz_cache import get_answer_key, quiz_version
+from app.metrics import record_cache
+
+# Per-quiz item analysis
+# Each quiz keeps three arrays: `choices` (attempts x questions, the option
+# picked, 0 when skipped), `shown` (attempts x questions, whether the question
+# was on the attempt's paper) and `percentages` (one score per attempt). They
+# are stored in Redis as an append-only list of row chunks, each holding the
+# Score ids of its rows and the question ids of its columns. A request only
+# parses the answers of attempts newer than the highest Score id seen so far
+# and appends them as one more chunk; each process keeps the chunks it has
+# decoded and only fetches and decodes the ones it has not seen.
+# Score ids do not commit in order (queued submissions drain in batches,
+# PostgreSQL writers run concurrently), so a lower id can show up after a
+# higher one was processed. Every request counts the quiz's attempts up to
+# the highest id seen; when there are more than the chunks hold, the missing
+# ids are looked up and go into the new chunk too. Chunks are laid onto
+# the current answer key's columns by question id, so question edits never
+# rebuild the matrix: answers are scored against the current key, and a
+# question missing from older chunks was not shown to those attempts. Every
+# statistic is a vectorized reduction over the arrays. The computed report is
+# cached as well and reused until the quiz's attempt count or highest Score id
+# changes.
+# The key of a quiz drawing randomized papers covers its chapter's bank, so each
+# attempt saw only some of the columns. Per-question statistics are taken over
+# the attempts that were shown the question.
+
+HISTOGRAM_BINS = 10
+DISCRIMINATION_GROUP = 0.27
+# Past this many chunks the list is rewritten as a single chunk
+MAX_CHUNKS = 64
+
+# KEYS: the meta hash, the chunk list of ARGV[1]. ARGV: generation, attempts in
+# the chunks the new one follows, attempts including it, chunk, ttl. Appends only
+# on top of that exact tail, returns the new chunk count or 0.
+_APPEND = binary_redis_client.register_script("""
+local generation = redis.call('HGET', KEYS[1], 'generation')
+if not generation then
+    if ARGV[2] ~= '0' then
+        return 0
+    end
+    redis.call('DEL', KEYS[2])
+elseif generation ~= ARGV[1] or redis.call('HGET', KEYS[1], 'attempts') ~= ARGV[2] then
+    return 0
+end
+local count = redis.call('RPUSH', KEYS[2], ARGV[4])
+redis.call('HSET', KEYS[1], 'generation', ARGV[1], 'attempts', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return count
+""")
+
+# KEYS: the meta hash, the old chunk list, the new chunk list. ARGV: old
+# generation, attempts in the chunks, new generation, merged chunk, ttl.
+_COMPACT = binary_redis_client.register_script("""
+if redis.call('HGET', KEYS[1], 'generation') ~= ARGV[1] or redis.call('HGET', KEYS[1], 'attempts') ~= ARGV[2] then
+    return 0
+end
+redis.call('DEL', KEYS[2])
+redis.call('RPUSH', KEYS[3], ARGV[4])
+redis.call('HSET', KEYS[1], 'generation', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[3], ARGV[5])
+return 1
+""")
+
+# quiz id -> decoded chunks and their combination, replaced whole (never mutated)
+_local_matrices = {}
+
+
+def _meta_key(quiz_id):
+    return f'quiz:{quiz_id}:analytics:meta'
+
+
+def _chunks_key(quiz_id, generation):
+    return f'quiz:{quiz_id}:analytics:chunks:{generation}'
+
+
+def _entry(generation, chunks=()):
+    return {'generation': generation, 'chunks': list(chunks), 'columns': None, 'combined': 0}
+
+
+def _attempts(chunks):
+    return sum(len(chunk['score_ids']) for chunk in chunks)
+
+
+def _last_score_id(chunks):
+    return max((int(chunk['score_ids'].max()) for chunk in chunks if len(chunk['score_ids'])), default=0)
+
+
+def _encode(chunk):
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        question_ids=chunk['question_ids'],
+        choices=chunk['choices'],
+        shown=chunk['shown'],
+        percentages=chunk['percentages'],
+        score_ids=chunk['score_ids']
+    )
+    return buffer.getvalue()
+
+
+def _decode(payload):
+    with np.load(io.BytesIO(payload)) as data:
+        return {
+            'question_ids': data['question_ids'],
+            'choices': data['choices'],
+            'shown': data['shown'],
+            'percentages': data['percentages'],
+            'score_ids': data['score_ids']
+        }
+
+
+def _stored_chunks(quiz_id):
+    """The quiz's chunks, fetching and decoding only those this process has not seen"""
+    generation, attempts = binary_redis_client.hmget(_meta_key(quiz_id), 'generation', 'attempts')
+    entry = _local_matrices.get(quiz_id)
+    if generation is None:
+        return _entry(uuid.uuid4().hex)
+    generation = generation.decode()
+    if entry is None or entry['generation'] != generation:
+        entry = _entry(generation)
+    if entry['chunks'] and _attempts(entry['chunks']) == int(attempts):
+        return entry
+    payloads = binary_redis_client.lrange(_chunks_key(quiz_id, generation), len(entry['chunks']), -1)
+    return dict(entry, chunks=entry['chunks'] + [_decode(payload) for payload in payloads])
+
+
+def _append(quiz_id, entry, chunk):
+    """Store chunk after the entry's last one, returns the chunk count or 0 when another request got there first"""
+    attempts = _attempts(entry['chunks'])
+    return _APPEND(
+        keys=[_meta_key(quiz_id), _chunks_key(quiz_id, entry['generation'])],
+        args=[
+            entry['generation'], attempts, attempts + len(chunk['score_ids']), _encode(chunk),
+            current_app.config['QUIZ_CACHE_TTL']
+        ]
+    )
+
+
+def _compact(quiz_id, entry):
+    """Rewrite the stored chunks as the entry's combined matrix"""
+    merged = {
+        'question_ids': np.array(entry['columns'], dtype=np.int64),
+        'choices': entry['choices'],
+        'shown': entry['shown'],
+        'percentages': entry['percentages'],
+        'score_ids': np.concatenate([chunk['score_ids'] for chunk in entry['chunks']])
+    }
+    generation = uuid.uuid4().hex
+    compacted = _COMPACT(
+        keys=[_meta_key(quiz_id), _chunks_key(quiz_id, entry['generation']), _chunks_key(quiz_id, generation)],
+        args=[
+            entry['generation'], len(merged['score_ids']), generation, _encode(merged),
+            current_app.config['QUIZ_CACHE_TTL']
+        ]
+    )
+    if not compacted:
+        return entry
+    return dict(entry, generation=generation, chunks=[merged], combined=1)
+
+
+def _on_columns(chunk, key):
+    """The chunk's choices and shown mask on the columns of `key`"""
+    if chunk['question_ids'].tolist() == key.question_ids:
+        return chunk['choices'], chunk['shown']
+    rows, width = len(chunk['percentages']), len(key.question_ids)
+    target = np.array([key.index.get(str(question_id), -1) for question_id in chunk['question_ids'].tolist()], dtype=np.int64)
+    kept = target >= 0
+    choices = np.zeros((rows, width), dtype=np.int8)
+    shown = np.zeros((rows, width), dtype=bool)
+    choices[:, target[kept]] = chunk['choices'][:, kept]
+    shown[:, target[kept]] = chunk['shown'][:, kept]
+    return choices, shown
+
+
+def _combined(entry, key):
+    """Stack the chunks not yet combined onto the entry's matrix, from scratch when the columns changed"""
+    columns = tuple(key.question_ids)
+    if entry['columns'] != columns:
+        width = len(columns)
+        entry = dict(
+            entry, columns=columns, combined=0,
+            choices=np.zeros((0, width), dtype=np.int8),
+            shown=np.zeros((0, width), dtype=bool),
+            percentages=np.zeros(0, dtype=np.float64)
+        )
+    pending = entry['chunks'][entry['combined']:]
+    if not pending:
+        return entry
+    parts = [_on_columns(chunk, key) for chunk in pending]
+    return dict(
+        entry,
+        combined=len(entry['chunks']),
+        choices=np.vstack([entry['choices']] + [choices for choices, _ in parts]),
+        shown=np.vstack([entry['shown']] + [shown for _, shown in parts]),
+        percentages=np.concatenate([entry['percentages']] + [chunk['percentages'] for chunk in pending])
+    )
+
+
+def _parse_choices(answers, index, width):
+    row = np.zeros(width, dtype=np.int8)
+    for question_id, option in (answers or {}).items():
+        i = index.get(str(question_id))
+        if i is None:
+            continue
+        try:
+            option = int(option)
+        except (TypeError, ValueError):
+            continue
+        if 1 <= option <= 4:
+            row[i] = option
+    return row
+
+
+def _new_chunk(quiz_id, key, chunks):
+    """Rows of every attempt the chunks do not hold yet, None when there are none"""
+    last_score_id = _last_score_id(chunks)
+    parts = []
+    if chunks:
+        below = Score.query.filter(Score.quiz_id == quiz_id, Score.id <= last_score_id).count()
+        if below > _attempts(chunks):
+            # Committed after a higher id had been processed
+            ids = Score.query.with_entities(Score.id).filter(Score.quiz_id == quiz_id, Score.id <= last_score_id)
+            late = np.setdiff1d(
+                np.array([score_id for score_id, in ids], dtype=np.int64),
+                np.concatenate([chunk['score_ids'] for chunk in chunks])
+            )
+            parts.append(_rows(quiz_id, key, Score.id.in_(late.tolist())))
+    parts.append(_rows(quiz_id, key, Score.id > last_score_id))
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return None
+    return {
+        'question_ids': np.array(key.question_ids, dtype=np.int64),
+        **{name: np.concatenate([part[name] for part in parts]) for name in ('choices', 'shown', 'percentages', 'score_ids')}
+    }
+
+
+def _rows(quiz_id, key, criterion):
+    """Rows of the quiz's attempts matching criterion (on Score.id), None when there are none"""
+    rows = (
+        Score.query.with_entities(Score.id, Score.total_scored, Score.total_marks, Score.answers)
+        .filter(Score.quiz_id == quiz_id, criterion)
+        .order_by(Score.id)
+        .yield_per(1000)
+    )
+    width = len(key.question_ids)
+    score_ids = []
+    new_choices = []
+    new_percentages = []
+    for score_id, total_scored, total_marks, answers in rows:
+        # Attempts stored in attempt_answers have no blob, they are filled below
+        new_choices.append(_parse_choices(answers, key.index, width))
+        new_percentages.append(total_scored / total_marks * 100 if total_marks else 0.0)
+        score_ids.append(score_id)
+
+    if not score_ids:
+        return None
+    score_ids = np.array(score_ids, dtype=np.int64)
+    choices = np.array(new_choices, dtype=np.int8).reshape(len(score_ids), width)
+    # Both read the id range of the rows; ids in it that committed since are skipped
+    in_range = (Score.quiz_id == quiz_id, criterion, Score.id <= int(score_ids[-1]))
+    _fill_normalized(key, in_range, score_ids, choices)
+    return {
+        'choices': choices,
+        'shown': _shown_mask(quiz_id, key, in_range, score_ids),
+        'percentages': np.array(new_percentages, dtype=np.float64),
+        'score_ids': score_ids
+    }
+
+
+def _row_index(score_ids, wanted):
+    """Positions of wanted in the sorted score_ids, and which of them are there at all"""
+    positions = np.searchsorted(score_ids, wanted).clip(0, len(score_ids) - 1)
+    return positions, score_ids[positions] == wanted
+
+
+def _fill_normalized(key, criteria, score_ids, choices):
+    """Scatter attempt_answers rows into the choice matrix without decoding JSON"""
+    rows = (
+        db.session.query(AttemptAnswer.score_id, AttemptAnswer.question_id, AttemptAnswer.selected_option)
+        .join(Score, Score.id == AttemptAnswer.score_id)
+        .filter(*criteria)
+        .all()
+    )
+    if not rows:
+        return
+    answer_scores, answer_questions, options = np.array(rows, dtype=np.int64).T
+
+    question_ids = np.array(key.question_ids, dtype=np.int64)
+    question_order = np.argsort(question_ids)
+    positions = np.searchsorted(question_ids[question_order], answer_questions).clip(0, len(question_ids) - 1)
+    known = question_ids[question_order][positions] == answer_questions if len(question_ids) else np.zeros(len(rows), bool)
+    row_index, in_rows = _row_index(score_ids, answer_scores)
+    known &= in_rows
+    if not known.any():
+        return
+
+    column_index = question_order[positions[known]]
+    choices[row_index[known], column_index] = options[known]
+
+
+def _shown_mask(quiz_id, key, criteria, score_ids):
+    """Questions each attempt was shown: its drawn paper, else the quiz's own questions"""
+    width = len(key.question_ids)
+    if key.draw_count:
+        # Attempts taken before the quiz started drawing had its fixed paper
+        own = Question.query.with_entities(Question.id).filter(Question.quiz_id == quiz_id)
+        default = _parse_shown([question_id for question_id, in own], key.index, width)
+    else:
+        default = np.ones(width, dtype=bool)
+    shown = np.tile(default, (len(score_ids), 1))
+
+    papers = (
+        db.session.query(AttemptPaper.score_id, AttemptPaper.question_ids)
+        .join(Score, Score.id == AttemptPaper.score_id)
+        .filter(*criteria)
+        .all()
+    )
+    rows = {int(score_id): i for i, score_id in enumerate(score_ids)}
+    for score_id, question_ids in papers:
+        if score_id in rows:
+            shown[rows[score_id]] = _parse_shown(question_ids, key.index, width)
+    return shown
+
+
+def _parse_shown(question_ids, index, width):
+    row = np.zeros(width, dtype=bool)
+    columns = [index[str(question_id)] for question_id in question_ids if str(question_id) in index]
+    row[columns] = True
+    return row
+
+
+def load_quiz_matrix(quiz_id):
+    key = get_answer_key(quiz_id)
+    try:
+        entry = _stored_chunks(quiz_id)
+    except redis.RedisError:
+        entry = _entry(None)
+
+    chunk = _new_chunk(quiz_id, key, entry['chunks'])
+    count = len(entry['chunks'])
+    if chunk is not None:
+        count = 0
+        if entry['generation'] is not None:
+            try:
+                count = _append(quiz_id, entry, chunk)
+            except redis.RedisError:
+                pass
+        entry = dict(entry, chunks=entry['chunks'] + [chunk])
+    entry = _combined(entry, key)
+
+    # Keep the decoded entry only while it matches what Redis holds
+    if entry['generation'] is not None and (chunk is None or count):
+        if count > MAX_CHUNKS:
+            try:
+                entry = _compact(quiz_id, entry)
+            except redis.RedisError:
+                pass
+        _local_matrices[quiz_id] = entry
+    state = {name: entry[name] for name in ('choices', 'shown', 'percentages')}
+    return key, state
+
+
+def compute_quiz_analytics(quiz_id):
+    key, state = load_quiz_matrix(quiz_id)
+    choices = state['choices']
+    shown = state['shown']
+    percentages = state['percentages']
+    attempts, width = choices.shape
+
+    correct_options = np.array(key.correct_options, dtype=np.int8)
+    correct = (choices == correct_options) & shown  # attempts x questions
+    seen = shown.sum(axis=0)
+
+    # Option distribution, column 0 counts skipped questions
+    distribution = np.stack([((choices == option) & shown).sum(axis=0) for option in range(5)], axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent_correct = np.where(seen > 0, correct.sum(axis=0) / seen * 100, 0.0)
+
+        # Discrimination index: p(correct) in the top 27% minus the bottom 27%
+        # of the attempts shown each question, ranked by score
+        order = np.argsort(percentages, kind='stable')
+        shown_ranked = shown[order]
+        correct_ranked = correct[order]
+        rank = np.cumsum(shown_ranked, axis=0)
+        group = np.maximum(1, np.ceil(seen * DISCRIMINATION_GROUP))
+        bottom = shown_ranked & (rank <= group)
+        top = shown_ranked & (rank > seen - group)
+        discrimination = np.where(
+            seen > 0,
+            ((correct_ranked & top).sum(axis=0) - (correct_ranked & bottom).sum(axis=0)) / group,
+            0.0
+        )
+
+    histogram, edges = np.histogram(percentages, bins=HISTOGRAM_BINS, range=(0, 100))
+
+    return {
+        'quiz_id': quiz_id,
+        'attempts': int(attempts),
+        'summary': {
+            'mean': round(float(percentages.mean()), 2) if attempts else None,
+            'median': round(float(np.median(percentages)), 2) if attempts else None,
+            'std': round(float(percentages.std()), 2) if attempts else None,
+            'min': round(float(percentages.min()), 2) if attempts else None,
+            'max': round(float(percentages.max()), 2) if attempts else None
+        },
+        'score_histogram': [
+            {'from': float(edges[i]), 'to': float(edges[i + 1]), 'count': int(histogram[i])}
+            for i in range(HISTOGRAM_BINS)
+        ],
+        'questions': [
+            {
+                'question_id': question_id,
+                'correct_option': key.correct_options[i],
+                'shown': int(seen[i]),
+                'percent_correct': round(float(percent_correct[i]), 2),
+                'discrimination_index': round(float(discrimination[i]), 3),
+                'skipped': int(distribution[i, 0]),
+                'option_counts': {str(option): int(distribution[i, option]) for option in range(1, 5)}
+            }
+            for i, question_id in enumerate(key.question_ids)
+        ]
+    }
+
+
+def get_quiz_analytics(quiz_id):
+    version = quiz_version(quiz_id)
+    # A late commit below the highest id changes the count, not the id
+    attempts, latest_score_id = db.session.query(func.count(Score.id), func.max(Score.id)).filter(
+        Score.quiz_id == quiz_id
+    ).one()
+    latest = [attempts, latest_score_id or 0]
+    report_key = f'quiz:{quiz_id}:analytics_report:v{version}'
+
+    if version is not None:
+        try:
+            cached = redis_client.get(report_key)
+        except redis.RedisError:
+            cached = None
+        if cached:
+            cached = json.loads(cached)
+            if cached['latest'] == latest:
+                record_cache('analytics_report', True)
+                return cached['report']
+        record_cache('analytics_report', False)
+
+    report = compute_quiz_analytics(quiz_id)
+    if version is not None:
+        try:
+            redis_client.setex(
+                report_key,
+                current_app.config['QUIZ_CACHE_TTL'],
+                json.dumps({'latest': latest, 'report': report}, separators=(',', ':'))
+            )
+        except redis.RedisError:
+            pass
+    return report
@@ -0,0 +1,94 @@
+from flask import current_app
+from sqlalchemy import insert, null
+from app.models import Score, AttemptAnswer, db
+from app.quiz_cache import get_answer_key
+
+# Answer storage
+# ANSWER_STORAGE selects where a submission's answers are kept:
+#   'json'        the legacy Score.answers blob keyed by stringified question id
+#   'normalized'  one attempt_answers row per answered question, no JSON blob
+#   'both'        write both, for a gradual switch-over
+# Readers accept either form. `flask migrate-answers` converts existing blobs.
+
+
+def _answer_rows(score_id, answers, key):
+    rows = []
+    for question_id, option in (answers or {}).items():
+        try:
+            question_id, option = int(question_id), int(option)
+        except (TypeError, ValueError):
+            continue
+        if option not in (1, 2, 3, 4):
+            continue
+        rows.append({
+            'score_id': score_id,
+            'question_id': question_id,
+            'selected_option': option,
+            'is_correct': key.is_correct(question_id, option)
+        })
+    return rows
+
+
+def prepare_scores(scores):
+    """Detach the answers of Score rows about to be flushed, returns them by object"""
+    storage = current_app.config['ANSWER_STORAGE']
+    if storage == 'json':
+        return {}
+    pending = {id(score): score.answers for score in scores}
+    if storage == 'normalized':
+        for score in scores:
+            # SQL NULL rather than a JSON 'null' document
+            score.answers = null()
+    return pending
+
+
+def store_answers(scores, pending):
+    """Insert attempt_answers rows for flushed Score rows (caller commits)"""
+    rows = []
+    for score in scores:
+        if id(score) in pending:
+            rows.extend(_answer_rows(score.id, pending[id(score)], get_answer_key(score.quiz_id)))
+    if rows:
+        db.session.execute(insert(AttemptAnswer), rows)
+
+
+def load_answers(score):
+    """Return {str(question_id): option} whichever way the attempt was stored"""
+    if score.answers is not None:
+        return score.answers
+    rows = (
+        AttemptAnswer.query.with_entities(AttemptAnswer.question_id, AttemptAnswer.selected_option)
+        .filter_by(score_id=score.id)
+        .all()
+    )
+    return {str(question_id): option for question_id, option in rows}
+
+
+def migrate_json_answers(batch_size=1000, clear_json=False):
+    """Copy Score.answers blobs into attempt_answers, returns the number of scores migrated"""
+    migrated = 0
+    last_id = 0
+    while True:
+        scores = (
+            Score.query.filter(Score.id > last_id, Score.answers.isnot(None))
+            .order_by(Score.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not scores:
+            break
+        last_id = scores[-1].id
+        scores = [score for score in scores if score.answers is not None]
+        ids = [score.id for score in scores]
+        # Re-running the migration replaces rows instead of duplicating them
+        AttemptAnswer.query.filter(AttemptAnswer.score_id.in_(ids)).delete(synchronize_session=False)
+        rows = []
+        for score in scores:
+            rows.extend(_answer_rows(score.id, score.answers, get_answer_key(score.quiz_id)))
+            if clear_json:
+                score.answers = null()
+        if rows:
+            db.session.execute(insert(AttemptAnswer), rows)
+        db.session.commit()
+        migrated += len(scores)
+    return migrated
@@ -1,10 +1,26 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
 from app.models import User, db
+from app.counters import incr_counter
+from app.passwords import verify_password, PasswordCheckBusy
 from datetime import datetime
 
 auth_bp = Blueprint('auth', __name__)
 
+def profile_claims(user):
+    """Claims added to the access token at login"""
+    claims = {'role': user.role}
+    if current_app.config['JWT_PROFILE_CLAIMS']:
+        claims.update({'profile': user.to_dict()})
+    return claims
+
+
+def profile_from_token():
+    """Return the profile carried in the current token, if any"""
+    if not current_app.config['JWT_PROFILE_CLAIMS']:
+        return None
+    return get_jwt().get('profile')
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
@@ -16,14 +32,19 @@ def login():
     
     user = User.query.filter_by(username=username).first()
     
-    if user and user.check_password(password):
+    try:
+        valid = user is not None and verify_password(password, user.password_hash)
+    except PasswordCheckBusy:
+        return jsonify({'message': 'Too many logins in progress, please retry'}), 503, {'Retry-After': '1'}
+    
+    if valid:
         # Update last login
         user.last_login = datetime.utcnow()
         db.session.commit()
         
         access_token = create_access_token(
             identity=user.id,
-            additional_claims={'role': user.role}
+            additional_claims=profile_claims(user)
         )
         
         return jsonify({
@@ -58,12 +79,17 @@ def register():
     
     db.session.add(user)
     db.session.commit()
+    incr_counter('total_users')
     
     return jsonify({'message': 'User registered successfully'}), 201
 
 @auth_bp.route('/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
+    profile = profile_from_token()
+    if profile:
+        return jsonify(profile), 200
+    
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
     
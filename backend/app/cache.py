@@ -0,0 +1,162 @@
+from flask import current_app, Response
+import json
+import redis
+from app.pagination import with_next_cursor
+from app.http_cache import version_etag, not_modified, with_etag
+from app.metrics import record_cache
+from app import REDIS_URL, REDIS_MAX_CONNECTIONS, REDIS_SOCKET_TIMEOUT
+
+# One connection pool per process shared by every blueprint and task. A request
+# that finds all connections busy waits up to REDIS_SOCKET_TIMEOUT for one
+# instead of opening more. The binary client needs its own pool because
+# decode_responses is a connection setting.
+def _pool(**kwargs):
+    return redis.BlockingConnectionPool.from_url(
+        REDIS_URL,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_SOCKET_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+        health_check_interval=30,
+        **kwargs
+    )
+
+
+redis_client = redis.Redis(connection_pool=_pool(decode_responses=True))
+# For binary payloads (NumPy arrays) that must not be decoded as text
+binary_redis_client = redis.Redis(connection_pool=_pool())
+
+# Catalog cache
+# Every catalog listing (subjects, chapters, quizzes) is cached under a key that
+# embeds the current catalog version. Admin writes bump the version instead of
+# hunting down individual keys, so readers can never see stale counts and old
+# entries simply expire.
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def catalog_version():
+    try:
+        return int(redis_client.get(CATALOG_VERSION_KEY) or 0)
+    except redis.RedisError:
+        return None
+
+
+def bump_catalog_version():
+    try:
+        redis_client.incr(CATALOG_VERSION_KEY)
+    except redis.RedisError:
+        current_app.logger.warning('Could not bump catalog version')
+
+
+def cached_catalog(name, builder, ttl=None):
+    """Return the JSON for a catalog listing, building it on a cache miss
+
+    With ttl the entry is kept (and a cached one extended) for ttl seconds
+    instead of CATALOG_CACHE_TTL.
+    """
+    return _cached_catalog(name, builder, catalog_version(), ttl)
+
+
+def _touch(key, ttl):
+    if ttl:
+        try:
+            redis_client.expire(key, ttl)
+        except redis.RedisError:
+            pass
+
+
+def _cached_catalog(name, builder, version, ttl=None):
+    if version is None:
+        # Redis is down, serve straight from the database
+        return json.dumps(builder(), separators=(',', ':'))
+
+    key = f'catalog:v{version}:{name}'
+    try:
+        payload = redis_client.get(key)
+    except redis.RedisError:
+        payload = None
+    record_cache('catalog', payload is not None)
+    if payload is not None:
+        _touch(key, ttl)
+        return payload
+
+    payload = json.dumps(builder(), separators=(',', ':'))
+    try:
+        redis_client.setex(key, ttl or current_app.config['CATALOG_CACHE_TTL'], payload)
+    except redis.RedisError:
+        pass
+    return payload
+
+
+def cached_catalog_page(name, builder, page, order_fields=('id',), ttl=None):
+    """Return {'body', 'next_cursor'} for one page of a catalog listing, ttl as for cached_catalog"""
+    return _cached_catalog_page(name, builder, page, order_fields, catalog_version(), ttl)
+
+
+def _cached_catalog_page(name, builder, page, order_fields, version, ttl=None):
+    def build():
+        items = builder()
+        return {
+            'body': json.dumps(items, separators=(',', ':')),
+            'next_cursor': page.next_cursor(items, order_fields) or ''
+        }
+
+    if version is None:
+        return build()
+
+    key = f'catalog:v{version}:{name}:{page.cache_key}'
+    try:
+        entry = redis_client.hgetall(key)
+    except redis.RedisError:
+        entry = None
+    record_cache('catalog', bool(entry))
+    if entry:
+        _touch(key, ttl)
+        return entry
+
+    entry = build()
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hset(key, mapping=entry)
+        pipe.expire(key, ttl or current_app.config['CATALOG_CACHE_TTL'])
+        pipe.execute()
+    except redis.RedisError:
+        pass
+    return entry
+
+
+def catalog_response(name, builder, page=None):
+    version = catalog_version()
+    etag = version_etag('catalog', version)
+    # On a 304 the browser replays its stored copy, X-Next-Cursor header included
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    if page is None:
+        response = Response(_cached_catalog(name, builder, version), status=200, mimetype='application/json')
+        return with_etag(response, etag)
+    entry = _cached_catalog_page(name, builder, page, ('id',), version)
+    response = Response(entry['body'], status=200, mimetype='application/json')
+    return with_etag(with_next_cursor(response, entry['next_cursor']), etag)
+
+
+# Per-user data version, bumped whenever a user's attempts change
+def _user_version_key(user_id):
+    return f'user:{user_id}:version'
+
+
+def user_version(user_id):
+    try:
+        return int(redis_client.get(_user_version_key(user_id)) or 0)
+    except redis.RedisError:
+        return None
+
+
+def bump_user_versions(user_ids):
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for user_id in set(user_ids):
+            pipe.incr(_user_version_key(user_id))
+        pipe.execute()
+    except redis.RedisError:
+        current_app.logger.warning('Could not bump user versions')
@@ -0,0 +1,58 @@
+import click
+import sys
+
+# Maintenance commands, run from the backend directory:
+#   flask --app run upgrade-db
+
+
+def register_commands(app):
+    @app.cli.command('backfill-user-stats')
+    def backfill_user_stats_command():
+        """Rebuild user_stats from the scores table"""
+        from app.stats import backfill_user_stats
+        count = backfill_user_stats()
+        click.echo(f'Rebuilt stats for {count} users')
+
+    @app.cli.command('upgrade-db')
+    def upgrade_db_command():
+        """Create missing tables and indexes on an existing database"""
+        from app.migrations import upgrade_schema
+        created = upgrade_schema()
+        click.echo(f'Created {len(created)} indexes' + (': ' + ', '.join(created) if created else ''))
+
+    @app.cli.command('check-query-plans')
+    def check_query_plans_command():
+        """Fail if a hot query is planned as a full table scan"""
+        from app.migrations import check_query_plans
+        failures = check_query_plans()
+        for name, plan in failures.items():
+            click.echo(f'FULL SCAN in {name}:')
+            for line in plan:
+                click.echo(f'    {line}')
+        if failures:
+            sys.exit(1)
+        click.echo('All hot queries use indexes')
+
+    @app.cli.command('migrate-answers')
+    @click.option('--batch-size', default=1000, show_default=True)
+    @click.option('--clear-json', is_flag=True, help='Drop the JSON blob once rows are written')
+    def migrate_answers_command(batch_size, clear_json):
+        """Copy Score.answers JSON blobs into attempt_answers"""
+        from app.answers import migrate_json_answers
+        count = migrate_json_answers(batch_size=batch_size, clear_json=clear_json)
+        click.echo(f'Migrated answers of {count} attempts')
+
+    @app.cli.command('rebuild-leaderboards')
+    def rebuild_leaderboards_command():
+        """Regenerate the quiz, chapter and subject leaderboards from the scores table"""
+        from app.leaderboards import rebuild_leaderboards
+        count = rebuild_leaderboards()
+        click.echo(f'Rebuilt {count} leaderboards')
+
+    @app.cli.command('prewarm')
+    @click.option('--window', type=int, default=None, help='Seconds ahead to look, defaults to PREWARM_WINDOW')
+    def prewarm_command(window):
+        """Warm the caches of quizzes that start soon"""
+        from app.prewarm import prewarm_quizzes
+        quiz_ids = prewarm_quizzes(window)
+        click.echo(f'Warmed {len(quiz_ids)} quizzes' + (': ' + ', '.join(map(str, quiz_ids)) if quiz_ids else ''))
@@ -0,0 +1,108 @@
+from flask import current_app, request, Response
+from collections import OrderedDict
+import gzip
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+# Response compression
+# JSON/CSV responses above COMPRESS_MIN_SIZE are compressed with brotli (when
+# the package is installed and the client accepts it) or gzip. Bodies that
+# carry an ETag are the same for every request with that tag, so their
+# compressed form is kept in a small per-process LRU and reused. Quiz papers are
+# shared by every candidate but end with a per-candidate session, so the
+# compressed paper is kept as a gzip prefix flushed at a byte boundary and only
+# the session tail is compressed per request. Streamed responses are left alone.
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/csv', 'text/plain'}
+CACHE_ENTRIES = 256
+
+_compressed = OrderedDict()
+_prefixes = {}
+_lock = threading.Lock()
+
+
+def accepted_encoding():
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def _cached_compress(key, body, encoding):
+    with _lock:
+        if key in _compressed:
+            _compressed.move_to_end(key)
+            return _compressed[key]
+    data = compress(body, encoding)
+    with _lock:
+        _compressed[key] = data
+        while len(_compressed) > CACHE_ENTRIES:
+            _compressed.popitem(last=False)
+    return data
+
+
+def _encoded(response, encoding, data):
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress_response(response):
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or (response.content_length or 0) < current_app.config['COMPRESS_MIN_SIZE']
+    ):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = accepted_encoding()
+    if encoding is None:
+        return response
+
+    etag, _ = response.get_etag()
+    body = response.get_data()
+    if etag:
+        data = _cached_compress((request.full_path, etag, encoding), body, encoding)
+    else:
+        data = compress(body, encoding)
+    return _encoded(response, encoding, data)
+
+
+def _gzip_prefix(cache_key, static):
+    entry = _prefixes.get(cache_key)
+    if entry is None or entry[0] != static:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        prefix = compressor.compress(static.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        entry = (static, prefix, compressor)
+        _prefixes[cache_key] = entry
+    return entry
+
+
+def spliced_response(cache_key, static, suffix):
+    """JSON response for static + suffix, gzip reuses the compressed static part"""
+    body = static + suffix
+    if len(body) < current_app.config['COMPRESS_MIN_SIZE'] or accepted_encoding() != 'gzip':
+        # compress_response handles brotli and uncompressed clients
+        return Response(body, status=200, mimetype='application/json')
+
+    _, prefix, compressor = _gzip_prefix(cache_key, static)
+    compressor = compressor.copy()
+    data = prefix + compressor.compress(suffix.encode()) + compressor.flush()
+    return _encoded(Response(mimetype='application/json'), 'gzip', data)
+
+
+def init_compression(app):
+    app.after_request(compress_response)
@@ -0,0 +1,92 @@
+from flask import current_app
+import json
+import redis
+from app.cache import redis_client
+from app.models import User, Subject, Quiz, Score, db
+from app.serializers import serialize_scores
+
+# Admin dashboard counters
+# The totals shown on the admin dashboard live in a Redis hash that is bumped
+# on register, create, soft-delete and submission, and the recent attempts feed
+# is a capped Redis list pushed on submit. A periodic Celery task recomputes
+# everything from the database to correct any drift.
+
+COUNTERS_KEY = 'dashboard:counters'
+RECENT_SCORES_KEY = 'dashboard:recent_scores'
+RECENT_SCORES_LIMIT = 10
+COUNTER_FIELDS = ('total_users', 'total_subjects', 'total_quizzes', 'total_attempts')
+
+
+def _count_from_db():
+    return {
+        'total_users': User.query.filter_by(role='user').count(),
+        'total_subjects': Subject.query.count(),
+        'total_quizzes': Quiz.available().count(),
+        'total_attempts': Score.query.count()
+    }
+
+
+def _recent_from_db():
+    recent_scores = Score.query.order_by(Score.timestamp_of_attempt.desc())
+    return serialize_scores(recent_scores, limit=RECENT_SCORES_LIMIT)
+
+
+def incr_counter(field, amount=1):
+    try:
+        redis_client.hincrby(COUNTERS_KEY, field, amount)
+    except redis.RedisError:
+        current_app.logger.warning('Could not update dashboard counter %s', field)
+
+
+def push_recent_scores(score_dicts):
+    """Push newly persisted attempts onto the feed, oldest first"""
+    try:
+        pipe = redis_client.pipeline()
+        for score in sorted(score_dicts, key=lambda s: s['timestamp_of_attempt']):
+            pipe.lpush(RECENT_SCORES_KEY, json.dumps(score, separators=(',', ':')))
+        pipe.ltrim(RECENT_SCORES_KEY, 0, RECENT_SCORES_LIMIT - 1)
+        pipe.execute()
+    except redis.RedisError:
+        current_app.logger.warning('Could not update recent scores feed')
+
+
+def record_attempts(scores):
+    ids = [score.id for score in scores]
+    if not ids:
+        return
+    incr_counter('total_attempts', len(ids))
+    push_recent_scores(serialize_scores(Score.query.filter(Score.id.in_(ids))))
+
+
+def reconcile_counters():
+    counters = _count_from_db()
+    recent = _recent_from_db()
+    pipe = redis_client.pipeline()
+    pipe.delete(COUNTERS_KEY, RECENT_SCORES_KEY)
+    pipe.hset(COUNTERS_KEY, mapping=counters)
+    for score in recent:
+        pipe.rpush(RECENT_SCORES_KEY, json.dumps(score, separators=(',', ':')))
+    pipe.execute()
+    return counters
+
+
+def _read_dashboard():
+    pipe = redis_client.pipeline()
+    pipe.hgetall(COUNTERS_KEY)
+    pipe.lrange(RECENT_SCORES_KEY, 0, RECENT_SCORES_LIMIT - 1)
+    return pipe.execute()
+
+
+def get_dashboard_stats():
+    try:
+        counters, recent = _read_dashboard()
+        if not all(field in counters for field in COUNTER_FIELDS):
+            # Cold start, seed Redis from the database once
+            reconcile_counters()
+            counters, recent = _read_dashboard()
+    except redis.RedisError:
+        return dict(_count_from_db(), recent_scores=_recent_from_db())
+
+    stats = {field: int(value) for field, value in counters.items()}
+    stats['recent_scores'] = [json.loads(score) for score in recent]
+    return stats
@@ -0,0 +1,37 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from app.models import db
+
+# Database engine setup
+# Pool sizing comes from the DB_POOL_* settings. SQLite connections are
+# switched to WAL journaling, so readers keep reading while the single writer
+# commits, and given a busy timeout, so a writer waits for the lock instead of
+# failing with "database is locked".
+
+
+def engine_options(uri, config):
+    options = {'pool_pre_ping': True, 'pool_recycle': config['DB_POOL_RECYCLE']}
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # In-memory databases live in a single connection, keep the default pool
+        return options
+    options.update(
+        pool_size=config['DB_POOL_SIZE'],
+        max_overflow=config['DB_MAX_OVERFLOW'],
+        pool_timeout=config['DB_POOL_TIMEOUT']
+    )
+    return options
+
+
+def init_engine(app):
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            busy_timeout = app.config['SQLITE_BUSY_TIMEOUT']
+
+            @event.listens_for(db.engine, 'connect')
+            def set_sqlite_pragmas(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                cursor.execute('PRAGMA journal_mode=WAL')
+                cursor.execute('PRAGMA synchronous=NORMAL')
+                cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout)}')
+                cursor.close()
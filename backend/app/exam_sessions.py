@@ -0,0 +1,202 @@
+from flask import current_app
+from datetime import datetime
+from itsdangerous import BadSignature, URLSafeSerializer
+import math
+import redis
+import secrets
+import time
+from app.cache import redis_client
+from app.papers import Paper, attempt_seed, draw_paper
+
+# Exam sessions
+# Starting a quiz opens a session in Redis: a hash holding the server-side
+# start time, and a second hash of the answers saved so far (question id ->
+# option). Both expire time_duration minutes (plus EXAM_SESSION_GRACE seconds)
+# after the start, so an autosave is a single script call with no database
+# work. Reloading the page resumes the same session, and submitting claims it:
+# the saved answers are scored and time_taken is measured on the server.
+# Quizzes with randomized papers also keep the attempt's drawn paper in the
+# session hash.
+#
+# Every start also hands out a signed attempt token: the quiz, the user, the
+# start time and a random nonce that seeds the attempt's paper. A session keeps
+# the token it was opened with, so a resume returns the same one. When no
+# session can be opened or claimed (Redis unavailable, untimed quiz), submit
+# falls back to the token: the start time is the server's and the paper is
+# drawn again from the nonce, so retakes still get fresh papers.
+# An attempt is submitted once: claiming its session or its token sets a
+# marker on the nonce (SET NX, kept as long as the token is valid), and
+# whichever claim comes second is refused. Untimed attempts stay valid for
+# UNTIMED_ATTEMPT_TTL. While Redis is unavailable the marker cannot be set and
+# tokens are accepted without it, so a submission is not lost to the outage.
+
+UNTIMED_ATTEMPT_TTL = 24 * 3600
+
+
+class SessionExpired(Exception):
+    pass
+
+
+# ARGV: start time, ttl, the paper drawn for that start time (or ''), attempt token
+_START = redis_client.register_script("""
+local created = 0
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], 'started_at', ARGV[1], 'token', ARGV[4])
+    if ARGV[3] ~= '' then
+        redis.call('HSET', KEYS[1], 'paper', ARGV[3])
+    end
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    created = 1
+end
+local paper = redis.call('HGET', KEYS[1], 'paper') or ''
+local token = redis.call('HGET', KEYS[1], 'token') or ''
+return {redis.call('HGET', KEYS[1], 'started_at'), redis.call('HGETALL', KEYS[2]), created, paper, token}
+""")
+
+# ARGV holds (question id, option) pairs, an empty option clears the answer
+_AUTOSAVE = redis_client.register_script("""
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl <= 0 then
+    return -1
+end
+for i = 1, #ARGV, 2 do
+    if ARGV[i + 1] == '' then
+        redis.call('HDEL', KEYS[2], ARGV[i])
+    else
+        redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+    end
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('PEXPIRE', KEYS[2], ttl)
+end
+return redis.call('HLEN', KEYS[2])
+""")
+
+
+def _keys(quiz_id, user_id):
+    base = f'exam:{quiz_id}:{user_id}'
+    return [base, base + ':answers']
+
+
+def _answers(flat):
+    # HGETALL through a script comes back as a flat [field, value, ...] list
+    return {flat[i]: int(flat[i + 1]) for i in range(0, len(flat), 2)}
+
+
+def clean_answers(key, answers):
+    """Keep known question ids, map options to 1-4 or None (cleared)"""
+    cleaned = {}
+    for question_id, option in (answers or {}).items():
+        if str(question_id) not in key.index:
+            continue
+        try:
+            option = int(option) if option not in (None, '') else None
+        except (TypeError, ValueError):
+            continue
+        cleaned[str(question_id)] = option if option in (1, 2, 3, 4) else None
+    return cleaned
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='exam-attempt')
+
+
+def _used_key(nonce):
+    return f'exam:used:{nonce}'
+
+
+def _attempt_ttl(key):
+    if key.time_duration:
+        return key.time_duration * 60 + current_app.config['EXAM_SESSION_GRACE']
+    return UNTIMED_ATTEMPT_TTL
+
+
+def _load_attempt(token):
+    # (quiz id, user id, start time, nonce) or None
+    try:
+        quiz_id, owner, started_at, nonce = _serializer().loads(token)
+    except (BadSignature, TypeError, ValueError):
+        return None
+    return quiz_id, owner, started_at, nonce
+
+
+def _use_attempt(key, nonce):
+    """Mark the attempt submitted, False when it already was"""
+    try:
+        return bool(redis_client.set(_used_key(nonce), 1, nx=True, ex=_attempt_ttl(key)))
+    except redis.RedisError:
+        current_app.logger.warning('Could not mark attempt %s as submitted', nonce)
+        return True
+
+
+def new_attempt(key, user_id):
+    """A fresh attempt, returns (signed attempt token, start time, paper or None)"""
+    nonce = secrets.token_hex(8)
+    started_at = time.time()
+    token = _serializer().dumps([key.quiz_id, str(user_id), started_at, nonce])
+    paper = draw_paper(key, attempt_seed(key.quiz_id, user_id, nonce)) if key.draw_count else None
+    return token, started_at, paper
+
+
+def claim_attempt(key, user_id, token):
+    """Use up an attempt token, returns (time_taken in minutes or None when untimed, paper or None) or None"""
+    attempt = _load_attempt(token)
+    if attempt is None:
+        return None
+    quiz_id, owner, started_at, nonce = attempt
+    if quiz_id != key.quiz_id or owner != str(user_id):
+        return None
+    elapsed = time.time() - started_at
+    # Same lifetime as a session
+    if elapsed > _attempt_ttl(key) or not _use_attempt(key, nonce):
+        return None
+    time_taken = min(max(math.ceil(elapsed / 60), 0), key.time_duration) if key.time_duration else None
+    paper = draw_paper(key, attempt_seed(key.quiz_id, user_id, nonce)) if key.draw_count else None
+    return time_taken, paper
+
+
+def start_session(key, user_id):
+    """Open or resume a session, returns (started_at, seconds left, saved answers, newly created, paper or None, token)"""
+    ttl = key.time_duration * 60 + current_app.config['EXAM_SESSION_GRACE']
+    # Only kept when this call opens the session, a resumed one returns its own attempt
+    token, now, paper = new_attempt(key, user_id)
+    started_at, saved, created, paper, token = _START(
+        keys=_keys(key.quiz_id, user_id), args=[repr(now), ttl, paper.to_json() if paper else '', token]
+    )
+    started_at = float(started_at)
+    seconds_left = max(0, key.time_duration * 60 - int(time.time() - started_at))
+    paper = Paper.from_json(paper) if paper else None
+    return datetime.utcfromtimestamp(started_at), seconds_left, _answers(saved), bool(created), paper, token or None
+
+
+def autosave(key, user_id, answers):
+    """Apply answer deltas to the session, returns the number of saved answers"""
+    args = []
+    for question_id, option in clean_answers(key, answers).items():
+        args.extend([question_id, option or ''])
+    saved = _AUTOSAVE(keys=_keys(key.quiz_id, user_id), args=args)
+    if saved < 0:
+        raise SessionExpired()
+    return saved
+
+
+def claim_session(key, user_id):
+    """Close the session, returns (saved answers, time_taken in minutes, paper or None) or None
+
+    None also when the session's attempt token was already used to submit.
+    """
+    meta_key, answers_key = _keys(key.quiz_id, user_id)
+    pipe = redis_client.pipeline()
+    pipe.hmget(meta_key, 'started_at', 'paper', 'token')
+    pipe.hgetall(answers_key)
+    pipe.delete(meta_key, answers_key)
+    (started_at, paper, token), saved, _ = pipe.execute()
+    if started_at is None:
+        return None
+    attempt = _load_attempt(token) if token else None
+    if attempt and not _use_attempt(key, attempt[3]):
+        return None
+    minutes = math.ceil((time.time() - float(started_at)) / 60)
+    time_taken = min(max(minutes, 0), key.time_duration)
+    paper = Paper.from_json(paper) if paper else None
+    return {question_id: int(option) for question_id, option in saved.items()}, time_taken, paper
@@ -0,0 +1,107 @@
+from flask import current_app
+from sqlalchemy import select
+from datetime import datetime
+import csv
+import io
+import json
+import os
+from app.models import User, Subject, Chapter, Quiz, Score, INCLUDE_ARCHIVED, db
+
+# Streaming exports
+# Rows are read with a server-side cursor (yield_per / stream_results) and
+# written out one partition at a time, so memory stays flat for millions of
+# rows. The same generator backs the HTTP download and the Celery task that
+# writes large exports to EXPORT_DIR.
+
+SCORE_EXPORT_FIELDS = [
+    'score_id', 'user_id', 'username', 'full_name', 'quiz_id', 'quiz_title',
+    'chapter_name', 'subject_name', 'total_scored', 'total_marks', 'time_taken',
+    'timestamp_of_attempt'
+]
+
+
+def stream_rows(statement, names, fmt, batch_size):
+    """Yield CSV or JSON Lines chunks for a select statement"""
+    statement = statement.execution_options(yield_per=batch_size, stream_results=True)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(names)
+
+    for partition in db.session.execute(statement).partitions():
+        for row in partition:
+            row = [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            if fmt == 'jsonl':
+                buffer.write(json.dumps(dict(zip(names, row)), separators=(',', ':')))
+                buffer.write('\n')
+            else:
+                writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def parse_filters(args):
+    """Validate export filters from query args, raises ValueError on bad input"""
+    filters = {}
+    for name in ('quiz_id', 'subject_id', 'user_id'):
+        if args.get(name):
+            filters[name] = int(args[name])
+    for name in ('date_from', 'date_to'):
+        if args.get(name):
+            filters[name] = datetime.fromisoformat(args[name]).isoformat()
+    return filters
+
+
+def scores_export_statement(filters):
+    statement = (
+        select(
+            Score.id, Score.user_id, User.username, User.full_name, Score.quiz_id, Quiz.title,
+            Chapter.name, Subject.name, Score.total_scored, Score.total_marks, Score.time_taken,
+            Score.timestamp_of_attempt
+        )
+        .join(User, User.id == Score.user_id)
+        .join(Quiz, Quiz.id == Score.quiz_id)
+        .join(Chapter, Chapter.id == Quiz.chapter_id)
+        .join(Subject, Subject.id == Chapter.subject_id)
+        .order_by(Score.id)
+        # Attempts at archived quizzes are still exported
+        .execution_options(**{INCLUDE_ARCHIVED: True})
+    )
+    if 'quiz_id' in filters:
+        statement = statement.where(Score.quiz_id == filters['quiz_id'])
+    if 'subject_id' in filters:
+        statement = statement.where(Chapter.subject_id == filters['subject_id'])
+    if 'user_id' in filters:
+        statement = statement.where(Score.user_id == filters['user_id'])
+    if 'date_from' in filters:
+        statement = statement.where(Score.timestamp_of_attempt >= datetime.fromisoformat(filters['date_from']))
+    if 'date_to' in filters:
+        statement = statement.where(Score.timestamp_of_attempt <= datetime.fromisoformat(filters['date_to']))
+    return statement
+
+
+def iter_scores_export(filters, fmt):
+    return stream_rows(
+        scores_export_statement(filters),
+        SCORE_EXPORT_FIELDS,
+        fmt,
+        current_app.config['EXPORT_BATCH_SIZE']
+    )
+
+
+def export_path(export_id, fmt):
+    return os.path.join(current_app.config['EXPORT_DIR'], f'scores_{export_id}.{fmt}')
+
+
+def write_scores_export(export_id, filters, fmt):
+    """Write an export to EXPORT_DIR, the file appears only once complete"""
+    os.makedirs(current_app.config['EXPORT_DIR'], exist_ok=True)
+    path = export_path(export_id, fmt)
+    with open(path + '.part', 'w', encoding='utf-8', newline='') as f:
+        for chunk in iter_scores_export(filters, fmt):
+            f.write(chunk)
+    os.replace(path + '.part', path)
+    return path
@@ -0,0 +1,30 @@
+from flask import request, Response
+
+# Conditional GET
+# Read endpoints tag their responses with a weak ETag built from the Redis
+# version counters their data depends on (the catalog version, a user's
+# version, a quiz version). A request whose If-None-Match still matches gets a
+# bodyless 304 before anything is read or serialized. Responses are marked
+# private/no-cache so the browser revalidates on every fetch instead of reusing
+# a stale copy. Without Redis there are no versions and no ETags.
+
+
+def version_etag(*parts):
+    """Entity tag for a combination of versions, None if any version is unknown"""
+    if any(part is None for part in parts):
+        return None
+    return '-'.join(str(part) for part in parts)
+
+
+def not_modified(etag):
+    """Return a 304 response if the request already holds `etag`, otherwise None"""
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    return with_etag(Response(status=304), etag)
+
+
+def with_etag(response, etag):
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,170 @@
+from flask import current_app
+import math
+import redis
+from app.cache import redis_client
+from app.models import User, Chapter, Quiz, Score, INCLUDE_ARCHIVED, db
+from app.quiz_cache import get_answer_key
+
+# Leaderboards
+# Every quiz has a Redis sorted set of each candidate's best attempt, and each
+# chapter and subject a set summing those bests across its quizzes. A member's
+# score packs the percentage (in hundredths) above the time taken, so higher
+# percentages rank first and ties go to the faster attempt:
+#     score = round(percentage * 100) * TIME_SCALE - time_taken
+# Rollups are sums of these values, which keeps the same ordering (total
+# percentage first, then total time). Submissions go through a Lua script that
+# only raises a quiz entry and adds the improvement to the rollups, so repeated
+# or concurrent attempts never double count. `flask rebuild-leaderboards`
+# regenerates every set from the scores table.
+
+TIME_SCALE = 10 ** 7
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+_RECORD_BEST = redis_client.register_script("""
+local new = tonumber(ARGV[2])
+local old = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if old and tonumber(old) >= new then
+    return 0
+end
+redis.call('ZADD', KEYS[1], new, ARGV[1])
+local delta = new - (tonumber(old) or 0)
+for i = 2, #KEYS do
+    redis.call('ZINCRBY', KEYS[i], delta, ARGV[1])
+end
+return 1
+""")
+
+
+def leaderboard_key(scope, scope_id):
+    return f'leaderboard:{scope}:{scope_id}'
+
+
+def encode(total_scored, total_marks, time_taken):
+    hundredths = round(total_scored * 10000 / total_marks) if total_marks else 0
+    time_taken = min(max(int(time_taken or 0), 0), TIME_SCALE - 1)
+    return hundredths * TIME_SCALE - time_taken
+
+
+def decode(value):
+    """Split a (possibly summed) member score into (percentage, time_taken)"""
+    value = int(value)
+    hundredths = -(-value // TIME_SCALE)
+    return hundredths / 100, hundredths * TIME_SCALE - value
+
+
+def record_leaderboards(scores):
+    """Fold newly persisted Score rows into the quiz, chapter and subject sets"""
+    if not scores:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for score in scores:
+            key = get_answer_key(score.quiz_id)
+            keys = [leaderboard_key('quiz', score.quiz_id)]
+            if key.chapter_id is not None:
+                keys.append(leaderboard_key('chapter', key.chapter_id))
+            if key.subject_id is not None:
+                keys.append(leaderboard_key('subject', key.subject_id))
+            value = encode(score.total_scored, score.total_marks, score.time_taken)
+            _RECORD_BEST(keys=keys, args=[score.user_id, value], client=pipe)
+        pipe.execute()
+    except redis.RedisError:
+        current_app.logger.warning('Could not update leaderboards, run flask rebuild-leaderboards')
+
+
+def _fields(scope):
+    # Rollups sum the per-quiz bests, so label them as totals
+    return ('percentage', 'time_taken') if scope == 'quiz' else ('total_percentage', 'total_time_taken')
+
+
+def _entries(rows, offset, fields):
+    user_ids = [int(member) for member, _ in rows]
+    users = {
+        user.id: user
+        for user in User.query.with_entities(User.id, User.username, User.full_name)
+        .filter(User.id.in_(user_ids))
+    } if user_ids else {}
+
+    entries = []
+    for rank, (member, value) in enumerate(rows, start=offset + 1):
+        user = users.get(int(member))
+        percentage, time_taken = decode(value)
+        entries.append({
+            'rank': rank,
+            'user_id': int(member),
+            'username': user.username if user else None,
+            'full_name': user.full_name if user else None,
+            fields[0]: percentage,
+            fields[1]: time_taken
+        })
+    return entries
+
+
+def get_leaderboard(scope, scope_id, user_id=None, limit=DEFAULT_LIMIT, offset=0):
+    """Top-N page of a leaderboard plus the caller's own rank"""
+    key = leaderboard_key(scope, scope_id)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zrevrange(key, offset, offset + limit - 1, withscores=True)
+    pipe.zcard(key)
+    if user_id is not None:
+        pipe.zrevrank(key, user_id)
+        pipe.zscore(key, user_id)
+    results = pipe.execute()
+
+    fields = _fields(scope)
+    board = {
+        'scope': scope,
+        'id': scope_id,
+        'total': results[1],
+        'entries': _entries(results[0], offset, fields),
+        'me': None
+    }
+    if user_id is not None and results[2] is not None:
+        percentage, time_taken = decode(results[3])
+        board['me'] = {'rank': results[2] + 1, fields[0]: percentage, fields[1]: time_taken}
+    return board
+
+
+def rebuild_leaderboards(batch_size=1000):
+    """Regenerate every leaderboard from the scores table, returns the number of sets"""
+    rows = (
+        db.session.query(
+            Score.quiz_id, Quiz.chapter_id, Chapter.subject_id, Score.user_id,
+            Score.total_scored, Score.total_marks, Score.time_taken
+        )
+        .join(Quiz, Quiz.id == Score.quiz_id)
+        .join(Chapter, Chapter.id == Quiz.chapter_id)
+        # Same totals as the incremental updates, which never look at is_active
+        .execution_options(**{INCLUDE_ARCHIVED: True})
+        .yield_per(batch_size)
+    )
+    best = {}
+    parents = {}
+    for quiz_id, chapter_id, subject_id, user_id, total_scored, total_marks, time_taken in rows:
+        value = encode(total_scored, total_marks, time_taken)
+        if value > best.get((quiz_id, user_id), -math.inf):
+            best[(quiz_id, user_id)] = value
+        parents[quiz_id] = (chapter_id, subject_id)
+
+    boards = {}
+    for (quiz_id, user_id), value in best.items():
+        chapter_id, subject_id = parents[quiz_id]
+        for scope, scope_id in (('quiz', quiz_id), ('chapter', chapter_id), ('subject', subject_id)):
+            board = boards.setdefault(leaderboard_key(scope, scope_id), {})
+            board[user_id] = board.get(user_id, 0) + value
+
+    # Build under temporary names and swap in, readers never see a half-built set
+    stale = set(redis_client.scan_iter(match='leaderboard:*', count=1000))
+    pipe = redis_client.pipeline(transaction=False)
+    for key, members in boards.items():
+        pipe.delete(key + ':rebuild')
+        items = list(members.items())
+        for start in range(0, len(items), batch_size):
+            pipe.zadd(key + ':rebuild', dict(items[start:start + batch_size]))
+        pipe.rename(key + ':rebuild', key)
+        stale.discard(key)
+    if stale:
+        pipe.delete(*stale)
+    pipe.execute()
+    return len(boards)
@@ -0,0 +1,207 @@
+from flask import current_app
+import json
+import os
+import threading
+import time
+import redis
+from app.cache import redis_client
+
+# Live exam monitoring
+# start_quiz and submit_quiz bump a small Redis hash per quiz (started,
+# submitted, sum of percentages) and publish the new totals on one pub/sub
+# channel, all in a single script call. Each web process runs one subscriber
+# thread that fans the updates out to every open Server-Sent Events stream, so
+# any number of admin dashboards cost one Redis connection per process and no
+# database queries. Listeners keep only the latest totals per quiz, a slow
+# client skips intermediate updates instead of buffering them.
+# A stream holds a worker thread, so each process serves at most
+# LIVE_MAX_STREAMS of them and closes each after LIVE_STREAM_SECONDS. A slot
+# is taken before the response starts and given back when it closes. The
+# browser then reconnects with Last-Event-ID (the update time of the last
+# totals it got), and only quizzes updated since then are sent again.
+
+CHANNEL = 'live:quizzes'
+RUNNING_KEY = 'live:running'
+LIVE_TTL = 24 * 3600
+HEARTBEAT_SECONDS = 15
+
+# KEYS: the quiz hash, the running set. ARGV: quiz id, started delta,
+# submitted delta, percentage delta, ttl, update time in milliseconds.
+# Publishes "quiz,started,submitted,sum,updated".
+_BUMP = redis_client.register_script("""
+local started = redis.call('HINCRBY', KEYS[1], 'started', ARGV[2])
+local submitted = redis.call('HINCRBY', KEYS[1], 'submitted', ARGV[3])
+local total = redis.call('HINCRBYFLOAT', KEYS[1], 'percentage_sum', ARGV[4])
+redis.call('HSET', KEYS[1], 'updated', ARGV[6])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('SADD', KEYS[2], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+redis.call('PUBLISH', '""" + CHANNEL + """', ARGV[1] .. ',' .. started .. ',' .. submitted .. ',' .. total .. ',' .. ARGV[6])
+return 1
+""")
+
+
+class TooManyStreams(Exception):
+    pass
+
+
+def _quiz_key(quiz_id):
+    return f'live:quiz:{quiz_id}'
+
+
+def snapshot(quiz_id, started, submitted, percentage_sum, updated=0):
+    started, submitted, percentage_sum = int(started), int(submitted), float(percentage_sum)
+    return {
+        'quiz_id': int(quiz_id),
+        'started': started,
+        'submitted': submitted,
+        'in_progress': max(0, started - submitted),
+        'average_percentage': round(percentage_sum / submitted, 2) if submitted else None,
+        'updated': int(updated)
+    }
+
+
+def _bump(quiz_id, started=0, submitted=0, percentage=0.0):
+    try:
+        _BUMP(keys=[_quiz_key(quiz_id), RUNNING_KEY], args=[
+            quiz_id, started, submitted, percentage, LIVE_TTL, int(time.time() * 1000)
+        ])
+    except redis.RedisError:
+        current_app.logger.warning('Could not publish live update for quiz %s', quiz_id)
+
+
+def record_start(quiz_id):
+    _bump(quiz_id, started=1)
+
+
+def record_submission(quiz_id, total_scored, total_marks):
+    _bump(quiz_id, submitted=1, percentage=total_scored / total_marks * 100 if total_marks else 0.0)
+
+
+def current_snapshots(quiz_ids=None):
+    """Totals of the given quizzes (default: every quiz with live activity)"""
+    if quiz_ids is None:
+        quiz_ids = sorted(int(quiz_id) for quiz_id in redis_client.smembers(RUNNING_KEY))
+    pipe = redis_client.pipeline(transaction=False)
+    for quiz_id in quiz_ids:
+        pipe.hgetall(_quiz_key(quiz_id))
+    return [
+        snapshot(
+            quiz_id, totals.get('started', 0), totals.get('submitted', 0), totals.get('percentage_sum', 0),
+            totals.get('updated', 0)
+        )
+        for quiz_id, totals in zip(quiz_ids, pipe.execute()) if totals
+    ]
+
+
+class Listener:
+    """Latest totals per quiz for one SSE stream"""
+
+    def __init__(self, quiz_ids=None):
+        self.quiz_ids = set(quiz_ids) if quiz_ids else None
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+
+    def push(self, update):
+        if self.quiz_ids is not None and update['quiz_id'] not in self.quiz_ids:
+            return
+        with self.lock:
+            self.pending[update['quiz_id']] = update
+        self.ready.set()
+
+    def wait(self, timeout):
+        self.ready.wait(timeout)
+        with self.lock:
+            self.ready.clear()
+            updates, self.pending = list(self.pending.values()), {}
+        return updates
+
+
+_listeners = set()
+_listeners_lock = threading.Lock()
+_subscriber_pid = None
+
+
+def _subscribe_loop():
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(CHANNEL)
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if message is None:
+                    continue
+                update = snapshot(*message['data'].split(','))
+                with _listeners_lock:
+                    listeners = list(_listeners)
+                for listener in listeners:
+                    listener.push(update)
+        except (redis.RedisError, ValueError, TypeError):
+            time.sleep(1)
+        finally:
+            pubsub.close()
+
+
+def _ensure_subscriber():
+    global _subscriber_pid
+    # One subscriber thread per process, started again after a fork
+    if _subscriber_pid != os.getpid():
+        with _listeners_lock:
+            if _subscriber_pid != os.getpid():
+                threading.Thread(target=_subscribe_loop, name='live-subscriber', daemon=True).start()
+                _subscriber_pid = os.getpid()
+
+
+def _event(update):
+    return f"id: {update['updated']}\nevent: quiz\ndata: {json.dumps(update, separators=(',', ':'))}\n\n"
+
+
+def stream(quiz_ids=None, last_event_id=None):
+    """SSE frames: totals changed since last_event_id (all current ones by default), then every change
+
+    Returns the frames and a function freeing the stream's slot, to be called when the
+    response closes (the frames are never iterated for a HEAD request or a client that
+    went away before the first chunk). Raises TooManyStreams when this process already
+    serves LIVE_MAX_STREAMS streams.
+    """
+    _ensure_subscriber()
+    listener = Listener(quiz_ids)
+    with _listeners_lock:
+        if len(_listeners) >= current_app.config['LIVE_MAX_STREAMS']:
+            raise TooManyStreams()
+        _listeners.add(listener)
+    try:
+        since = int(last_event_id or 0)
+    except ValueError:
+        since = 0
+    frames = _frames(listener, quiz_ids, since, time.monotonic() + current_app.config['LIVE_STREAM_SECONDS'])
+    return frames, lambda: _release(listener)
+
+
+def _release(listener):
+    with _listeners_lock:
+        _listeners.discard(listener)
+
+
+def _frames(listener, quiz_ids, since, deadline):
+    try:
+        yield 'retry: 3000\n\n'
+        try:
+            for update in current_snapshots(quiz_ids):
+                if update['updated'] > since:
+                    yield _event(update)
+        except redis.RedisError:
+            pass
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Free the worker thread, the browser reconnects with Last-Event-ID
+                return
+            updates = listener.wait(min(HEARTBEAT_SECONDS, remaining))
+            if not updates:
+                yield ': keepalive\n\n'
+            for update in updates:
+                yield _event(update)
+    finally:
+        _release(listener)
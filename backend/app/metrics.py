@@ -0,0 +1,94 @@
+from flask import current_app, g, has_request_context, request, Response
+from sqlalchemy import event
+import os
+import time
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from app.models import db
+
+# Request instrumentation
+# Every request records its latency, response size and the number and total
+# time of the SQL statements it ran (counted through SQLAlchemy cursor events),
+# labelled by Flask endpoint so URL parameters do not multiply the series.
+# Cache lookups record hits and misses per cache. Everything is exposed at
+# /metrics in the Prometheus text format; under gunicorn set
+# PROMETHEUS_MULTIPROC_DIR so every worker's samples are aggregated. Requests
+# slower than SLOW_REQUEST_MS are logged along with the SQL they ran.
+
+SQL_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+SLOW_LOG_STATEMENTS = 50
+
+REQUESTS = Counter('http_requests_total', 'HTTP requests', ['method', 'endpoint', 'status'])
+LATENCY = Histogram('http_request_duration_seconds', 'Request latency', ['method', 'endpoint'])
+SQL_STATEMENTS = Histogram('http_request_sql_statements', 'SQL statements per request', ['endpoint'], buckets=SQL_BUCKETS)
+SQL_SECONDS = Histogram('http_request_sql_seconds', 'SQL time per request', ['endpoint'])
+RESPONSE_SIZE = Histogram('http_response_size_bytes', 'Response body size', ['endpoint'], buckets=SIZE_BUCKETS)
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups', ['cache', 'result'])
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_count' in g:
+        g.sql_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or 'sql_count' not in g:
+        return
+    elapsed = time.perf_counter() - g.pop('sql_started', time.perf_counter())
+    g.sql_count += 1
+    g.sql_seconds += elapsed
+    if g.sql_log is not None and len(g.sql_log) < SLOW_LOG_STATEMENTS:
+        g.sql_log.append((round(elapsed * 1000, 2), statement))
+
+
+def _start_timer():
+    g.request_started = time.perf_counter()
+    g.sql_count = 0
+    g.sql_seconds = 0.0
+    g.sql_log = [] if current_app.config['SLOW_REQUEST_MS'] else None
+
+
+def _record(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or 'unmatched'
+
+    REQUESTS.labels(request.method, endpoint, response.status_code).inc()
+    LATENCY.labels(request.method, endpoint).observe(elapsed)
+    SQL_STATEMENTS.labels(endpoint).observe(g.sql_count)
+    SQL_SECONDS.labels(endpoint).observe(g.sql_seconds)
+    if response.content_length is not None:
+        RESPONSE_SIZE.labels(endpoint).observe(response.content_length)
+
+    slow_ms = current_app.config['SLOW_REQUEST_MS']
+    if slow_ms and elapsed * 1000 >= slow_ms:
+        current_app.logger.warning(
+            'Slow request %s %s: %.1f ms, %d SQL statements (%.1f ms)\n%s',
+            request.method, request.full_path, elapsed * 1000, g.sql_count, g.sql_seconds * 1000,
+            '\n'.join(f'  [{ms} ms] {statement}' for ms, statement in g.sql_log)
+        )
+    return response
+
+
+def metrics_endpoint():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), content_type=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    app.before_request(_start_timer)
+    app.after_request(_record)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
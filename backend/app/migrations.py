@@ -0,0 +1,72 @@
+from flask import current_app
+from sqlalchemy import text
+import re
+from app.models import User, Subject, Chapter, Quiz, Question, Score, active_only, db
+
+# Schema upgrades
+# db.create_all() only creates missing tables, it never touches tables that
+# already exist. upgrade_schema() additionally creates any index declared on
+# the models that an existing database does not have yet, and drops the
+# indexes listed in RETIRED_INDEXES.
+
+# Full (is_active, ...) indexes replaced by partial indexes on active rows
+RETIRED_INDEXES = {
+    'subjects': ['ix_subjects_is_active_id'],
+    'chapters': ['ix_chapters_subject_id_is_active', 'ix_chapters_is_active_id'],
+    'quizzes': ['ix_quizzes_is_active_id']
+}
+
+
+def upgrade_schema():
+    db.create_all()
+    inspector = db.inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if not inspector.has_index(table.name, index.name):
+                index.create(bind=db.engine)
+                created.append(index.name)
+        for name in RETIRED_INDEXES.get(table.name, []):
+            if inspector.has_index(table.name, name):
+                with db.engine.begin() as connection:
+                    connection.execute(text(f'DROP INDEX {name}'))
+    return created
+
+
+# Query plan checks
+# The hot queries behind the list endpoints, dashboards and scoring. On SQLite
+# `flask check-query-plans` fails if any of them is planned as a full scan.
+
+def hot_queries():
+    return {
+        'user scores': Score.query.filter_by(user_id=1)
+            .order_by(Score.timestamp_of_attempt.desc(), Score.id.desc()).limit(10),
+        'recent scores': Score.query.order_by(Score.timestamp_of_attempt.desc(), Score.id.desc()).limit(10),
+        'quiz questions': Question.query.filter_by(quiz_id=1).order_by(Question.id),
+        'subject chapters': Chapter.query.filter_by(subject_id=1),
+        'active subjects': Subject.query.order_by(Subject.id),
+        'active chapters': Chapter.available().order_by(Chapter.id),
+        'active quizzes': Quiz.available().order_by(Quiz.id),
+        'chapter quizzes': Quiz.query.filter_by(chapter_id=1),
+        'users by role': User.query.filter_by(role='user')
+    }
+
+
+FULL_SCAN = re.compile(r'\bSCAN (?:TABLE )?\w+\b(?! USING)')
+
+
+def check_query_plans():
+    """Return {name: plan lines} for every hot query planned as a full scan"""
+    if db.engine.dialect.name != 'sqlite':
+        current_app.logger.info('Query plan check only runs on SQLite')
+        return {}
+
+    failures = {}
+    for name, query in hot_queries().items():
+        # Archived rows are filtered when a query executes, add the same criteria here
+        statement = query.options(active_only()).statement
+        sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = [row[-1] for row in db.session.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+        if any(FULL_SCAN.search(line) for line in plan):
+            failures[name] = plan
+    return failures
@@ -1,11 +1,68 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, func, text, true
+from sqlalchemy.orm import MANYTOONE, Session, with_loader_criteria
 from datetime import datetime
 import bcrypt
 
 db = SQLAlchemy()
 
+# Soft deletes
+# Subjects, chapters and quizzes are archived (is_active=False) rather than
+# deleted. Every ORM SELECT leaves archived rows out, in joins, subqueries and
+# collection loads (subject.chapters) too, so they are never listed by
+# accident. A row's parent (score.quiz, quiz.chapter, chapter.subject) is
+# loaded even when archived: anything still loaded can name its parent, and
+# past attempts keep their quiz. Queries that need archived rows opt in with
+# the include_archived execution option (or start from Model.with_archived()),
+# as admin edits and deletes do. The is_active indexes are partial where the
+# database supports it, covering only the rows that are actually read.
+
+INCLUDE_ARCHIVED = 'include_archived'
+
+
+class SoftDeletable:
+    is_active = db.Column(db.Boolean, default=True)
+
+    @classmethod
+    def with_archived(cls):
+        """Query that also returns archived rows"""
+        return cls.query.execution_options(**{INCLUDE_ARCHIVED: True})
+
+
+def active_only():
+    """Loader option restricting every soft-deletable entity in a statement to active rows"""
+    return with_loader_criteria(SoftDeletable, lambda cls: cls.is_active == true(), include_aliases=True)
+
+
+def _loads_parent(state):
+    prop = getattr(state.loader_strategy_path, 'prop', None) if state.is_relationship_load else None
+    return prop is not None and prop.direction is MANYTOONE
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _skip_archived(state):
+    # Column loads refresh an object that is already in the session
+    if (
+        state.is_select and not state.is_column_load and not _loads_parent(state)
+        and not state.execution_options.get(INCLUDE_ARCHIVED)
+    ):
+        state.statement = state.statement.options(active_only())
+
+
+def _active_index(name, *columns):
+    # Matches the `is_active = 1` / `is_active = true` criteria added above
+    return db.Index(name, *columns, sqlite_where=text('is_active = 1'), postgresql_where=text('is_active'))
+
+
+def _count(model, *criteria):
+    return db.session.scalar(db.select(func.count()).select_from(model).where(*criteria))
+
+
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_role', 'role'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(120), unique=True, nullable=False)
@@ -35,14 +92,16 @@ class User(db.Model):
             'role': self.role
         }
 
-class Subject(db.Model):
+class Subject(SoftDeletable, db.Model):
     __tablename__ = 'subjects'
+    __table_args__ = (
+        _active_index('ix_subjects_active_id', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    is_active = db.Column(db.Boolean, default=True)
     
     # Relationships
     chapters = db.relationship('Chapter', backref='subject', lazy=True, cascade='all, delete-orphan')
@@ -52,22 +111,30 @@ class Subject(db.Model):
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'chapters_count': len(self.chapters)
+            'chapters_count': _count(Chapter, Chapter.subject_id == self.id)
         }
 
-class Chapter(db.Model):
+class Chapter(SoftDeletable, db.Model):
     __tablename__ = 'chapters'
+    __table_args__ = (
+        _active_index('ix_chapters_active_subject_id', 'subject_id', 'id'),
+        _active_index('ix_chapters_active_id', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
     subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    is_active = db.Column(db.Boolean, default=True)
     
     # Relationships
     quizzes = db.relationship('Quiz', backref='chapter', lazy=True, cascade='all, delete-orphan')
     
+    @classmethod
+    def available(cls):
+        """Active chapters of active subjects"""
+        return cls.query.filter(cls.subject_id.in_(db.select(Subject.id)))
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -75,11 +142,16 @@ class Chapter(db.Model):
             'description': self.description,
             'subject_id': self.subject_id,
             'subject_name': self.subject.name,
-            'quizzes_count': len(self.quizzes)
+            'quizzes_count': _count(Quiz, Quiz.chapter_id == self.id)
         }
 
-class Quiz(db.Model):
+class Quiz(SoftDeletable, db.Model):
     __tablename__ = 'quizzes'
+    __table_args__ = (
+        _active_index('ix_quizzes_active_id', 'id'),
+        _active_index('ix_quizzes_active_chapter_id', 'chapter_id', 'id'),
+        db.Index('ix_quizzes_chapter_id', 'chapter_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     chapter_id = db.Column(db.Integer, db.ForeignKey('chapters.id'), nullable=False)
@@ -88,13 +160,18 @@ class Quiz(db.Model):
     date_of_quiz = db.Column(db.DateTime, nullable=False)
     time_duration = db.Column(db.Integer, nullable=False)  # in minutes
     total_marks = db.Column(db.Integer, default=0)
-    is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     questions = db.relationship('Question', backref='quiz', lazy=True, cascade='all, delete-orphan')
     scores = db.relationship('Score', backref='quiz', lazy=True)
     
+    @classmethod
+    def available(cls):
+        """Quizzes candidates can see and take: the quiz, its chapter and its subject are active"""
+        chapters = db.select(Chapter.id).where(Chapter.subject_id.in_(db.select(Subject.id)))
+        return cls.query.filter(cls.chapter_id.in_(chapters))
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -106,11 +183,29 @@ class Quiz(db.Model):
             'date_of_quiz': self.date_of_quiz.isoformat(),
             'time_duration': self.time_duration,
             'total_marks': self.total_marks,
-            'questions_count': len(self.questions)
+            'questions_count': _count(Question, Question.quiz_id == self.id)
+        }
+
+class QuizDraw(db.Model):
+    __tablename__ = 'quiz_draws'
+    
+    # Quizzes with a row here draw a randomized paper per attempt from their chapter's question bank
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), primary_key=True)
+    question_count = db.Column(db.Integer, nullable=False)
+    shuffle_options = db.Column(db.Boolean, default=True, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'quiz_id': self.quiz_id,
+            'question_count': self.question_count,
+            'shuffle_options': self.shuffle_options
         }
 
 class Question(db.Model):
     __tablename__ = 'questions'
+    __table_args__ = (
+        db.Index('ix_questions_quiz_id_id', 'quiz_id', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), nullable=False)
@@ -140,6 +235,11 @@ class Question(db.Model):
 
 class Score(db.Model):
     __tablename__ = 'scores'
+    __table_args__ = (
+        db.Index('ix_scores_user_id_timestamp', 'user_id', 'timestamp_of_attempt', 'id'),
+        db.Index('ix_scores_timestamp', 'timestamp_of_attempt', 'id'),
+        db.Index('ix_scores_quiz_id', 'quiz_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), nullable=False)
@@ -150,6 +250,10 @@ class Score(db.Model):
     timestamp_of_attempt = db.Column(db.DateTime, default=datetime.utcnow)
     answers = db.Column(db.JSON, nullable=True)  # Store user answers
     
+    # Relationships
+    paper = db.relationship('AttemptPaper', uselist=False, lazy=True, cascade='all, delete-orphan')
+    receipt = db.relationship('SubmissionReceipt', uselist=False, lazy=True, cascade='all, delete-orphan')
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -162,3 +266,45 @@ class Score(db.Model):
             'time_taken': self.time_taken,
             'timestamp_of_attempt': self.timestamp_of_attempt.isoformat()
         }
+
+class AttemptAnswer(db.Model):
+    __tablename__ = 'attempt_answers'
+    __table_args__ = (
+        db.Index('ix_attempt_answers_question_id', 'question_id'),
+    )
+    
+    score_id = db.Column(db.Integer, db.ForeignKey('scores.id'), primary_key=True)
+    question_id = db.Column(db.Integer, primary_key=True)
+    selected_option = db.Column(db.SmallInteger, nullable=False)  # 1, 2, 3, or 4
+    is_correct = db.Column(db.Boolean, nullable=False)
+
+class AttemptPaper(db.Model):
+    __tablename__ = 'attempt_papers'
+    
+    score_id = db.Column(db.Integer, db.ForeignKey('scores.id'), primary_key=True)
+    question_ids = db.Column(db.JSON, nullable=False)  # questions of a drawn paper, in paper order
+
+class SubmissionReceipt(db.Model):
+    __tablename__ = 'submission_receipts'
+    
+    # One row per queued submission, a receipt can only ever become one Score
+    receipt = db.Column(db.String(32), primary_key=True)
+    score_id = db.Column(db.Integer, db.ForeignKey('scores.id'), nullable=False, unique=True)
+
+class UserStats(db.Model):
+    __tablename__ = 'user_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    total_attempts = db.Column(db.Integer, default=0, nullable=False)
+    percentage_sum = db.Column(db.Float, default=0.0, nullable=False)
+    best_percentage = db.Column(db.Float, nullable=True)
+    last_attempt_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'total_attempts': self.total_attempts,
+            'average_score': round(self.percentage_sum / self.total_attempts, 2) if self.total_attempts else 0,
+            'best_score': round(self.best_percentage, 2) if self.best_percentage is not None else None,
+            'last_attempt_at': self.last_attempt_at.isoformat() if self.last_attempt_at else None
+        }
@@ -0,0 +1,86 @@
+from flask import abort, current_app, jsonify, make_response, request
+from sqlalchemy import and_, or_
+from datetime import datetime
+import base64
+import json
+
+# Keyset pagination
+# List endpoints accept ?limit=, ?cursor= and ?fields=. The body stays a plain
+# JSON list; the cursor for the next page (if any) is returned in the
+# X-Next-Cursor header. Without limit or cursor the whole list is returned, a
+# cursor alone pages by PAGE_SIZE. Cursors encode the sort key of the last row, so every
+# page is an index range scan instead of an OFFSET over the whole table. The
+# sort key columns are always part of a `fields` projection. A cursor that
+# cannot be decoded gets 400 rather than the first page again.
+
+
+class Page:
+    def __init__(self, limit, cursor=None, fields=None):
+        self.limit = limit
+        self.cursor = cursor
+        self.fields = fields
+
+    @classmethod
+    def from_request(cls):
+        max_size = current_app.config['MAX_PAGE_SIZE']
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor') or None
+        if limit is None and cursor is not None:
+            limit = current_app.config['PAGE_SIZE']
+        fields = request.args.get('fields')
+        return cls(
+            limit=max(1, min(limit, max_size)) if limit is not None else None,
+            cursor=cursor,
+            fields={field.strip() for field in fields.split(',') if field.strip()} if fields else None
+        )
+
+    @property
+    def cache_key(self):
+        fields = ','.join(sorted(self.fields)) if self.fields else '*'
+        return f'limit={self.limit or "all"}:cursor={self.cursor or ""}:fields={fields}'
+
+    def _decode_cursor(self, order_by):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(self.cursor.encode()))
+            if not isinstance(values, list) or len(values) != len(order_by):
+                raise ValueError('cursor does not match the sort key')
+            decoded = []
+            for (column, _), value in zip(order_by, values):
+                if value is not None and column.type.python_type is datetime:
+                    value = datetime.fromisoformat(value)
+                decoded.append(value)
+        except (ValueError, TypeError):
+            # Malformed or tampered with, serving the first page again would loop the client
+            abort(make_response(jsonify({'message': 'Invalid cursor'}), 400))
+        return decoded
+
+    def apply(self, query, order_by):
+        """Order, seek past the cursor and limit a query
+
+        order_by is a list of (column, descending) pairs that must end in a
+        unique column, all sorted in the same direction.
+        """
+        descending = order_by[0][1]
+        if self.cursor:
+            values = self._decode_cursor(order_by)
+            # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+            clauses = []
+            for i, (column, _) in enumerate(order_by):
+                seek = column < values[i] if descending else column > values[i]
+                equal = [order_by[j][0] == values[j] for j in range(i)]
+                clauses.append(and_(*equal, seek))
+            query = query.filter(or_(*clauses))
+        query = query.order_by(*[column.desc() if descending else column.asc() for column, _ in order_by])
+        return query.limit(self.limit) if self.limit else query
+
+    def next_cursor(self, items, order_fields):
+        if not self.limit or len(items) < self.limit:
+            return None
+        values = [items[-1][field] for field in order_fields]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def with_next_cursor(response, next_cursor):
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
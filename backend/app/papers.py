@@ -0,0 +1,82 @@
+import hashlib
+import json
+import numpy as np
+
+# Randomized papers
+# A quiz with a QuizDraw row gives every attempt its own paper: question_count
+# questions drawn from its chapter's bank (the questions of every quiz in the
+# chapter, archived ones included), in random order and, with shuffle_options,
+# with the options of each question shuffled. The draw is seeded from the
+# attempt (quiz, user and session start) and sampled from the bank arrays of
+# the cached answer key, so it needs no database access. The drawn paper is
+# kept in the exam session, a resumed session gets the same paper back and
+# bank edits during the exam cannot reshuffle it. Answers arrive in the shown
+# option numbers and are mapped back to the original ones before scoring and
+# storage, so results and analytics never see the shuffling.
+
+OPTIONS = 4
+
+
+def attempt_seed(quiz_id, user_id, started_at=''):
+    digest = hashlib.blake2b(f'{quiz_id}:{user_id}:{started_at}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class Paper:
+    """Question ids of one attempt in paper order, with the original option behind each shown option"""
+
+    def __init__(self, question_ids, orders, total_marks):
+        self.question_ids = question_ids
+        self.orders = orders
+        self.total_marks = total_marks
+        self._rows = {str(question_id): i for i, question_id in enumerate(question_ids)}
+
+    def questions(self, bank):
+        """Answer-free questions as shown, bank is {question id: question}"""
+        shown = []
+        for question_id, order in zip(self.question_ids, self.orders):
+            question = dict(bank[question_id])
+            for option, original in enumerate(order, 1):
+                question[f'option{option}'] = bank[question_id][f'option{original}']
+            shown.append(question)
+        return shown
+
+    def to_original(self, answers):
+        """Map cleaned {question id: shown option} answers to original options, off-paper questions are dropped"""
+        original = {}
+        for question_id, option in answers.items():
+            i = self._rows.get(str(question_id))
+            if i is not None and option:
+                original[str(question_id)] = self.orders[i][option - 1]
+        return original
+
+    def correct_answers(self, key):
+        """Correct options in shown numbers"""
+        correct = {}
+        for question_id, order in zip(self.question_ids, self.orders):
+            i = key.index.get(str(question_id))
+            if i is not None and key.correct_options[i] in order:
+                correct[str(question_id)] = order.index(key.correct_options[i]) + 1
+        return correct
+
+    def to_json(self):
+        return json.dumps(
+            {'ids': self.question_ids, 'orders': self.orders, 'total_marks': self.total_marks},
+            separators=(',', ':')
+        )
+
+    @classmethod
+    def from_json(cls, payload):
+        data = json.loads(payload)
+        return cls(data['ids'], data['orders'], data['total_marks'])
+
+
+def draw_paper(key, seed):
+    """Draw the paper for `seed` from the bank of a quiz with draw_count set"""
+    rng = np.random.default_rng(seed)
+    count = min(key.draw_count, len(key.bank_ids))
+    positions = rng.choice(len(key.bank_ids), size=count, replace=False)
+    orders = np.tile(np.arange(1, OPTIONS + 1), (count, 1))
+    if key.shuffle_options:
+        orders = rng.permuted(orders, axis=1)
+    return Paper(key.bank_ids[positions].tolist(), orders.tolist(), int(key.bank_marks[positions].sum()))
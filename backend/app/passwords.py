@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+import bcrypt
+import os
+import threading
+
+# Password verification pool
+# bcrypt.checkpw burns ~250ms of CPU. Running it on the request thread lets a
+# login storm occupy every web worker, so checks run on a small bounded pool
+# instead. Once the pool and its queue are full, new logins are rejected at
+# once (PasswordCheckBusy -> 503) rather than piling up behind each other.
+
+
+class PasswordCheckBusy(Exception):
+    pass
+
+
+_pool = None
+_slots = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool, _slots, _pool_pid
+    # Rebuild after a fork, threads do not survive into pre-forked workers
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                size = current_app.config['BCRYPT_POOL_SIZE']
+                _pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix='bcrypt')
+                _slots = threading.BoundedSemaphore(size + current_app.config['BCRYPT_QUEUE_DEPTH'])
+                _pool_pid = os.getpid()
+    return _pool, _slots
+
+
+def _checkpw(password, password_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def verify_password(password, password_hash):
+    """Check a password on the bcrypt pool, raises PasswordCheckBusy when saturated"""
+    pool, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        raise PasswordCheckBusy()
+    try:
+        future = pool.submit(_checkpw, password, password_hash)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=current_app.config['BCRYPT_TIMEOUT'])
+    except TimeoutError:
+        raise PasswordCheckBusy()
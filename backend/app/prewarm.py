@@ -0,0 +1,79 @@
+from flask import current_app
+from datetime import datetime, timedelta
+import redis
+from app.cache import redis_client, cached_catalog, cached_catalog_page
+from app.models import Quiz
+from app.pagination import Page
+from app.quiz_cache import get_quiz_paper, get_answer_key
+from app.serializers import serialize_catalog
+from app.counters import get_dashboard_stats
+
+# Exam pre-warming
+# A Celery beat job looks for active quizzes starting within PREWARM_WINDOW
+# seconds (or still running) and fills every cache their first wave of
+# candidates will hit: the quiz paper and answer key, the first page of each
+# catalog listing, the dashboard counters, and the Lua scripts behind
+# sessions, leaderboards, live monitoring and rate limits (so no worker has to
+# reload one at T-0). Leaderboard sets need no warming, a sorted set is created
+# by its first ZADD. Warm entries are reused as they are, so running the job
+# often is cheap. Catalog entries are (re)set to live for two intervals on
+# every run, so they cannot expire between runs; they are keyed by the
+# catalog version, so a longer TTL never serves a stale listing.
+
+CATALOG_LISTINGS = ('subjects', 'chapters', 'quizzes')
+
+
+def quizzes_to_warm(window, now=None):
+    now = now or datetime.utcnow()
+    # Quizzes last at most a day, anything older has finished
+    candidates = (
+        Quiz.available().with_entities(Quiz.id, Quiz.date_of_quiz, Quiz.time_duration)
+        .filter(
+            Quiz.date_of_quiz >= now - timedelta(days=1),
+            Quiz.date_of_quiz <= now + timedelta(seconds=window)
+        )
+        .all()
+    )
+    return [
+        quiz.id for quiz in candidates
+        if quiz.date_of_quiz + timedelta(minutes=quiz.time_duration or 0) >= now
+    ]
+
+
+def _load_scripts():
+    from app import exam_sessions, leaderboards, live, rate_limit
+    scripts = [exam_sessions._START, exam_sessions._AUTOSAVE, leaderboards._RECORD_BEST, live._BUMP, rate_limit._TAKE]
+    for script in scripts:
+        redis_client.script_load(script.script)
+    return len(scripts)
+
+
+def warm_ttl():
+    return max(current_app.config['CATALOG_CACHE_TTL'], 2 * current_app.config['PREWARM_INTERVAL'])
+
+
+def warm_catalog():
+    # The unpaged listing, as requested by the SPA
+    page = Page(limit=None)
+    ttl = warm_ttl()
+    for name in CATALOG_LISTINGS:
+        cached_catalog_page(name, lambda: serialize_catalog(name, page), page, ttl=ttl)
+    cached_catalog('quizzes:count', lambda: Quiz.available().count(), ttl=ttl)
+
+
+def prewarm_quizzes(window=None):
+    """Warm caches for quizzes about to start, returns the warmed quiz ids"""
+    window = window or current_app.config['PREWARM_WINDOW']
+    quiz_ids = quizzes_to_warm(window)
+    if not quiz_ids:
+        return []
+    try:
+        for quiz_id in quiz_ids:
+            get_quiz_paper(quiz_id)
+            get_answer_key(quiz_id)
+        warm_catalog()
+        get_dashboard_stats()
+        _load_scripts()
+    except redis.RedisError as e:
+        current_app.logger.warning('Pre-warming stopped, Redis unavailable: %s', e)
+    return quiz_ids
@@ -0,0 +1,147 @@
+from sqlalchemy import insert, select
+import csv
+import io
+import json
+import tempfile
+from app.models import Quiz, Question, db
+from app.exports import stream_rows
+
+# Bulk question import / export
+# Uploads are parsed row by row (CSV with a header line, or JSON Lines) and
+# validated into a temporary file (in memory up to SPOOL_MAX_SIZE) before the
+# database is touched, so a slow or large upload never holds a write lock and
+# any invalid row rejects the whole upload, the first errors are reported with
+# their line numbers. The rows are then inserted with one executemany per chunk,
+# each chunk in its own short transaction together with its share of the
+# quiz's total_marks. If the database fails part way, the chunks already
+# committed stay and ImportInterrupted reports how many rows they hold.
+
+FIELDS = ['question_statement', 'option1', 'option2', 'option3', 'option4', 'correct_option', 'marks']
+REQUIRED_FIELDS = FIELDS[:-1]
+MAX_ERRORS = 50
+SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+
+class ImportFailed(Exception):
+    def __init__(self, errors):
+        super().__init__('Invalid rows in upload')
+        self.errors = errors
+
+
+class ImportInterrupted(Exception):
+    def __init__(self, imported):
+        super().__init__(f'Import stopped after {imported} rows')
+        self.imported = imported
+
+
+def detect_format(filename=None, content_type=None, requested=None):
+    if requested in ('csv', 'jsonl'):
+        return requested
+    if filename and filename.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if content_type and ('ndjson' in content_type or 'jsonl' in content_type):
+        return 'jsonl'
+    return 'csv'
+
+
+def iter_rows(stream, fmt):
+    """Yield (line number, row dict) from a binary stream"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'jsonl':
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_no, row
+    else:
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def validate_row(row):
+    """Return (question values, None) or (None, error message)"""
+    if not isinstance(row, dict):
+        return None, 'not a JSON object'
+    for field in REQUIRED_FIELDS:
+        if row.get(field) in (None, ''):
+            return None, f'{field} is required'
+    try:
+        correct_option = int(row['correct_option'])
+        # A missing marks value (or an empty CSV cell) defaults to 1, an explicit 0 is kept
+        marks = 1 if row.get('marks') in (None, '') else int(row['marks'])
+    except (TypeError, ValueError):
+        return None, 'correct_option and marks must be integers'
+    if correct_option not in (1, 2, 3, 4):
+        return None, 'correct_option must be 1, 2, 3 or 4'
+    if marks < 0:
+        return None, 'marks must not be negative'
+    values = {field: str(row[field]) for field in REQUIRED_FIELDS[:-1]}
+    values.update(correct_option=correct_option, marks=marks)
+    return values, None
+
+
+def _spool(rows):
+    """Validate every row into a temporary file of JSON lines, raises ImportFailed"""
+    errors = []
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='w+', encoding='utf-8')
+    try:
+        for line_no, row in rows:
+            values, error = validate_row(row)
+            if error:
+                errors.append({'line': line_no, 'error': error})
+                if len(errors) >= MAX_ERRORS:
+                    break
+            elif not errors:
+                spool.write(json.dumps(values, separators=(',', ':')) + '\n')
+        if errors:
+            raise ImportFailed(errors)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _chunks(lines, chunk_size):
+    chunk = []
+    for line in lines:
+        chunk.append(json.loads(line))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_questions(quiz_id, rows, chunk_size):
+    """Validate every row, then insert them in chunks of one transaction each, returns the row count"""
+    imported = 0
+    with _spool(rows) as spool:
+        for chunk in _chunks(spool, chunk_size):
+            for values in chunk:
+                values['quiz_id'] = quiz_id
+            try:
+                db.session.execute(insert(Question), chunk)
+                Quiz.query.filter_by(id=quiz_id).update(
+                    {Quiz.total_marks: Quiz.total_marks + sum(values['marks'] for values in chunk)},
+                    synchronize_session=False
+                )
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                if not imported:
+                    raise
+                raise ImportInterrupted(imported) from e
+            imported += len(chunk)
+    return imported
+
+
+def export_questions(quiz_id, fmt, batch_size):
+    """Yield the quiz's questions (with answers) as CSV or JSON Lines chunks"""
+    columns = [Question.id] + [getattr(Question, field) for field in FIELDS]
+    statement = select(*columns).where(Question.quiz_id == quiz_id).order_by(Question.id)
+    return stream_rows(statement, ['id'] + FIELDS, fmt, batch_size)
@@ -0,0 +1,228 @@
+from flask import abort, current_app
+import json
+import numpy as np
+import redis
+from app.cache import redis_client
+from app.models import Subject, Chapter, Quiz, QuizDraw, Question, INCLUDE_ARCHIVED, db
+from app.serializers import serialize_quizzes
+from app.metrics import record_cache
+
+# Per-quiz caches
+# A quiz paper (quiz details + answer-free questions) and its answer key are the
+# same for every candidate, so they are built once, encoded as JSON and kept both
+# in Redis and in process memory. Each quiz has a version counter in Redis;
+# question and quiz edits bump it, which makes every worker rebuild on its next
+# read. Chapter and subject edits bump it for their quizzes, the paper names
+# both. Archived quizzes still get a paper and a key, results of past attempts
+# need them, but the key records that the quiz can no longer be taken. For a
+# quiz that draws randomized papers (see papers.py) both cover its chapter's
+# whole question bank.
+
+_local_cache = {}
+
+
+def _version_key(quiz_id):
+    return f'quiz:{quiz_id}:version'
+
+
+def quiz_version(quiz_id):
+    try:
+        return int(redis_client.get(_version_key(quiz_id)) or 0)
+    except redis.RedisError:
+        return None
+
+
+def invalidate_quiz(quiz_id):
+    for kind in ('paper', 'key', 'bank'):
+        _local_cache.pop((kind, quiz_id), None)
+    try:
+        redis_client.incr(_version_key(quiz_id))
+    except redis.RedisError:
+        pass
+
+
+def invalidate_questions(quiz_id):
+    """After question edits: the quiz and every quiz drawing from the same chapter bank"""
+    chapter_id = db.select(Quiz.chapter_id).where(Quiz.id == quiz_id).scalar_subquery()
+    drawing = (
+        QuizDraw.query.with_entities(QuizDraw.quiz_id)
+        .join(Quiz, Quiz.id == QuizDraw.quiz_id)
+        .filter(Quiz.chapter_id == chapter_id, QuizDraw.quiz_id != quiz_id)
+        .execution_options(**{INCLUDE_ARCHIVED: True})
+    )
+    invalidate_quiz(quiz_id)
+    for other_id, in drawing:
+        invalidate_quiz(other_id)
+
+
+def invalidate_chapters(chapter_ids):
+    """After chapter or subject edits: every quiz of the chapters, their papers carry the names"""
+    quizzes = (
+        Quiz.query.with_entities(Quiz.id)
+        .filter(Quiz.chapter_id.in_(chapter_ids))
+        .execution_options(**{INCLUDE_ARCHIVED: True})
+    )
+    for quiz_id, in quizzes:
+        invalidate_quiz(quiz_id)
+
+
+def _cached(kind, quiz_id, builder, decode=None):
+    version = quiz_version(quiz_id)
+    if version is None:
+        payload = builder(quiz_id)
+        return decode(payload) if decode else payload
+
+    local = _local_cache.get((kind, quiz_id))
+    if local and local[0] == version:
+        record_cache(f'quiz_{kind}_local', True)
+        return local[1]
+    record_cache(f'quiz_{kind}_local', False)
+
+    key = f'quiz:{quiz_id}:{kind}:v{version}'
+    try:
+        payload = redis_client.get(key)
+    except redis.RedisError:
+        payload = None
+    record_cache(f'quiz_{kind}', payload is not None)
+    if payload is None:
+        payload = builder(quiz_id)
+        try:
+            redis_client.setex(key, current_app.config['QUIZ_CACHE_TTL'], payload)
+        except redis.RedisError:
+            pass
+
+    value = decode(payload) if decode else payload
+    _local_cache[(kind, quiz_id)] = (version, value)
+    return value
+
+
+def _paper_questions(quiz_id, chapter_id, draws):
+    """The quiz's own questions, or its chapter's bank when it draws randomized papers"""
+    if not draws:
+        return Question.query.filter_by(quiz_id=quiz_id).order_by(Question.id)
+    return (
+        Question.query.join(Quiz, Quiz.id == Question.quiz_id)
+        .filter(Quiz.chapter_id == chapter_id)
+        .order_by(Question.id)
+        .execution_options(**{INCLUDE_ARCHIVED: True})
+    )
+
+
+def build_quiz_paper(quiz_id):
+    quizzes = serialize_quizzes(Quiz.query.filter_by(id=quiz_id).execution_options(**{INCLUDE_ARCHIVED: True}))
+    if not quizzes:
+        abort(404)
+    draws = db.session.get(QuizDraw, quiz_id) is not None
+    questions = _paper_questions(quiz_id, quizzes[0]['chapter_id'], draws).all()
+    paper = {
+        'quiz': quizzes[0],
+        'questions': [question.to_dict(include_answer=False) for question in questions]
+    }
+    return json.dumps(paper, separators=(',', ':'))
+
+
+def get_quiz_paper(quiz_id):
+    """Return the pre-encoded JSON paper for a quiz"""
+    return _cached('paper', quiz_id, build_quiz_paper)
+
+
+def get_question_bank(quiz_id):
+    """(quiz details, {question id: answer-free question}) decoded from the paper, kept in process memory"""
+    version = quiz_version(quiz_id)
+    local = _local_cache.get(('bank', quiz_id))
+    if local and version is not None and local[0] == version:
+        return local[1]
+    paper = json.loads(get_quiz_paper(quiz_id))
+    bank = (paper['quiz'], {question['id']: question for question in paper['questions']})
+    if version is not None:
+        _local_cache[('bank', quiz_id)] = (version, bank)
+    return bank
+
+
+class AnswerKey:
+    """Parallel arrays of question id, correct option and marks for one quiz"""
+
+    def __init__(self, quiz_id, question_ids, correct_options, marks, total_marks, chapter_id=None, subject_id=None,
+                 time_duration=None, is_active=True, draw_count=None, shuffle_options=False):
+        self.quiz_id = quiz_id
+        self.is_active = is_active
+        self.draw_count = draw_count
+        self.shuffle_options = shuffle_options
+        self.time_duration = time_duration
+        self.chapter_id = chapter_id
+        self.subject_id = subject_id
+        self.question_ids = question_ids
+        self.correct_options = correct_options
+        self.marks = marks
+        self.total_marks = total_marks
+        self.index = {str(question_id): i for i, question_id in enumerate(question_ids)}
+        if draw_count:
+            # Bank arrays papers are sampled from
+            self.bank_ids = np.array(question_ids, dtype=np.int64)
+            self.bank_marks = np.array(marks, dtype=np.int64)
+
+    def is_correct(self, question_id, user_answer):
+        i = self.index.get(str(question_id))
+        return i is not None and bool(user_answer) and int(user_answer) == self.correct_options[i]
+
+    def score(self, user_answers):
+        total_scored = 0
+        for question_id, user_answer in user_answers.items():
+            i = self.index.get(str(question_id))
+            if i is not None and user_answer and int(user_answer) == self.correct_options[i]:
+                total_scored += self.marks[i]
+        return total_scored
+
+    def correct_answers(self):
+        return {str(question_id): option for question_id, option in zip(self.question_ids, self.correct_options)}
+
+    @classmethod
+    def from_json(cls, payload):
+        data = json.loads(payload)
+        return cls(
+            data['quiz_id'], data['ids'], data['correct'], data['marks'], data['total_marks'],
+            data.get('chapter_id'), data.get('subject_id'), data.get('time_duration'), data.get('is_active', True),
+            data.get('draw_count'), data.get('shuffle_options', False)
+        )
+
+
+def build_answer_key(quiz_id):
+    # The quiz can be taken only while it, its chapter and its subject are all active
+    quiz = (
+        db.session.query(
+            Quiz.total_marks, Quiz.chapter_id, Chapter.subject_id, Quiz.time_duration,
+            (Quiz.is_active & Chapter.is_active & Subject.is_active).label('is_active'),
+            QuizDraw.question_count, QuizDraw.shuffle_options
+        )
+        .join(Chapter, Chapter.id == Quiz.chapter_id)
+        .join(Subject, Subject.id == Chapter.subject_id)
+        .outerjoin(QuizDraw, QuizDraw.quiz_id == Quiz.id)
+        .filter(Quiz.id == quiz_id)
+        .execution_options(**{INCLUDE_ARCHIVED: True})
+        .first()
+    )
+    if quiz is None:
+        abort(404)
+    rows = (
+        _paper_questions(quiz_id, quiz.chapter_id, quiz.question_count is not None)
+        .with_entities(Question.id, Question.correct_option, Question.marks)
+        .all()
+    )
+    key = {
+        'quiz_id': quiz_id,
+        'ids': [row.id for row in rows],
+        'correct': [row.correct_option for row in rows],
+        'marks': [row.marks for row in rows],
+        'total_marks': quiz.total_marks,
+        'chapter_id': quiz.chapter_id,
+        'subject_id': quiz.subject_id,
+        'time_duration': quiz.time_duration,
+        'is_active': bool(quiz.is_active),
+        'draw_count': quiz.question_count,
+        'shuffle_options': bool(quiz.shuffle_options)
+    }
+    return json.dumps(key, separators=(',', ':'))
+
+
+def get_answer_key(quiz_id):
+    return _cached('key', quiz_id, build_answer_key, decode=AnswerKey.from_json)
@@ -1,23 +1,86 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Quiz, Question, Score, User, db
+from app.models import Quiz, Question, Score, User, AttemptPaper, db
+from app.quiz_cache import get_quiz_paper, get_question_bank, get_answer_key, quiz_version
+from app.http_cache import version_etag, not_modified, with_etag
+from app.compression import spliced_response
+from app.rate_limit import admit_submission, shed_response
+from app.live import record_start, record_submission
+from app.serializers import serialize_scores
+from app.submissions import save_scores, enqueue_submission, submission_status
+from app.answers import load_answers
+from app.exam_sessions import (
+    new_attempt, start_session, autosave, claim_session, claim_attempt, clean_answers, SessionExpired
+)
+from app.leaderboards import get_leaderboard, DEFAULT_LIMIT, MAX_LIMIT
 from datetime import datetime
+import json
+import redis
 
 quiz_bp = Blueprint('quiz', __name__)
 
+def _unavailable():
+    # Archived quizzes, or quizzes of an archived chapter or subject
+    return jsonify({'message': 'This quiz is no longer available'}), 404
+
 @quiz_bp.route('/<int:quiz_id>/start', methods=['GET'])
 @jwt_required()
 def start_quiz(quiz_id):
-    quiz = Quiz.query.get_or_404(quiz_id)
-    questions = Question.query.filter_by(quiz_id=quiz_id).all()
+    user_id = get_jwt_identity()
+    key = get_answer_key(quiz_id)
+    if not key.is_active:
+        return _unavailable()
     
-    quiz_data = {
-        'quiz': quiz.to_dict(),
-        'questions': [question.to_dict(include_answer=False) for question in questions],
-        'start_time': datetime.utcnow().isoformat()
-    }
+    # Open (or resume) the server-side session
+    session = None
+    if key.time_duration:
+        try:
+            started_at, seconds_left, saved, created, drawn, token = start_session(key, user_id)
+            session = {
+                'start_time': started_at.isoformat(),
+                'time_remaining': seconds_left,
+                'saved_answers': saved,
+                'attempt_token': token
+            }
+            if created:
+                record_start(quiz_id)
+        except redis.RedisError:
+            pass
+    if session is None:
+        # Without a session the client echoes the signed attempt token on submit
+        token, started_at, drawn = new_attempt(key, user_id)
+        session = {'start_time': datetime.utcfromtimestamp(started_at).isoformat(), 'attempt_token': token}
+    
+    if key.draw_count:
+        # This attempt's randomized paper, rendered from the cached bank
+        quiz, bank = get_question_bank(quiz_id)
+        paper = {
+            'quiz': dict(quiz, questions_count=len(drawn.question_ids), total_marks=drawn.total_marks),
+            'questions': drawn.questions(bank),
+            **session
+        }
+        return Response(json.dumps(paper, separators=(',', ':')), status=200, mimetype='application/json')
+    
+    # Splice the session into the pre-encoded (and pre-compressed) paper
+    paper = get_quiz_paper(quiz_id)
+    return spliced_response(('paper', quiz_id), paper[:-1], ',' + json.dumps(session, separators=(',', ':'))[1:])
+
+@quiz_bp.route('/<int:quiz_id>/autosave', methods=['POST'])
+@jwt_required()
+def autosave_quiz(quiz_id):
+    data = request.get_json() or {}
+    key = get_answer_key(quiz_id)
+    if not key.is_active:
+        return _unavailable()
     
-    return jsonify(quiz_data), 200
+    try:
+        saved = autosave(key, get_jwt_identity(), data.get('answers', {}))
+    except SessionExpired:
+        return jsonify({'message': 'No active session for this quiz'}), 404
+    except redis.RedisError:
+        return jsonify({'message': 'Autosave temporarily unavailable'}), 503
+    
+    return jsonify({'saved': saved}), 200
 
 @quiz_bp.route('/<int:quiz_id>/submit', methods=['POST'])
 @jwt_required()
@@ -25,35 +88,108 @@ def submit_quiz(quiz_id):
     user_id = get_jwt_identity()
     data = request.get_json()
     
-    quiz = Quiz.query.get_or_404(quiz_id)
-    questions = Question.query.filter_by(quiz_id=quiz_id).all()
+    # Admission runs before the session is claimed, a shed submission loses nothing
+    admission, retry_after = admit_submission()
+    if admission == 'shed':
+        return shed_response(retry_after)
+    
+    key = get_answer_key(quiz_id)
+    if not key.is_active:
+        return _unavailable()
     
     user_answers = data.get('answers', {})
     time_taken = data.get('time_taken', 0)
+    drawn = None
     
-    # Calculate score
-    total_scored = 0
-    for question in questions:
-        user_answer = user_answers.get(str(question.id))
-        if user_answer and int(user_answer) == question.correct_option:
-            total_scored += question.marks
+    # Prefer the server-side session: saved answers plus this final delta, server-measured time
+    try:
+        session = claim_session(key, user_id) if key.time_duration else None
+    except redis.RedisError:
+        session = None
+    if session:
+        user_answers, time_taken, drawn = session
+        for question_id, option in clean_answers(key, data.get('answers')).items():
+            if option is None:
+                user_answers.pop(question_id, None)
+            else:
+                user_answers[question_id] = option
+    else:
+        # Started (or resumed) without a session, or Redis is unavailable now: use the attempt token
+        attempt = claim_attempt(key, user_id, data.get('attempt_token'))
+        if attempt:
+            elapsed, drawn = attempt
+            if elapsed is not None:
+                time_taken = elapsed
+        elif data.get('attempt_token') or key.draw_count or key.time_duration:
+            # A token already used (or expired, or forged), or nothing server-side to time the
+            # attempt by (or to map a randomized paper's answers): the client's own time_taken
+            # is never trusted for a timed quiz
+            return jsonify({'message': 'No active session for this quiz'}), 404
+    
+    # Randomized papers are answered in shown option numbers, score and store the original ones
+    if drawn:
+        user_answers = drawn.to_original(clean_answers(key, user_answers))
+    total_marks = drawn.total_marks if drawn else key.total_marks
+    correct_answers = drawn.correct_answers(key) if drawn else key.correct_answers()
+    
+    # Calculate score from the cached answer key
+    total_scored = key.score(user_answers)
+    
+    if current_app.config['SUBMISSION_MODE'] == 'async' or admission == 'queue':
+        try:
+            attempt = enqueue_submission(
+                quiz_id, user_id, total_scored, total_marks, time_taken, user_answers,
+                question_ids=drawn.question_ids if drawn else None
+            )
+        except redis.RedisError:
+            # Queue unavailable, fall through and persist in the request
+            attempt = None
+        if attempt:
+            record_submission(quiz_id, total_scored, total_marks)
+            return jsonify({
+                'receipt': attempt['receipt'],
+                'status': 'queued',
+                'score': {
+                    'quiz_id': quiz_id,
+                    'user_id': user_id,
+                    'total_scored': total_scored,
+                    'total_marks': total_marks,
+                    'percentage': round((total_scored / total_marks) * 100, 2) if total_marks else 0,
+                    'time_taken': time_taken,
+                    'timestamp_of_attempt': attempt['timestamp']
+                },
+                'correct_answers': correct_answers
+            }), 202
     
     # Save score
     score = Score(
         quiz_id=quiz_id,
         user_id=user_id,
         total_scored=total_scored,
-        total_marks=quiz.total_marks,
+        total_marks=total_marks,
         time_taken=time_taken,
-        answers=user_answers
+        answers=user_answers,
+        paper=AttemptPaper(question_ids=drawn.question_ids) if drawn else None
     )
-    
-    db.session.add(score)
-    db.session.commit()
+    save_scores([score])
+    record_submission(quiz_id, total_scored, total_marks)
     
     return jsonify({
         'score': score.to_dict(),
-        'correct_answers': {str(q.id): q.correct_option for q in questions}
+        'correct_answers': correct_answers
+    }), 200
+
+@quiz_bp.route('/submissions/<receipt>', methods=['GET'])
+@jwt_required()
+def get_submission_status(receipt):
+    status = submission_status(receipt)
+    if not status or status.get('user_id') != str(get_jwt_identity()):
+        return jsonify({'message': 'Submission not found'}), 404
+    
+    return jsonify({
+        'receipt': receipt,
+        'status': status['status'],
+        'score_id': int(status['score_id']) if status.get('score_id') else None
     }), 200
 
 @quiz_bp.route('/results/<int:score_id>', methods=['GET'])
@@ -61,26 +197,64 @@ def submit_quiz(quiz_id):
 def get_quiz_results( score_id):
     # user_id = get_jwt_identity()
     score = Score.query.filter_by(id=score_id).first_or_404()
-    s1 = score.to_dict()
     quiz_id = score.quiz_id
-    quiz = Quiz.query.get(quiz_id)
-    questions = Question.query.filter_by(quiz_id=quiz_id).all()
+    # An attempt never changes, its results only move with the quiz version
+    etag = version_etag('results', score_id, quiz_version(quiz_id))
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    paper = json.loads(get_quiz_paper(quiz_id))
+    key = get_answer_key(quiz_id)
     
     results = {
-        'score': score.to_dict(),
-        'quiz': quiz.to_dict(),
+        'score': serialize_scores(Score.query.filter_by(id=score_id))[0],
+        'quiz': paper['quiz'],
         'detailed_results': []
     }
     
-    # Add detailed question-wise results
+    # Add detailed question-wise results, only the questions drawn for a randomized paper
+    answers = load_answers(score)
+    questions = paper['questions']
+    if score.paper is not None:
+        by_id = {question['id']: question for question in questions}
+        questions = [by_id[question_id] for question_id in score.paper.question_ids if question_id in by_id]
     for question in questions:
-        user_answer = score.answers.get(str(question.id)) if score.answers else None
-        is_correct = user_answer and int(user_answer) == question.correct_option
+        user_answer = answers.get(str(question['id']))
+        i = key.index.get(str(question['id']))
+        question['correct_option'] = key.correct_options[i] if i is not None else None
         
         results['detailed_results'].append({
-            'question': question.to_dict(include_answer=True),
+            'question': question,
             'user_answer': user_answer,
-            'is_correct': is_correct
+            'is_correct': key.is_correct(question['id'], user_answer)
         })
     
-    return jsonify(results), 200
+    return with_etag(jsonify(results), etag), 200
+
+def _leaderboard_response(scope, scope_id):
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'message': 'limit and offset must be integers'}), 400
+    
+    try:
+        board = get_leaderboard(scope, scope_id, user_id=get_jwt_identity(), limit=limit, offset=offset)
+    except redis.RedisError:
+        return jsonify({'message': 'Leaderboard temporarily unavailable'}), 503
+    return jsonify(board), 200
+
+@quiz_bp.route('/<int:quiz_id>/leaderboard', methods=['GET'])
+@jwt_required()
+def get_quiz_leaderboard(quiz_id):
+    return _leaderboard_response('quiz', quiz_id)
+
+@quiz_bp.route('/chapters/<int:chapter_id>/leaderboard', methods=['GET'])
+@jwt_required()
+def get_chapter_leaderboard(chapter_id):
+    return _leaderboard_response('chapter', chapter_id)
+
+@quiz_bp.route('/subjects/<int:subject_id>/leaderboard', methods=['GET'])
+@jwt_required()
+def get_subject_leaderboard(subject_id):
+    return _leaderboard_response('subject', subject_id)
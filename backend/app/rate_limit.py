@@ -0,0 +1,190 @@
+from flask import current_app, request, jsonify
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+import json
+import math
+import redis
+from prometheus_client import Counter
+from app.cache import redis_client
+
+# Rate limiting and submit admission control
+# Requests draw from token buckets kept in Redis and refilled continuously by
+# a Lua script, so every worker shares the same limits. Each blueprint has a
+# policy of per-user and/or per-IP buckets (rate per second, burst size); a
+# request must fit in all of its buckets or it gets 429 with Retry-After.
+# RATE_LIMIT_POLICIES (JSON) overrides individual entries of DEFAULT_POLICIES
+# or adds policies for other blueprints, it is parsed once when the app is
+# created.
+#
+# Submissions also pass a global admission bucket (SUBMIT_ADMISSION_RATE /
+# SUBMIT_ADMISSION_BURST). What happens past it depends on SUBMIT_ADMISSION:
+#   'off'    no admission control
+#   'shed'   503 with Retry-After before the submission is read, nothing is
+#            claimed or scored so the client simply retries
+#   'queue'  the attempt goes to the async submission queue (202 + receipt)
+#            even in sync mode, it is persisted by the Celery drain
+# An admitted submission is always persisted. If Redis is unreachable the
+# limiter lets requests through.
+
+DEFAULT_POLICIES = {
+    'auth': {'ip': [20, 200]},
+    'quiz': {'user': [5, 30], 'ip': [500, 2000]},
+    'user': {'user': [10, 50], 'ip': [500, 2000]},
+    'admin': {'user': [20, 100], 'ip': [200, 1000]},
+    'default': {'ip': [100, 500]}
+}
+EXEMPT_ENDPOINTS = {'metrics', 'static'}
+ADMISSION_KEY = 'ratelimit:admission:submit'
+
+DECISIONS = Counter('rate_limit_decisions_total', 'Rate limiter decisions', ['policy', 'scope', 'result'])
+ADMISSIONS = Counter('submit_admission_total', 'Submit admission decisions', ['result'])
+
+# KEYS are bucket hashes, ARGV is cost then (rate, burst) per key.
+# Returns {1} when every bucket had room, else {0, seconds to wait, index of the fullest bucket}.
+_TAKE = redis_client.register_script("""
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local levels = {}
+local wait, blocked = 0, 0
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local level = tonumber(state[1]) or burst
+    local elapsed = math.max(0, now - (tonumber(state[2]) or now))
+    level = math.min(burst, level + elapsed * rate)
+    levels[i] = level
+    if level < cost and (cost - level) / rate > wait then
+        wait, blocked = (cost - level) / rate, i
+    end
+end
+if blocked > 0 then
+    return {0, tostring(wait), blocked}
+end
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - cost), 'ts', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+end
+return {1}
+""")
+
+
+def merge_policies(overrides):
+    merged = {name: dict(scopes) for name, scopes in DEFAULT_POLICIES.items()}
+    if overrides:
+        for name, scopes in json.loads(overrides).items():
+            merged.setdefault(name, {}).update(scopes)
+    return merged
+
+
+def policies():
+    return current_app.extensions['rate_limit_policies']
+
+
+def take(buckets, cost=1):
+    """buckets is [(key, rate, burst)], returns (allowed, retry_after seconds, blocking index)"""
+    args = [cost]
+    for _, rate, burst in buckets:
+        args.extend([rate, burst])
+    result = _TAKE(keys=[key for key, _, _ in buckets], args=args)
+    if result[0] == 1:
+        return True, 0, None
+    return False, float(result[1]), int(result[2]) - 1
+
+
+def _identity():
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:
+        # Invalid or expired tokens are rejected by the view itself
+        return None
+
+
+def _too_many(retry_after):
+    response = jsonify({'message': 'Too many requests, please retry shortly'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def limit_request():
+    if not current_app.config['RATE_LIMIT_ENABLED'] or request.method == 'OPTIONS':
+        return None
+    if request.endpoint in EXEMPT_ENDPOINTS:
+        return None
+
+    configured = policies()
+    name = request.blueprint if request.blueprint in configured else 'default'
+    policy = configured.get(name) or {}
+    identities = {'ip': request.remote_addr}
+    if 'user' in policy:
+        identities['user'] = _identity()
+
+    buckets = []
+    scopes = []
+    for scope, (rate, burst) in policy.items():
+        if identities.get(scope) is None:
+            continue
+        buckets.append((f'ratelimit:{name}:{scope}:{identities[scope]}', rate, burst))
+        scopes.append(scope)
+    if not buckets:
+        return None
+
+    try:
+        allowed, retry_after, blocked = take(buckets)
+    except redis.RedisError:
+        return None
+    if allowed:
+        for scope in scopes:
+            DECISIONS.labels(name, scope, 'allowed').inc()
+        return None
+    DECISIONS.labels(name, scopes[blocked], 'limited').inc()
+    return _too_many(retry_after)
+
+
+def admit_submission():
+    """Return ('admit', 0), ('queue', 0) or ('shed', retry_after seconds)"""
+    mode = current_app.config['SUBMIT_ADMISSION']
+    if mode == 'off':
+        return 'admit', 0
+    bucket = (ADMISSION_KEY, current_app.config['SUBMIT_ADMISSION_RATE'], current_app.config['SUBMIT_ADMISSION_BURST'])
+    try:
+        allowed, retry_after, _ = take([bucket])
+    except redis.RedisError:
+        allowed, retry_after = True, 0
+    if allowed:
+        ADMISSIONS.labels('admitted').inc()
+        return 'admit', 0
+    if mode == 'queue':
+        ADMISSIONS.labels('queued').inc()
+        return 'queue', 0
+    ADMISSIONS.labels('shed').inc()
+    return 'shed', retry_after
+
+
+def shed_response(retry_after):
+    response = jsonify({'message': 'Too many submissions right now, nothing was recorded, please retry shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def limiter_status():
+    return {
+        'enabled': current_app.config['RATE_LIMIT_ENABLED'],
+        'policies': {
+            name: {scope: {'rate': rate, 'burst': burst} for scope, (rate, burst) in scopes.items()}
+            for name, scopes in policies().items()
+        },
+        'submit_admission': {
+            'mode': current_app.config['SUBMIT_ADMISSION'],
+            'rate': current_app.config['SUBMIT_ADMISSION_RATE'],
+            'burst': current_app.config['SUBMIT_ADMISSION_BURST']
+        }
+    }
+
+
+def init_rate_limit(app):
+    app.extensions['rate_limit_policies'] = merge_policies(app.config['RATE_LIMIT_POLICIES'])
+    app.before_request(limit_request)
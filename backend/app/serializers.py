@@ -0,0 +1,174 @@
+from sqlalchemy import func
+from app.models import Subject, Chapter, Quiz, QuizDraw, Question, Score, INCLUDE_ARCHIVED, db
+from app.pagination import Page
+
+# Listing serializers.
+# The model to_dict() methods walk lazy relationships (chapter.subject.name,
+# child counts ...), which costs a few queries per row. These helpers
+# take an already filtered query, join the parent names in and compute the
+# child counts with one GROUP BY subquery, so a listing is always one query.
+# They select plain columns rather than entities, so a `fields` projection
+# only reads the requested columns (and skips joins nobody asked for).
+# Archived rows are left out of the listing and of the counts unless
+# include_archived is set, which also adds their is_active flag.
+
+ID_ORDER = ['id']
+SCORE_ORDER = ['timestamp_of_attempt', 'id']
+
+
+def _count_subquery(column):
+    return (
+        db.session.query(column.label('parent_id'), func.count().label('n'))
+        .group_by(column)
+        .subquery()
+    )
+
+
+def _wants(fields, name):
+    return fields is None or name in fields
+
+
+def _select(query, columns, fields=None, page=None, order_by=None, required=()):
+    names = [name for name in columns if _wants(fields, name) or name in required]
+    query = query.with_entities(*[columns[name].label(name) for name in names])
+    if page:
+        query = page.apply(query, [(columns[name], descending) for name, descending in order_by])
+    return [dict(zip(names, row)) for row in query.all()]
+
+
+def _with_archived(query, columns, model, include_archived):
+    if not include_archived:
+        return query
+    columns['is_active'] = model.is_active
+    return query.execution_options(**{INCLUDE_ARCHIVED: True})
+
+
+def _isoformat(items, name):
+    for item in items:
+        if item.get(name) is not None:
+            item[name] = item[name].isoformat()
+
+
+def serialize_subjects(query, fields=None, page=None, include_archived=False):
+    columns = {
+        'id': Subject.id,
+        'name': Subject.name,
+        'description': Subject.description
+    }
+    query = _with_archived(query, columns, Subject, include_archived)
+    if _wants(fields, 'chapters_count'):
+        counts = _count_subquery(Chapter.subject_id)
+        query = query.outerjoin(counts, counts.c.parent_id == Subject.id)
+        columns['chapters_count'] = func.coalesce(counts.c.n, 0)
+    return _select(query, columns, fields, page, [('id', False)], required=ID_ORDER)
+
+
+def serialize_chapters(query, fields=None, page=None, include_archived=False):
+    columns = {
+        'id': Chapter.id,
+        'name': Chapter.name,
+        'description': Chapter.description,
+        'subject_id': Chapter.subject_id
+    }
+    query = _with_archived(query, columns, Chapter, include_archived)
+    if _wants(fields, 'subject_name'):
+        query = query.join(Subject, Subject.id == Chapter.subject_id)
+        columns['subject_name'] = Subject.name
+    if _wants(fields, 'quizzes_count'):
+        counts = _count_subquery(Quiz.chapter_id)
+        query = query.outerjoin(counts, counts.c.parent_id == Chapter.id)
+        columns['quizzes_count'] = func.coalesce(counts.c.n, 0)
+    return _select(query, columns, fields, page, [('id', False)], required=ID_ORDER)
+
+
+def serialize_quizzes(query, fields=None, page=None, include_archived=False):
+    columns = {
+        'id': Quiz.id,
+        'title': Quiz.title,
+        'description': Quiz.description,
+        'chapter_id': Quiz.chapter_id
+    }
+    query = _with_archived(query, columns, Quiz, include_archived)
+    if _wants(fields, 'chapter_name') or _wants(fields, 'subject_name'):
+        query = query.join(Chapter, Chapter.id == Quiz.chapter_id)
+        if _wants(fields, 'chapter_name'):
+            columns['chapter_name'] = Chapter.name
+    if _wants(fields, 'subject_name'):
+        query = query.join(Subject, Subject.id == Chapter.subject_id)
+        columns['subject_name'] = Subject.name
+    columns.update({
+        'date_of_quiz': Quiz.date_of_quiz,
+        'time_duration': Quiz.time_duration,
+        'total_marks': Quiz.total_marks
+    })
+    if _wants(fields, 'questions_count'):
+        # Quizzes drawing randomized papers show the paper size
+        counts = _count_subquery(Question.quiz_id)
+        query = query.outerjoin(counts, counts.c.parent_id == Quiz.id).outerjoin(QuizDraw, QuizDraw.quiz_id == Quiz.id)
+        columns['questions_count'] = func.coalesce(QuizDraw.question_count, counts.c.n, 0)
+    quizzes = _select(query, columns, fields, page, [('id', False)], required=ID_ORDER)
+    _isoformat(quizzes, 'date_of_quiz')
+    return quizzes
+
+
+def serialize_catalog(name, page=None, include_archived=False):
+    """The subjects / chapters / quizzes listing served by the catalog endpoints"""
+    fields = page.fields if page else None
+    if name == 'subjects':
+        return serialize_subjects(Subject.query, fields, page, include_archived)
+    if name == 'chapters':
+        query = Chapter.query if include_archived else Chapter.available()
+        return serialize_chapters(query, fields, page, include_archived)
+    if name == 'quizzes':
+        query = Quiz.query if include_archived else Quiz.available()
+        return serialize_quizzes(query, fields, page, include_archived)
+    raise ValueError(f'Unknown catalog listing {name}')
+
+
+def serialize_questions(query, fields=None, page=None, include_answer=False):
+    columns = {
+        'id': Question.id,
+        'quiz_id': Question.quiz_id,
+        'question_statement': Question.question_statement,
+        'option1': Question.option1,
+        'option2': Question.option2,
+        'option3': Question.option3,
+        'option4': Question.option4,
+        'marks': Question.marks
+    }
+    if include_answer:
+        columns['correct_option'] = Question.correct_option
+    return _select(query, columns, fields, page, [('id', False)], required=ID_ORDER)
+
+
+def serialize_scores(query, limit=None, fields=None, page=None):
+    columns = {
+        'id': Score.id,
+        'quiz_id': Score.quiz_id
+    }
+    if _wants(fields, 'quiz_title'):
+        # Attempts at since archived quizzes keep their title
+        query = query.join(Quiz, Quiz.id == Score.quiz_id).execution_options(**{INCLUDE_ARCHIVED: True})
+        columns['quiz_title'] = Quiz.title
+    columns.update({
+        'user_id': Score.user_id,
+        'total_scored': Score.total_scored,
+        'total_marks': Score.total_marks,
+        'time_taken': Score.time_taken,
+        'timestamp_of_attempt': Score.timestamp_of_attempt
+    })
+    if page is None and limit is not None:
+        page = Page(limit)
+
+    # percentage is derived from total_scored / total_marks
+    with_percentage = _wants(fields, 'percentage')
+    required = SCORE_ORDER + (['total_scored', 'total_marks'] if with_percentage else [])
+    scores = _select(query, columns, fields, page, [('timestamp_of_attempt', True), ('id', True)], required=required)
+    if with_percentage:
+        for score in scores:
+            score['percentage'] = round((score['total_scored'] / score['total_marks']) * 100, 2) if score['total_marks'] else 0
+            for name in ('total_scored', 'total_marks'):
+                if not _wants(fields, name):
+                    del score[name]
+    _isoformat(scores, 'timestamp_of_attempt')
+    return scores
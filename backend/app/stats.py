@@ -0,0 +1,129 @@
+from sqlalchemy import case, func
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import Score, UserStats, db
+
+# Per-user statistics
+# user_stats keeps a running aggregate of each user's attempts so the user
+# dashboard never has to scan the scores table. It is bumped in the same
+# transaction that inserts the Score rows, with a single INSERT ... ON CONFLICT
+# DO UPDATE where the database has one, so concurrent first attempts of the
+# same user cannot both insert the row.
+
+UPSERT_DIALECTS = {'sqlite': sqlite, 'postgresql': postgresql}
+
+
+def _percentage(score):
+    return score.total_scored / score.total_marks * 100 if score.total_marks else 0
+
+
+def _merged(attempts, percentage_sum, best, last):
+    """Column updates folding a batch aggregate into the stored one"""
+    return {
+        'total_attempts': UserStats.total_attempts + attempts,
+        'percentage_sum': UserStats.percentage_sum + percentage_sum,
+        'best_percentage': case(
+            (UserStats.best_percentage.is_(None), best),
+            (UserStats.best_percentage < best, best),
+            else_=UserStats.best_percentage
+        ),
+        'last_attempt_at': case(
+            (UserStats.last_attempt_at.is_(None), last),
+            (UserStats.last_attempt_at < last, last),
+            else_=UserStats.last_attempt_at
+        )
+    }
+
+
+def record_user_attempts(scores):
+    """Fold a batch of new Score rows into user_stats (caller commits)"""
+    batches = {}
+    for score in scores:
+        attempts, percentage_sum, best, last = batches.get(score.user_id, (0, 0.0, None, None))
+        percentage = _percentage(score)
+        timestamp = score.timestamp_of_attempt
+        batches[score.user_id] = (
+            attempts + 1,
+            percentage_sum + percentage,
+            percentage if best is None else max(best, percentage),
+            timestamp if last is None or (timestamp and timestamp > last) else last
+        )
+
+    if not batches:
+        return
+    dialect = UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+    if dialect is not None:
+        statement = dialect.insert(UserStats).values([
+            {
+                'user_id': user_id,
+                'total_attempts': attempts,
+                'percentage_sum': percentage_sum,
+                'best_percentage': best,
+                'last_attempt_at': last
+            }
+            for user_id, (attempts, percentage_sum, best, last) in batches.items()
+        ])
+        new = statement.excluded
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[UserStats.user_id],
+            set_=_merged(new.total_attempts, new.percentage_sum, new.best_percentage, new.last_attempt_at)
+        ))
+        return
+
+    for user_id, (attempts, percentage_sum, best, last) in batches.items():
+        updated = UserStats.query.filter_by(user_id=user_id).update(
+            _merged(attempts, percentage_sum, best, last), synchronize_session=False
+        )
+        if not updated:
+            db.session.add(UserStats(
+                user_id=user_id,
+                total_attempts=attempts,
+                percentage_sum=percentage_sum,
+                best_percentage=best,
+                last_attempt_at=last
+            ))
+
+
+def _aggregates():
+    percentage = case(
+        (Score.total_marks > 0, Score.total_scored * 100.0 / Score.total_marks),
+        else_=0.0
+    )
+    return (
+        func.count(Score.id),
+        func.coalesce(func.sum(percentage), 0.0),
+        func.max(percentage),
+        func.max(Score.timestamp_of_attempt)
+    )
+
+
+def _store(user_id, attempts, percentage_sum, best, last):
+    stats = db.session.get(UserStats, user_id) or UserStats(user_id=user_id)
+    stats.total_attempts = attempts
+    stats.percentage_sum = percentage_sum
+    stats.best_percentage = best
+    stats.last_attempt_at = last
+    db.session.add(stats)
+    return stats
+
+
+def compute_user_stats(user_id):
+    """Rebuild one user's aggregate from the scores table (caller commits)"""
+    row = db.session.query(*_aggregates()).filter(Score.user_id == user_id).one()
+    return _store(user_id, *row)
+
+
+def get_user_stats(user_id):
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        # No row yet (user predates the backfill or never attempted), build it once
+        stats = compute_user_stats(user_id)
+        db.session.commit()
+    return stats
+
+
+def backfill_user_stats():
+    rows = db.session.query(Score.user_id, *_aggregates()).group_by(Score.user_id).all()
+    for user_id, *aggregates in rows:
+        _store(user_id, *aggregates)
+    db.session.commit()
+    return len(rows)
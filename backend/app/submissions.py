@@ -0,0 +1,264 @@
+from flask import current_app
+from datetime import datetime
+import json
+import threading
+import uuid
+import redis
+from sqlalchemy import exc
+from app.cache import redis_client, bump_user_versions
+from app.models import Score, AttemptPaper, SubmissionReceipt, db
+from app.stats import record_user_attempts
+from app.counters import record_attempts
+from app.leaderboards import record_leaderboards
+from app.answers import prepare_scores, store_answers
+
+# Submission ingestion
+# In 'sync' mode (the default) submit_quiz commits its Score row inside the
+# request. In 'async' mode the attempt is scored from the cached answer key,
+# pushed onto a Redis list and acknowledged with a receipt; a Celery worker
+# drains the list and inserts the Score rows in bulk transactions.
+#
+# Each Score of a queued attempt is committed together with its receipt
+# (a primary key), so re-draining a batch after a crash never duplicates an
+# attempt. A batch that fails is rolled back and retried row by row; rows
+# that still fail go to FAILED_KEY with status 'failed' instead of blocking
+# the queue. The drain lock is renewed while a batch runs, and the queue is
+# only read and trimmed by a script that checks the lock still holds the
+# drain's token: a drain whose lock expired mid-batch stops without trimming,
+# so it never removes attempts another drain has read but not yet saved.
+
+QUEUE_KEY = 'submissions:queue'
+FAILED_KEY = 'submissions:failed'
+DRAIN_LOCK_KEY = 'submissions:drain_lock'
+SCHEDULED_KEY = 'submissions:scheduled'
+STATUS_TTL = 24 * 3600
+LOCK_TTL = 60
+
+# Renew / release the drain lock only while it still holds our token
+_RENEW_LOCK = redis_client.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+""")
+_RELEASE_LOCK = redis_client.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+# KEYS: the lock, the queue. ARGV: token, batch size. Returns the batch, false without the lock
+_READ_BATCH = redis_client.register_script("""
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return false
+end
+return redis.call('LRANGE', KEYS[2], 0, ARGV[2] - 1)
+""")
+
+# KEYS: the lock, the queue, the failed list. ARGV: token, number of items read, failed
+# attempts. Drops the items read and moves the failed ones aside, 0 without the lock
+_TRIM_BATCH = redis_client.register_script("""
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('LTRIM', KEYS[2], ARGV[2], -1)
+for i = 3, #ARGV do
+    redis.call('RPUSH', KEYS[3], ARGV[i])
+end
+return 1
+""")
+
+
+def _status_key(receipt):
+    return f'submission:{receipt}'
+
+
+def save_scores(scores):
+    """Insert a batch of Score rows in one transaction"""
+    pending_answers = prepare_scores(scores)
+    db.session.add_all(scores)
+    db.session.flush()
+    store_answers(scores, pending_answers)
+    record_user_attempts(scores)
+    db.session.commit()
+    record_attempts(scores)
+    record_leaderboards(scores)
+    bump_user_versions(score.user_id for score in scores)
+    return scores
+
+
+def enqueue_submission(quiz_id, user_id, total_scored, total_marks, time_taken, answers, question_ids=None):
+    attempt = {
+        'receipt': uuid.uuid4().hex,
+        'quiz_id': quiz_id,
+        'user_id': user_id,
+        'total_scored': total_scored,
+        'total_marks': total_marks,
+        'time_taken': time_taken,
+        'answers': answers,
+        'timestamp': datetime.utcnow().isoformat()
+    }
+    if question_ids is not None:
+        attempt['question_ids'] = question_ids
+    status_key = _status_key(attempt['receipt'])
+
+    pipe = redis_client.pipeline()
+    pipe.hset(status_key, mapping={'status': 'queued', 'user_id': user_id, 'quiz_id': quiz_id})
+    pipe.expire(status_key, STATUS_TTL)
+    pipe.rpush(QUEUE_KEY, json.dumps(attempt, separators=(',', ':')))
+    pipe.execute()
+
+    _schedule_drain()
+    return attempt
+
+
+def _schedule_drain():
+    # At most one pending drain task per second, the beat schedule is the fallback.
+    # The attempt is already queued, a failure here must not fail the submission.
+    try:
+        if not redis_client.set(SCHEDULED_KEY, 1, nx=True, ex=1):
+            return
+    except redis.RedisError as e:
+        current_app.logger.warning('Could not schedule submission drain: %s', e)
+        return
+    from app.tasks import persist_submissions
+    try:
+        persist_submissions.apply_async(countdown=1, retry=False)
+    except Exception as e:
+        current_app.logger.warning('Could not schedule submission drain: %s', e)
+
+
+def submission_status(receipt):
+    status = redis_client.hgetall(_status_key(receipt))
+    return status or None
+
+
+class _DrainLock:
+    """Redis lock with a token, kept alive by a renewal thread until released"""
+
+    def __init__(self):
+        self.token = uuid.uuid4().hex
+        self.lost = False
+        self._stopped = threading.Event()
+
+    def acquire(self):
+        if not redis_client.set(DRAIN_LOCK_KEY, self.token, nx=True, ex=LOCK_TTL):
+            return False
+        threading.Thread(target=self._renew, name='drain-lock', daemon=True).start()
+        return True
+
+    def _renew(self):
+        while not self._stopped.wait(LOCK_TTL / 3):
+            try:
+                if not _RENEW_LOCK(keys=[DRAIN_LOCK_KEY], args=[self.token, LOCK_TTL]):
+                    self.lost = True
+                    return
+            except redis.RedisError:
+                pass
+
+    def release(self):
+        self._stopped.set()
+        _RELEASE_LOCK(keys=[DRAIN_LOCK_KEY], args=[self.token])
+
+
+def _score(attempt):
+    return Score(
+        quiz_id=attempt['quiz_id'],
+        user_id=attempt['user_id'],
+        total_scored=attempt['total_scored'],
+        total_marks=attempt['total_marks'],
+        time_taken=attempt['time_taken'],
+        answers=attempt['answers'],
+        timestamp_of_attempt=datetime.fromisoformat(attempt['timestamp']),
+        paper=AttemptPaper(question_ids=attempt['question_ids']) if 'question_ids' in attempt else None,
+        receipt=SubmissionReceipt(receipt=attempt['receipt'])
+    )
+
+
+def _persisted(receipts):
+    """{receipt: score_id} for receipts that already have a Score"""
+    if not receipts:
+        return {}
+    rows = (
+        SubmissionReceipt.query.with_entities(SubmissionReceipt.receipt, SubmissionReceipt.score_id)
+        .filter(SubmissionReceipt.receipt.in_(receipts))
+        .all()
+    )
+    return dict(rows)
+
+
+def _save_batch(attempts):
+    """Persist attempts, returns ({receipt: score_id}, [failed attempts])"""
+    try:
+        scores = save_scores([_score(attempt) for attempt in attempts])
+        return {score.receipt.receipt: score.id for score in scores}, []
+    except (exc.OperationalError, exc.InterfaceError):
+        # Database unavailable, leave the batch queued for the next drain
+        db.session.rollback()
+        raise
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Submission batch failed, retrying its %d attempts one by one', len(attempts))
+
+    saved, failed = {}, []
+    for attempt in attempts:
+        try:
+            score = save_scores([_score(attempt)])[0]
+            saved[attempt['receipt']] = score.id
+        except (exc.OperationalError, exc.InterfaceError):
+            db.session.rollback()
+            raise
+        except Exception:
+            db.session.rollback()
+            # A concurrent drain may have persisted it in the meantime
+            saved.update(_persisted([attempt['receipt']]))
+            if attempt['receipt'] not in saved:
+                current_app.logger.exception('Could not persist submission %s', attempt['receipt'])
+                failed.append(attempt)
+    return saved, failed
+
+
+def drain_submission_queue(batch_size=None):
+    """Persist queued attempts, returns the number of Score rows inserted"""
+    batch_size = batch_size or current_app.config['SUBMISSION_BATCH_SIZE']
+    lock = _DrainLock()
+    if not lock.acquire():
+        return 0
+
+    persisted = 0
+    try:
+        while not lock.lost:
+            items = _READ_BATCH(keys=[DRAIN_LOCK_KEY, QUEUE_KEY], args=[lock.token, batch_size])
+            if not items:
+                break
+            attempts = [json.loads(item) for item in items]
+
+            # Attempts committed by a drain that died before trimming the queue keep their Score
+            done = _persisted([attempt['receipt'] for attempt in attempts])
+            pending = {attempt['receipt']: attempt for attempt in attempts if attempt['receipt'] not in done}
+            saved, failed = _save_batch(list(pending.values()))
+
+            persisted += len(saved)
+            pipe = redis_client.pipeline()
+            for receipt, score_id in {**done, **saved}.items():
+                pipe.hset(_status_key(receipt), mapping={'status': 'persisted', 'score_id': score_id})
+                pipe.expire(_status_key(receipt), STATUS_TTL)
+            pipe.execute()
+
+            # Lock lost mid-batch: the next drain reads these items again, saved ones are skipped by receipt
+            if not _TRIM_BATCH(keys=[DRAIN_LOCK_KEY, QUEUE_KEY, FAILED_KEY], args=[
+                lock.token, len(items), *[json.dumps(attempt, separators=(',', ':')) for attempt in failed]
+            ]):
+                lock.lost = True
+                break
+            if failed:
+                pipe = redis_client.pipeline()
+                for attempt in failed:
+                    pipe.hset(_status_key(attempt['receipt']), 'status', 'failed')
+                    pipe.expire(_status_key(attempt['receipt']), STATUS_TTL)
+                pipe.execute()
+    finally:
+        lock.release()
+
+    return persisted
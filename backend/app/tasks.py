@@ -0,0 +1,69 @@
+from celery import Celery, Task
+
+# Celery tasks
+# The worker is started through celery_worker.py, which builds the Flask app:
+#   celery -A celery_worker.celery worker -B --loglevel=info
+
+_flask_app = None
+
+
+class FlaskTask(Task):
+    def __call__(self, *args, **kwargs):
+        global _flask_app
+        if _flask_app is None:
+            from app import create_app
+            _flask_app = create_app()
+        with _flask_app.app_context():
+            return self.run(*args, **kwargs)
+
+
+celery = Celery('quiz', task_cls=FlaskTask)
+
+
+def init_celery(app):
+    global _flask_app
+    _flask_app = app
+    celery.conf.update(
+        broker_url=app.config['CELERY_BROKER_URL'],
+        result_backend=app.config['CELERY_RESULT_BACKEND'],
+        task_always_eager=app.config.get('CELERY_TASK_ALWAYS_EAGER', False),
+        beat_schedule={
+            'persist-submissions': {
+                'task': 'app.tasks.persist_submissions',
+                'schedule': 5.0
+            },
+            'reconcile-dashboard-counters': {
+                'task': 'app.tasks.reconcile_dashboard_counters',
+                'schedule': app.config['COUNTERS_RECONCILE_INTERVAL']
+            },
+            'prewarm-upcoming-quizzes': {
+                'task': 'app.tasks.prewarm_quizzes',
+                'schedule': app.config['PREWARM_INTERVAL']
+            }
+        }
+    )
+    return celery
+
+
+@celery.task(name='app.tasks.persist_submissions')
+def persist_submissions():
+    from app.submissions import drain_submission_queue
+    return drain_submission_queue()
+
+
+@celery.task(name='app.tasks.reconcile_dashboard_counters')
+def reconcile_dashboard_counters():
+    from app.counters import reconcile_counters
+    return reconcile_counters()
+
+
+@celery.task(name='app.tasks.prewarm_quizzes')
+def prewarm_quizzes():
+    from app.prewarm import prewarm_quizzes as warm
+    return warm()
+
+
+@celery.task(name='app.tasks.export_scores')
+def export_scores(export_id, filters, fmt):
+    from app.exports import write_scores_export
+    return write_scores_export(export_id, filters, fmt)
@@ -1,7 +1,13 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import Quiz, Subject, Chapter, Score, Question, db
+from app.cache import catalog_response, cached_catalog, catalog_version, user_version
+from app.http_cache import version_etag, not_modified, with_etag
+from app.stats import get_user_stats
+from app.serializers import serialize_catalog, serialize_scores, SCORE_ORDER
+from app.pagination import Page, with_next_cursor
 from datetime import datetime
+import json
 
 user_bp = Blueprint('user', __name__)
 
@@ -13,46 +19,68 @@ user_bp = Blueprint('user', __name__)
 def get_user_dashboard():
     user_id = get_jwt_identity()
     print(user_id,"sdfjklskjf")
-    # Get user's quiz attempts
-    scores = Score.query.filter_by(user_id=user_id).order_by(Score.timestamp_of_attempt.desc()).all()
+    etag = version_etag('dashboard', user_id, user_version(user_id), catalog_version())
+    response = not_modified(etag)
+    if response is not None:
+        return response
     
-    # Calculate statistics
-    total_attempts = len(scores)
-    avg_score = sum(score.total_scored / score.total_marks * 100 for score in scores) / total_attempts if total_attempts > 0 else 0
+    stats = get_user_stats(user_id).to_dict()
+    recent_scores = Score.query.filter_by(user_id=user_id).order_by(Score.timestamp_of_attempt.desc())
+    available_quizzes = cached_catalog('quizzes:count', lambda: Quiz.available().count())
     
     dashboard_data = {
-        'total_attempts': total_attempts,
-        'average_score': round(avg_score, 2),
-        'recent_attempts': [score.to_dict() for score in scores[:10]],
-        'available_quizzes': Quiz.query.filter_by(is_active=True).count()
+        'total_attempts': stats['total_attempts'],
+        'average_score': stats['average_score'],
+        'best_score': stats['best_score'],
+        'last_attempt_at': stats['last_attempt_at'],
+        'recent_attempts': serialize_scores(recent_scores, limit=10),
+        'available_quizzes': json.loads(available_quizzes)
     }
     
-    return jsonify(dashboard_data), 200
+    return with_etag(jsonify(dashboard_data), etag), 200
 
 
 
 @user_bp.route('/subjects', methods=['GET'])
 @jwt_required()
 def get_available_subjects():
-    subjects = Subject.query.filter_by(is_active=True).all()
-    return jsonify([subject.to_dict() for subject in subjects]), 200
+    page = Page.from_request()
+    return catalog_response(
+        'subjects',
+        lambda: serialize_catalog('subjects', page),
+        page
+    )
 
 @user_bp.route('/chapters', methods=['GET'])
 @jwt_required()
 def get_subject_chapters():
-    chapters = Chapter.query.filter_by( is_active=True).all()
-    return jsonify([chapter.to_dict() for chapter in chapters]), 200
+    page = Page.from_request()
+    return catalog_response(
+        'chapters',
+        lambda: serialize_catalog('chapters', page),
+        page
+    )
 
 @user_bp.route('/quizzes', methods=['GET'])
 @jwt_required()
 def get_chapter_quizzes():
-    quizzes = Quiz.query.filter_by( is_active=True).all()
-    return jsonify([quiz.to_dict() for quiz in quizzes]), 200
+    page = Page.from_request()
+    return catalog_response(
+        'quizzes',
+        lambda: serialize_catalog('quizzes', page),
+        page
+    )
 
 
 @user_bp.route('/scores', methods=['GET'])
 @jwt_required()
 def get_user_scores():
     user_id = get_jwt_identity()
-    scores = Score.query.filter_by(user_id=user_id).order_by(Score.timestamp_of_attempt.desc()).all()
-    return jsonify([score.to_dict() for score in scores]), 200
+    etag = version_etag('scores', user_id, user_version(user_id))
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    
+    page = Page.from_request()
+    scores = serialize_scores(Score.query.filter_by(user_id=user_id), fields=page.fields, page=page)
+    return with_etag(with_next_cursor(jsonify(scores), page.next_cursor(scores, SCORE_ORDER)), etag), 200
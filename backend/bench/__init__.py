@@ -0,0 +1 @@
+# Benchmarks, not tests: see exam_day.py
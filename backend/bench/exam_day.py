@@ -0,0 +1,211 @@
+"""Exam-day benchmark.
+
+Seeds a synthetic dataset into a fresh SQLite database, then drives the real
+Flask app through the exam-day sequence with the test client:
+
+    login storm -> start_quiz burst -> autosave rounds -> submit_quiz spike
+
+and reports per-phase throughput, p50/p95/p99 latency and SQL statements per
+request. Redis is replaced by an in-process fakeredis server, so it runs
+offline. From the backend directory:
+
+    pip install -r bench/requirements.txt
+    python -m bench.exam_day --users 5000 --scores 1000000 --candidates 500
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--subjects', type=int, default=5)
+    parser.add_argument('--chapters', type=int, default=4, help='per subject')
+    parser.add_argument('--quizzes', type=int, default=3, help='per chapter')
+    parser.add_argument('--questions', type=int, default=20, help='per quiz')
+    parser.add_argument('--scores', type=int, default=200000)
+    parser.add_argument('--candidates', type=int, default=200, help='users sitting the exam')
+    parser.add_argument('--autosaves', type=int, default=5, help='autosave rounds per candidate')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads')
+    parser.add_argument('--submission-mode', choices=['sync', 'async'], default='sync')
+    parser.add_argument('--draw', type=int, default=0, help='questions per randomized paper (default: fixed paper)')
+    parser.add_argument('--rate-limit', action='store_true', help='keep the rate limiter on (all clients share one IP)')
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--database', help='SQLite file to create (default: a temp file)')
+    parser.add_argument('--json', dest='json_path', help='also write the report to this file')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+class Recorder:
+    """Latency and SQL statement count per request, grouped by phase"""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.walls = {}
+
+    def on_execute(self, *args):
+        self.local.queries = getattr(self.local, 'queries', 0) + 1
+
+    def request(self, phase, client, method, url, **kwargs):
+        self.local.queries = 0
+        started = time.perf_counter()
+        response = getattr(client, method)(url, **kwargs)
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.samples.setdefault(phase, []).append((elapsed, self.local.queries, response.status_code))
+        return response
+
+    def report(self):
+        rows = []
+        for phase, samples in self.samples.items():
+            latencies = np.array([s[0] for s in samples]) * 1000
+            queries = np.array([s[1] for s in samples])
+            errors = sum(1 for s in samples if s[2] >= 400)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            rows.append({
+                'phase': phase,
+                'requests': len(samples),
+                'errors': errors,
+                'throughput': round(len(samples) / self.walls[phase], 1) if self.walls.get(phase) else None,
+                'p50_ms': round(float(p50), 2),
+                'p95_ms': round(float(p95), 2),
+                'p99_ms': round(float(p99), 2),
+                'queries_per_request': round(float(queries.mean()), 2),
+                'max_queries': int(queries.max())
+            })
+        return rows
+
+
+def run_phase(recorder, phase, app, jobs, concurrency):
+    """Run job(client) for every job on `concurrency` threads, one test client per thread"""
+    clients = threading.local()
+
+    def run(job):
+        if not hasattr(clients, 'client'):
+            clients.client = app.test_client()
+        return job(clients.client)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run, jobs))
+    recorder.walls[phase] = time.perf_counter() - started
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    database = args.database or os.path.join(tempfile.mkdtemp(prefix='quiz-bench-'), 'bench.db')
+    if os.path.exists(database):
+        sys.exit(f'{database} already exists, the benchmark needs a fresh database')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(database)
+    os.environ['SUBMISSION_MODE'] = args.submission_mode
+    os.environ['RATE_LIMIT_ENABLED'] = 'true' if args.rate_limit else 'false'
+
+    from bench.fake_redis import install
+    install()
+
+    from sqlalchemy import event
+    from app import create_app
+    from app.models import db, QuizDraw
+    from app.stats import backfill_user_stats
+    from app.leaderboards import rebuild_leaderboards
+    from app.counters import reconcile_counters
+    from app.submissions import drain_submission_queue, SCHEDULED_KEY
+    from app.cache import redis_client
+    from bench.seed import seed_dataset, BENCH_PASSWORD
+
+    app = create_app()
+    recorder = Recorder()
+
+    with app.app_context():
+        print(f'Seeding {database} ...', flush=True)
+        started = time.perf_counter()
+        ids = seed_dataset(
+            args.users, args.subjects, args.chapters, args.quizzes, args.questions, args.scores,
+            bcrypt_rounds=args.bcrypt_rounds, seed=args.seed
+        )
+        if args.draw:
+            # Randomized papers drawn from the first chapter's bank
+            db.session.add(QuizDraw(quiz_id=ids['quiz_ids'][0], question_count=args.draw))
+            db.session.commit()
+        backfill_user_stats()
+        rebuild_leaderboards()
+        reconcile_counters()
+        print(f'Seeded in {time.perf_counter() - started:.1f}s', flush=True)
+        event.listen(db.engine, 'before_cursor_execute', recorder.on_execute)
+
+    candidates = ids['user_ids'][:args.candidates]
+    quiz_id = ids['quiz_ids'][0]
+    if args.submission_mode == 'async':
+        # The benchmark drains the queue itself instead of scheduling Celery tasks
+        redis_client.set(SCHEDULED_KEY, 1)
+
+    def login(user_id):
+        def job(client):
+            response = recorder.request('login', client, 'post', '/api/auth/login',
+                                        json={'username': f'bench{user_id - candidates[0]}', 'password': BENCH_PASSWORD})
+            return {'Authorization': 'Bearer ' + response.get_json()['access_token']} if response.status_code == 200 else None
+        return job
+
+    headers = [h for h in run_phase(recorder, 'login', app, [login(u) for u in candidates], args.concurrency) if h]
+
+    def start(h):
+        def job(client):
+            response = recorder.request('start_quiz', client, 'get', f'/api/quiz/{quiz_id}/start', headers=h)
+            return [q['id'] for q in response.get_json()['questions']] if response.status_code == 200 else []
+        return job
+
+    papers = run_phase(recorder, 'start_quiz', app, [start(h) for h in headers], args.concurrency)
+
+    def autosave(h, question_ids, round_no):
+        def job(client):
+            delta = {str(q): (q + round_no) % 4 + 1 for q in question_ids[round_no::max(args.autosaves, 1)]}
+            recorder.request('autosave', client, 'post', f'/api/quiz/{quiz_id}/autosave', headers=h, json={'answers': delta})
+        return job
+
+    run_phase(recorder, 'autosave', app, [
+        autosave(h, question_ids, round_no)
+        for round_no in range(args.autosaves)
+        for h, question_ids in zip(headers, papers)
+    ], args.concurrency)
+
+    def submit(h):
+        def job(client):
+            recorder.request('submit_quiz', client, 'post', f'/api/quiz/{quiz_id}/submit', headers=h,
+                             json={'answers': {}, 'time_taken': 10})
+        return job
+
+    run_phase(recorder, 'submit_quiz', app, [submit(h) for h in headers], args.concurrency)
+
+    report = {'args': vars(args), 'phases': recorder.report()}
+    if args.submission_mode == 'async':
+        with app.app_context():
+            started = time.perf_counter()
+            report['drained'] = drain_submission_queue()
+            report['drain_seconds'] = round(time.perf_counter() - started, 3)
+
+    columns = ['phase', 'requests', 'errors', 'throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request', 'max_queries']
+    print(''.join(f'{c:>20}' for c in columns))
+    for row in report['phases']:
+        print(''.join(f'{str(row[c]):>20}' for c in columns))
+    if 'drained' in report:
+        print(f"drained {report['drained']} queued submissions in {report['drain_seconds']}s")
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
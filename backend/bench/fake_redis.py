@@ -0,0 +1,21 @@
+import fakeredis
+import redis
+
+# In-process Redis stand-in
+# app.cache builds its clients at import time, so install() must run before
+# anything from `app` is imported. Every client, whatever its pool, talks to
+# one shared fake server; decode_responses is taken from the pool settings.
+
+
+def install():
+    server = fakeredis.FakeServer()
+
+    class FakeRedis(fakeredis.FakeRedis):
+        def __init__(self, *args, connection_pool=None, **kwargs):
+            if connection_pool is not None:
+                kwargs.setdefault('decode_responses', connection_pool.connection_kwargs.get('decode_responses', False))
+            super().__init__(*args, server=server, **kwargs)
+
+    redis.Redis = FakeRedis
+    redis.StrictRedis = FakeRedis
+    return server
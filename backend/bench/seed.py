@@ -0,0 +1,88 @@
+from sqlalchemy import insert
+from datetime import datetime, timedelta
+import bcrypt
+import random
+from app.models import User, Subject, Chapter, Quiz, Question, Score, db
+
+# Synthetic dataset
+# Rows are written with one executemany per chunk straight through the model
+# tables, so a few million scores load in minutes. Every bench user shares the
+# password BENCH_PASSWORD (hashed once). Quizzes are created in order, so the
+# questions of quiz n are a contiguous id range, which lets scores carry
+# realistic answer blobs without reading anything back.
+
+BENCH_PASSWORD = 'bench123'
+
+
+def _insert(model, rows, chunk_size):
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(insert(model), rows[start:start + chunk_size])
+
+
+def seed_dataset(users, subjects, chapters, quizzes, questions, scores,
+                 bcrypt_rounds=12, chunk_size=5000, seed=0):
+    """Load the dataset into an empty database, returns the ids exam_day needs"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt(bcrypt_rounds)).decode('utf-8')
+    first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    _insert(User, [
+        {'username': f'bench{i}', 'password_hash': password_hash, 'full_name': f'Bench User {i}', 'role': 'user'}
+        for i in range(users)
+    ], chunk_size)
+    user_ids = list(range(first_user, first_user + users))
+
+    _insert(Subject, [{'name': f'Subject {s}', 'is_active': True} for s in range(subjects)], chunk_size)
+    subject_ids = [row.id for row in Subject.query.with_entities(Subject.id).order_by(Subject.id)]
+    _insert(Chapter, [
+        {'name': f'Chapter {c}', 'subject_id': subject_id, 'is_active': True}
+        for subject_id in subject_ids for c in range(chapters)
+    ], chunk_size)
+    chapter_ids = [row.id for row in Chapter.query.with_entities(Chapter.id).order_by(Chapter.id)]
+    _insert(Quiz, [
+        {
+            'chapter_id': chapter_id, 'title': f'Quiz {q}', 'date_of_quiz': now,
+            'time_duration': 30, 'total_marks': questions, 'is_active': True
+        }
+        for chapter_id in chapter_ids for q in range(quizzes)
+    ], chunk_size)
+    quiz_ids = [row.id for row in Quiz.query.with_entities(Quiz.id).order_by(Quiz.id)]
+
+    first_question = (db.session.query(db.func.max(Question.id)).scalar() or 0) + 1
+    correct = {}
+    rows = []
+    for quiz_id in quiz_ids:
+        for q in range(questions):
+            option = rng.randint(1, 4)
+            correct[first_question + len(rows)] = option
+            rows.append({
+                'quiz_id': quiz_id, 'question_statement': f'Question {q} of quiz {quiz_id}',
+                'option1': 'A', 'option2': 'B', 'option3': 'C', 'option4': 'D',
+                'correct_option': option, 'marks': 1
+            })
+    _insert(Question, rows, chunk_size)
+    db.session.commit()
+
+    chunk = []
+    for _ in range(scores):
+        index = rng.randrange(len(quiz_ids))
+        question_ids = range(first_question + index * questions, first_question + (index + 1) * questions)
+        answers = {str(question_id): rng.randint(1, 4) for question_id in question_ids}
+        chunk.append({
+            'quiz_id': quiz_ids[index],
+            'user_id': rng.choice(user_ids),
+            'total_scored': sum(1 for question_id, option in answers.items() if correct[int(question_id)] == option),
+            'total_marks': questions,
+            'time_taken': rng.randint(1, 30),
+            'timestamp_of_attempt': now - timedelta(seconds=rng.randrange(90 * 24 * 3600)),
+            'answers': answers
+        })
+        if len(chunk) >= chunk_size:
+            _insert(Score, chunk, chunk_size)
+            db.session.commit()
+            chunk = []
+    _insert(Score, chunk, chunk_size)
+    db.session.commit()
+
+    return {'user_ids': user_ids, 'quiz_ids': quiz_ids}
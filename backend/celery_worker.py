@@ -0,0 +1,5 @@
+from app import create_app
+from app.tasks import celery
+
+app = create_app()
+# celery -A celery_worker.celery worker -B --loglevel=info
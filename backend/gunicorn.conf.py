@@ -0,0 +1,35 @@
+import multiprocessing
+import os
+
+# gunicorn -c gunicorn.conf.py wsgi:app
+# Each worker process runs a few threads, so requests waiting on Redis or the
+# database do not hold a whole process. The app is loaded once in the master
+# (schema upgrade and admin user run a single time) and forked into workers.
+
+bind = os.environ.get('GUNICORN_BIND') or '0.0.0.0:5000'
+workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count() * 2 + 1)
+worker_class = 'gthread'
+# A live SSE stream holds one thread, LIVE_MAX_STREAMS caps them per worker and
+# the default leaves 4 threads for ordinary requests when every stream is open
+threads = int(os.environ.get('GUNICORN_THREADS') or 4 + int(os.environ.get('LIVE_MAX_STREAMS') or 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 30)
+keepalive = 5
+max_requests = 10000
+max_requests_jitter = 1000
+preload_app = True
+accesslog = '-'
+# Metrics are aggregated across workers when PROMETHEUS_MULTIPROC_DIR points at
+# an empty directory (cleared before each start)
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared with the workers
+    from app.models import db
+    with worker.app.wsgi().app_context():
+        db.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
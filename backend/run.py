@@ -3,5 +3,6 @@ from app import create_app
 app = create_app()
 # from app.urls import register_routes
 # register_routes(app)
+# Development server only, use `gunicorn -c gunicorn.conf.py wsgi:app` in production
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
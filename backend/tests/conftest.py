@@ -0,0 +1,90 @@
+import os
+import tempfile
+import bcrypt
+import pytest
+
+# The app reads its settings and builds its Redis clients at import time, so
+# the database, the settings and the Redis stand-in are set up before anything
+# from `app` is imported. Every test starts from empty tables and an empty Redis.
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='quiz-tests-'), 'test.db')
+os.environ['RATE_LIMIT_ENABLED'] = 'false'
+os.environ['SUBMISSION_MODE'] = 'sync'
+
+from bench.fake_redis import install
+
+redis_server = install()
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+from app.models import User, Subject, Chapter, Quiz, Question, db
+from app.migrations import upgrade_schema
+from app.cache import redis_client
+from app import analytics, compression, quiz_cache
+from datetime import datetime
+
+PASSWORD_HASH = bcrypt.hashpw(b'secret', bcrypt.gensalt(4)).decode()
+
+
+@pytest.fixture(scope='session')
+def app():
+    return create_app()
+
+
+@pytest.fixture(autouse=True)
+def clean(app):
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        upgrade_schema()
+        redis_client.flushall()
+        quiz_cache._local_cache.clear()
+        analytics._local_matrices.clear()
+        compression._prefixes.clear()
+        yield
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def make_user(username, role='user'):
+    user = User(username=username, full_name=username, role=role, password_hash=PASSWORD_HASH)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def auth(user):
+    token = create_access_token(identity=user.id, additional_claims={'role': user.role})
+    return {'Authorization': 'Bearer ' + token}
+
+
+@pytest.fixture
+def admin():
+    return make_user('admin', role='admin')
+
+
+@pytest.fixture
+def candidate():
+    return make_user('candidate')
+
+
+def make_quiz(questions=3, time_duration=30, chapter=None, marks=1):
+    """A quiz with `questions` questions, the correct option of question i is i % 4 + 1"""
+    if chapter is None:
+        subject = Subject(name='Subject')
+        chapter = Chapter(name='Chapter', subject=subject)
+        db.session.add(chapter)
+    quiz = Quiz(chapter=chapter, title='Quiz', date_of_quiz=datetime(2026, 1, 1), time_duration=time_duration)
+    for i in range(questions):
+        quiz.questions.append(Question(
+            question_statement=f'q{i}', option1='a', option2='b', option3='c', option4='d',
+            correct_option=i % 4 + 1, marks=marks
+        ))
+    quiz.total_marks = questions * marks
+    db.session.add(quiz)
+    db.session.commit()
+    return quiz
@@ -0,0 +1,117 @@
+import pytest
+from app import analytics
+from app.analytics import compute_quiz_analytics, get_quiz_analytics
+from app.cache import binary_redis_client, redis_client
+from app.models import Score, db
+from app.submissions import save_scores
+from tests.conftest import auth, make_quiz, make_user
+
+
+def attempt(quiz, user, answers):
+    key = {str(question.id): question for question in quiz.questions}
+    scored = sum(key[question_id].marks for question_id, option in answers.items() if key[question_id].correct_option == option)
+    save_scores([Score(quiz_id=quiz.id, user_id=user.id, total_scored=scored, total_marks=quiz.total_marks, answers=answers)])
+
+
+def chunk_count(quiz_id):
+    generation = redis_client.hget(f'quiz:{quiz_id}:analytics:meta', 'generation')
+    return binary_redis_client.llen(f'quiz:{quiz_id}:analytics:chunks:{generation}')
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    calls = []
+    decode = analytics._decode
+
+    def counting(payload):
+        calls.append(payload)
+        return decode(payload)
+
+    monkeypatch.setattr(analytics, '_decode', counting)
+    return calls
+
+
+def test_new_attempts_are_appended_as_chunks(candidate, decodes):
+    quiz = make_quiz(questions=3)
+    first, second, third = [str(question.id) for question in quiz.questions]
+    attempt(quiz, candidate, {first: 1, second: 2})
+    report = compute_quiz_analytics(quiz.id)
+    attempt(quiz, candidate, {first: 2})
+    report = compute_quiz_analytics(quiz.id)
+
+    assert chunk_count(quiz.id) == 2
+    assert report['attempts'] == 2
+    assert [question['percent_correct'] for question in report['questions']] == [50.0, 50.0, 0.0]
+    # This process built both chunks itself, nothing was decoded
+    assert decodes == []
+
+    # Another process only decodes the chunks it has not seen
+    analytics._local_matrices.clear()
+    assert compute_quiz_analytics(quiz.id) == report
+    assert len(decodes) == 2
+    attempt(quiz, candidate, {third: 3})
+    compute_quiz_analytics(quiz.id)
+    assert len(decodes) == 2
+
+
+def test_question_edits_do_not_rebuild(client, admin, candidate, decodes):
+    quiz = make_quiz(questions=2)
+    first, second = [str(question.id) for question in quiz.questions]
+    attempt(quiz, candidate, {first: 1, second: 1})
+    compute_quiz_analytics(quiz.id)
+
+    response = client.post(f'/api/admin/quizzes/{quiz.id}/questions', headers=auth(admin), json={
+        'question_statement': 'new', 'option1': 'a', 'option2': 'b', 'option3': 'c', 'option4': 'd', 'correct_option': 3
+    })
+    assert response.status_code == 201
+    added_id = str(response.get_json()['id'])
+    db.session.refresh(quiz)
+    attempt(quiz, make_user('late'), {added_id: 3})
+
+    analytics._local_matrices.clear()
+    report = compute_quiz_analytics(quiz.id)
+    assert chunk_count(quiz.id) == 2
+    added = report['questions'][2]
+    # The first attempt never saw the new question
+    assert (added['shown'], added['skipped'], added['percent_correct']) == (1, 0, 100.0)
+    assert report['questions'][1]['shown'] == 2
+
+
+def test_compaction_keeps_the_report(candidate, monkeypatch):
+    monkeypatch.setattr(analytics, 'MAX_CHUNKS', 2)
+    quiz = make_quiz(questions=2)
+    first = str(quiz.questions[0].id)
+    for option in (1, 2, 1):
+        attempt(quiz, candidate, {first: option})
+        report = compute_quiz_analytics(quiz.id)
+
+    assert chunk_count(quiz.id) == 1
+    analytics._local_matrices.clear()
+    assert compute_quiz_analytics(quiz.id) == report
+    assert report['questions'][0]['option_counts'] == {'1': 2, '2': 1, '3': 0, '4': 0}
+
+
+def test_attempts_committed_late_with_lower_ids_are_counted(candidate):
+    quiz = make_quiz(questions=2)
+    first = str(quiz.questions[0].id)
+
+    def scored(score_id, option):
+        score = Score(id=score_id, quiz_id=quiz.id, user_id=candidate.id, answers={first: option},
+                      total_scored=int(option == 1), total_marks=quiz.total_marks)
+        save_scores([score])
+
+    scored(10, 1)
+    assert get_quiz_analytics(quiz.id)['attempts'] == 1
+    # A queued batch drained after a later sync submission committed
+    scored(5, 2)
+    report = get_quiz_analytics(quiz.id)
+    assert report['attempts'] == 2
+    assert report['questions'][0]['option_counts'] == {'1': 1, '2': 1, '3': 0, '4': 0}
+
+    scored(7, 3)
+    scored(12, 1)
+    analytics._local_matrices.clear()
+    report = get_quiz_analytics(quiz.id)
+    assert report['attempts'] == 4
+    assert report['questions'][0]['option_counts'] == {'1': 2, '2': 1, '3': 1, '4': 0}
+    assert chunk_count(quiz.id) == 3
@@ -0,0 +1,49 @@
+from app.cache import redis_client
+from app.models import Score
+from tests.conftest import auth, make_quiz
+
+
+def start(client, quiz, headers):
+    return client.get(f'/api/quiz/{quiz.id}/start', headers=headers).get_json()
+
+
+def submit(client, quiz, headers, token, answers=None):
+    return client.post(f'/api/quiz/{quiz.id}/submit', headers=headers, json={
+        'answers': answers or {}, 'attempt_token': token
+    })
+
+
+def test_token_cannot_resubmit_a_claimed_session(client, candidate):
+    quiz = make_quiz()
+    headers = auth(candidate)
+    token = start(client, quiz, headers)['attempt_token']
+
+    first = submit(client, quiz, headers, token)
+    assert first.status_code == 200
+    correct = first.get_json()['correct_answers']
+    assert submit(client, quiz, headers, token, correct).status_code == 404
+    assert Score.query.count() == 1
+
+
+def test_token_is_single_use_without_a_session(client, candidate):
+    quiz = make_quiz()
+    headers = auth(candidate)
+    token = start(client, quiz, headers)['attempt_token']
+    # Session lost (Redis restarted), the token still carries the attempt once
+    redis_client.delete(f'exam:{quiz.id}:{candidate.id}')
+
+    assert submit(client, quiz, headers, token).status_code == 200
+    assert submit(client, quiz, headers, token).status_code == 404
+    assert Score.query.count() == 1
+
+
+def test_untimed_token_is_single_use(client, candidate):
+    quiz = make_quiz(time_duration=0)
+    headers = auth(candidate)
+    token = start(client, quiz, headers)['attempt_token']
+
+    assert submit(client, quiz, headers, token).status_code == 200
+    assert submit(client, quiz, headers, token).status_code == 404
+    # A new start is a new attempt
+    assert submit(client, quiz, headers, start(client, quiz, headers)['attempt_token']).status_code == 200
+    assert Score.query.count() == 2
@@ -0,0 +1,21 @@
+import pytest
+from tests.conftest import auth
+
+EXPORTS = [('get', '/api/admin/scores/export'), ('post', '/api/admin/scores/export'), ('get', '/api/admin/scores/export/' + '0' * 32)]
+
+
+@pytest.mark.parametrize('method, url', EXPORTS)
+def test_exports_require_a_token(client, method, url):
+    assert getattr(client, method)(url).status_code == 401
+
+
+@pytest.mark.parametrize('method, url', EXPORTS)
+def test_exports_require_an_admin(client, candidate, method, url):
+    response = getattr(client, method)(url, headers=auth(candidate))
+    assert response.status_code == 403
+
+
+def test_admin_can_export(client, admin):
+    response = client.get('/api/admin/scores/export', headers=auth(admin))
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).startswith('score_id,')
@@ -0,0 +1,27 @@
+from app import live
+from tests.conftest import auth
+
+
+def test_live_stream_requires_admin(client, candidate):
+    assert client.get('/api/admin/live').status_code == 401
+    assert client.get('/api/admin/live', headers=auth(candidate)).status_code == 403
+
+
+def test_closed_streams_give_their_slot_back(app, client, admin, monkeypatch):
+    monkeypatch.setitem(app.config, 'LIVE_MAX_STREAMS', 1)
+    headers = auth(admin)
+
+    # The body of a HEAD response is never read, only closed
+    response = client.head('/api/admin/live', headers=headers)
+    assert response.status_code == 200
+    response.close()
+    assert not live._listeners
+
+    response = client.get('/api/admin/live', headers=headers, buffered=False)
+    assert response.status_code == 200
+    assert client.get('/api/admin/live', headers=headers).status_code == 503
+    response.close()
+    assert not live._listeners
+    response = client.get('/api/admin/live', headers=headers, buffered=False)
+    assert response.status_code == 200
+    response.close()
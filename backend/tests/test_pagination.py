@@ -0,0 +1,31 @@
+import base64
+import json
+import pytest
+from tests.conftest import auth, make_quiz
+
+
+def cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def test_cursor_pages_through_a_listing(client, candidate):
+    first = make_quiz()
+    make_quiz(chapter=first.chapter)
+    headers = auth(candidate)
+
+    response = client.get('/api/user/quizzes?limit=1', headers=headers)
+    assert [quiz['id'] for quiz in response.get_json()] == [first.id]
+    next_page = client.get(f"/api/user/quizzes?limit=1&cursor={response.headers['X-Next-Cursor']}", headers=headers)
+    assert [quiz['id'] for quiz in next_page.get_json()] == [first.id + 1]
+
+
+@pytest.mark.parametrize('url', [
+    '/api/user/quizzes?cursor=not-a-cursor',
+    '/api/user/quizzes?cursor=' + cursor([1, 2]),
+    '/api/user/quizzes?cursor=' + cursor({'id': 1}),
+    '/api/user/scores?cursor=' + cursor(['yesterday', 1]),
+])
+def test_malformed_cursor_is_rejected(client, candidate, url):
+    response = client.get(url, headers=auth(candidate))
+    assert response.status_code == 400
+    assert response.get_json() == {'message': 'Invalid cursor'}
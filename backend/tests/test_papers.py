@@ -0,0 +1,73 @@
+from app.models import QuizDraw, Score, db
+from app.papers import attempt_seed, draw_paper
+from app.quiz_cache import AnswerKey
+from tests.conftest import auth, make_quiz
+
+
+def bank_key(size=10, draw_count=5):
+    question_ids = list(range(100, 100 + size))
+    correct = [i % 4 + 1 for i in range(size)]
+    marks = [i % 3 + 1 for i in range(size)]
+    return AnswerKey(1, question_ids, correct, marks, sum(marks), draw_count=draw_count, shuffle_options=True)
+
+
+def test_draw_is_reproducible_per_seed():
+    key = bank_key()
+    first = draw_paper(key, attempt_seed(1, 7, 'nonce'))
+    again = draw_paper(key, attempt_seed(1, 7, 'nonce'))
+    other = draw_paper(key, attempt_seed(1, 7, 'other'))
+    assert (first.question_ids, first.orders) == (again.question_ids, again.orders)
+    assert (first.question_ids, first.orders) != (other.question_ids, other.orders)
+    assert len(first.question_ids) == 5 and len(set(first.question_ids)) == 5
+    assert all(sorted(order) == [1, 2, 3, 4] for order in first.orders)
+
+
+def test_shown_answers_map_back_to_original_options():
+    key = bank_key()
+    paper = draw_paper(key, attempt_seed(1, 7, 'nonce'))
+    shown_correct = paper.correct_answers(key)
+
+    assert key.score(paper.to_original(shown_correct)) == paper.total_marks
+    original = paper.to_original(shown_correct)
+    for question_id, option in original.items():
+        assert option == key.correct_options[key.index[question_id]]
+
+    shown_wrong = {question_id: option % 4 + 1 for question_id, option in shown_correct.items()}
+    assert key.score(paper.to_original(shown_wrong)) == 0
+
+
+def test_off_paper_answers_are_dropped():
+    key = bank_key()
+    paper = draw_paper(key, attempt_seed(1, 7, 'nonce'))
+    off_paper = next(str(question_id) for question_id in key.question_ids if question_id not in paper.question_ids)
+    assert paper.to_original({off_paper: 1}) == {}
+
+
+def test_submit_scores_shuffled_paper(client, candidate):
+    quiz = make_quiz(questions=8)
+    db.session.add(QuizDraw(quiz_id=quiz.id, question_count=4, shuffle_options=True))
+    db.session.commit()
+    correct = {str(question.id): question.correct_option for question in quiz.questions}
+    options = {question.id: [question.option1, question.option2, question.option3, question.option4] for question in quiz.questions}
+    headers = auth(candidate)
+
+    started = client.get(f'/api/quiz/{quiz.id}/start', headers=headers).get_json()
+    assert len(started['questions']) == 4
+    # Pick the shown option carrying the text of the original correct option
+    answers = {}
+    for question in started['questions']:
+        text = options[question['id']][correct[str(question['id'])] - 1]
+        shown = [question['option1'], question['option2'], question['option3'], question['option4']]
+        answers[str(question['id'])] = shown.index(text) + 1
+
+    response = client.post(f'/api/quiz/{quiz.id}/submit', headers=headers, json={
+        'answers': answers, 'attempt_token': started['attempt_token']
+    })
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['score']['total_scored'] == body['score']['total_marks'] == 4
+    assert body['correct_answers'] == answers
+
+    score = db.session.get(Score, body['score']['id'])
+    assert score.answers == {question_id: correct[question_id] for question_id in answers}
+    assert score.paper.question_ids == [question['id'] for question in started['questions']]
@@ -0,0 +1,30 @@
+from datetime import datetime
+from flask import current_app
+from app.cache import redis_client
+from app.models import db
+from app.prewarm import prewarm_quizzes
+from tests.conftest import auth, make_quiz
+
+
+def catalog_ttls():
+    return {key: redis_client.ttl(key) for key in redis_client.scan_iter('catalog:v*')}
+
+
+def test_warm_catalog_outlives_the_interval(client, candidate):
+    quiz = make_quiz()
+    quiz.date_of_quiz = datetime.utcnow()
+    db.session.commit()
+
+    assert prewarm_quizzes() == [quiz.id]
+    ttls = catalog_ttls()
+    assert ttls and min(ttls.values()) > current_app.config['PREWARM_INTERVAL']
+
+    # A later run extends entries that are still cached
+    for key in ttls:
+        redis_client.expire(key, 5)
+    prewarm_quizzes()
+    assert min(catalog_ttls().values()) > current_app.config['PREWARM_INTERVAL']
+
+    # The SPA's unpaged listing is served from the warm entry
+    client.get('/api/user/quizzes', headers=auth(candidate))
+    assert catalog_ttls().keys() == ttls.keys()
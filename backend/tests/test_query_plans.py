@@ -0,0 +1,9 @@
+from app.migrations import check_query_plans, upgrade_schema
+
+
+def test_hot_queries_use_indexes():
+    assert check_query_plans() == {}
+
+
+def test_upgrade_schema_is_idempotent():
+    assert upgrade_schema() == []
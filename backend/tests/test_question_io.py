@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+from app.models import Question, Quiz, db
+from app.question_io import validate_row, import_questions, ImportFailed, ImportInterrupted
+from tests.conftest import make_quiz
+
+ROW = {'question_statement': 'q', 'option1': 'a', 'option2': 'b', 'option3': 'c', 'option4': 'd', 'correct_option': '2'}
+
+
+@pytest.mark.parametrize('marks, expected', [(None, 1), ('', 1), ('0', 0), (0, 0), ('3', 3)])
+def test_marks_default_only_when_missing(marks, expected):
+    values, error = validate_row(dict(ROW, marks=marks))
+    assert error is None
+    assert values['marks'] == expected
+
+
+@pytest.mark.parametrize('marks, message', [('-1', 'marks must not be negative'), ('x', 'correct_option and marks must be integers')])
+def test_invalid_marks_are_rejected(marks, message):
+    assert validate_row(dict(ROW, marks=marks)) == (None, message)
+
+
+def rows(count, check=None):
+    for line_no in range(1, count + 1):
+        if check:
+            check()
+        yield line_no, dict(ROW, question_statement=f'q{line_no}', marks='2')
+
+
+def test_upload_is_read_before_any_write():
+    quiz = make_quiz(questions=0)
+    quiz_id = quiz.id
+    db.session.commit()
+
+    def no_open_transaction():
+        assert not db.session().in_transaction()
+
+    assert import_questions(quiz_id, rows(5, no_open_transaction), chunk_size=2) == 5
+    assert Question.query.filter_by(quiz_id=quiz_id).count() == 5
+    assert db.session.get(Quiz, quiz_id).total_marks == 10
+
+
+def test_invalid_row_imports_nothing():
+    quiz = make_quiz(questions=0)
+    bad = list(rows(3)) + [(4, dict(ROW, correct_option='9'))]
+    with pytest.raises(ImportFailed) as failed:
+        import_questions(quiz.id, iter(bad), chunk_size=2)
+    assert failed.value.errors == [{'line': 4, 'error': 'correct_option must be 1, 2, 3 or 4'}]
+    assert Question.query.count() == 0
+
+
+def test_each_chunk_commits_with_its_marks(monkeypatch):
+    quiz = make_quiz(questions=0)
+    quiz_id = quiz.id
+    execute = db.session.execute
+    calls = []
+
+    def failing_third_chunk(statement, *args, **kwargs):
+        if args and isinstance(args[0], list):
+            calls.append(len(args[0]))
+            if len(calls) == 3:
+                raise OperationalError('insert', {}, Exception('database is locked'))
+        return execute(statement, *args, **kwargs)
+
+    monkeypatch.setattr(db.session, 'execute', failing_third_chunk)
+    with pytest.raises(ImportInterrupted) as interrupted:
+        import_questions(quiz_id, rows(5), chunk_size=2)
+    monkeypatch.undo()
+
+    assert interrupted.value.imported == 4
+    assert Question.query.filter_by(quiz_id=quiz_id).count() == 4
+    assert db.session.get(Quiz, quiz_id).total_marks == 8
@@ -0,0 +1,18 @@
+from tests.conftest import auth, make_quiz
+
+
+def test_chapter_and_subject_renames_reach_cached_papers(client, admin, candidate):
+    quiz = make_quiz()
+    url = f'/api/quiz/{quiz.id}/start'
+    headers = auth(candidate)
+
+    def names():
+        paper = client.get(url, headers=headers).get_json()['quiz']
+        return {name: paper[name] for name in ('chapter_name', 'subject_name')}
+
+    assert names() == {'chapter_name': 'Chapter', 'subject_name': 'Subject'}
+
+    client.put(f'/api/admin/chapters/{quiz.chapter_id}', headers=auth(admin), json={'name': 'Algebra'})
+    assert names()['chapter_name'] == 'Algebra'
+    client.put(f'/api/admin/subjects/{quiz.chapter.subject_id}', headers=auth(admin), json={'name': 'Maths'})
+    assert names()['subject_name'] == 'Maths'
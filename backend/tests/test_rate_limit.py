@@ -0,0 +1,68 @@
+import pytest
+from app.cache import redis_client
+from app.rate_limit import take
+
+
+def rewind(key, seconds):
+    """Pretend the bucket was last touched `seconds` earlier"""
+    redis_client.hset(key, 'ts', float(redis_client.hget(key, 'ts')) - seconds)
+
+
+def test_bucket_allows_burst_then_limits():
+    bucket = ('ratelimit:test:user:1', 10, 2)
+    assert take([bucket])[0]
+    assert take([bucket])[0]
+    allowed, retry_after, blocked = take([bucket])
+    assert not allowed
+    assert blocked == 0
+    assert retry_after == pytest.approx(0.1, abs=0.05)
+
+
+def test_bucket_refills_with_time_up_to_burst():
+    bucket = ('ratelimit:test:user:1', 2, 3)
+    for _ in range(3):
+        assert take([bucket])[0]
+    assert not take([bucket])[0]
+
+    rewind(bucket[0], 1)
+    assert take([bucket])[0]
+    assert take([bucket])[0]
+    assert not take([bucket])[0]
+
+    # A long pause refills to the burst, never beyond it
+    rewind(bucket[0], 60)
+    for _ in range(3):
+        assert take([bucket])[0]
+    assert not take([bucket])[0]
+
+
+def test_denied_request_takes_from_no_bucket():
+    roomy = ('ratelimit:test:ip:1', 100, 100)
+    empty = ('ratelimit:test:user:1', 1, 1)
+    assert take([roomy, empty])[0]
+    allowed, _, blocked = take([roomy, empty])
+    assert not allowed and blocked == 1
+    assert float(redis_client.hget(roomy[0], 'tokens')) == pytest.approx(99, abs=0.1)
+
+
+def test_policy_overrides_merge_into_defaults():
+    from app.rate_limit import merge_policies, DEFAULT_POLICIES
+    merged = merge_policies('{"quiz": {"user": [1, 2]}, "reports": {"ip": [3, 4]}}')
+    assert merged['quiz'] == {'user': [1, 2], 'ip': DEFAULT_POLICIES['quiz']['ip']}
+    assert merged['reports'] == {'ip': [3, 4]}
+    assert merge_policies(None) == DEFAULT_POLICIES
+
+
+def test_requests_use_policies_added_by_overrides(app, client, monkeypatch):
+    from app import rate_limit
+    # A blueprint with no default policy, given one through RATE_LIMIT_POLICIES
+    monkeypatch.delitem(rate_limit.DEFAULT_POLICIES, 'user')
+    monkeypatch.setitem(app.config, 'RATE_LIMIT_ENABLED', True)
+    monkeypatch.setitem(app.extensions, 'rate_limit_policies', rate_limit.merge_policies(
+        '{"user": {"ip": [0.001, 1]}}'
+    ))
+
+    assert client.get('/api/user/quizzes').status_code != 429
+    response = client.get('/api/user/quizzes')
+    assert response.status_code == 429
+    assert redis_client.exists('ratelimit:user:ip:127.0.0.1')
@@ -0,0 +1,77 @@
+from app.models import Subject, Chapter, Quiz, Score, db
+from tests.conftest import auth, make_quiz
+
+
+def test_archived_rows_are_left_out_of_queries():
+    quiz = make_quiz()
+    chapter = quiz.chapter
+    archived = Chapter(name='Archived', subject=chapter.subject, is_active=False)
+    db.session.add(archived)
+    db.session.commit()
+    subject_id = chapter.subject_id
+    db.session.expire_all()
+
+    assert [row.id for row in Chapter.query.all()] == [chapter.id]
+    assert {row.id for row in Chapter.with_archived()} == {chapter.id, archived.id}
+    # Relationship loads and joins are filtered too
+    assert [row.id for row in db.session.get(Subject, subject_id).chapters] == [chapter.id]
+    assert Quiz.query.join(Chapter).filter(Chapter.id == archived.id).count() == 0
+
+
+def test_archived_parent_hides_quizzes(client, candidate):
+    quiz = make_quiz()
+    quiz_id = quiz.id
+    quiz.chapter.subject.is_active = False
+    db.session.commit()
+
+    assert Quiz.query.count() == 1
+    assert Quiz.available().count() == 0
+    assert client.get('/api/user/quizzes', headers=auth(candidate)).get_json() == []
+    assert client.get(f'/api/quiz/{quiz_id}/start', headers=auth(candidate)).status_code == 404
+
+
+def test_admin_listing_includes_archived_on_request(client, admin):
+    quiz = make_quiz()
+    quiz.is_active = False
+    db.session.commit()
+
+    assert client.get('/api/admin/quizzes', headers=auth(admin)).get_json() == []
+    listing = client.get('/api/admin/quizzes?include_archived=true', headers=auth(admin)).get_json()
+    assert [(row['id'], row['is_active']) for row in listing] == [(quiz.id, False)]
+
+
+def test_rows_of_archived_parents_still_serialize(candidate):
+    quiz = make_quiz()
+    score = Score(quiz=quiz, user_id=candidate.id, total_scored=1, total_marks=3)
+    db.session.add(score)
+    chapter = quiz.chapter
+    chapter.subject.is_active = False
+    quiz.is_active = False
+    db.session.commit()
+    db.session.expire_all()
+
+    assert db.session.get(Score, score.id).to_dict()['quiz_title'] == 'Quiz'
+    quiz = Quiz.with_archived().one()
+    assert (quiz.to_dict()['chapter_name'], quiz.to_dict()['subject_name']) == ('Chapter', 'Subject')
+    assert Chapter.query.one().to_dict()['subject_name'] == 'Subject'
+    # Collections still leave archived rows out
+    assert Chapter.query.one().quizzes == []
+
+
+def test_admin_edits_and_deletes_archived_rows(client, admin):
+    quiz = make_quiz()
+    subject_id, chapter_id, quiz_id = quiz.chapter.subject_id, quiz.chapter_id, quiz.id
+    headers = auth(admin)
+    assert client.get('/api/admin/dashboard/stats', headers=headers).get_json()['total_subjects'] == 1
+    assert client.delete(f'/api/admin/subjects/{subject_id}', headers=headers).status_code == 200
+    assert client.delete(f'/api/admin/quizzes/{quiz_id}', headers=headers).status_code == 200
+
+    response = client.put(f'/api/admin/quizzes/{quiz_id}', headers=headers, json={'title': 'Renamed'})
+    assert response.status_code == 200 and response.get_json()['subject_name'] == 'Subject'
+    response = client.put(f'/api/admin/subjects/{subject_id}', headers=headers, json={'name': 'Old subject'})
+    assert response.status_code == 200
+    assert client.put(f'/api/admin/chapters/{chapter_id}', headers=headers, json={'name': 'x'}).status_code == 200
+    # Deleting again leaves the counters alone
+    assert client.delete(f'/api/admin/subjects/{subject_id}', headers=headers).status_code == 200
+    assert client.get('/api/admin/dashboard/stats', headers=headers).get_json()['total_subjects'] == 0
+    assert client.put('/api/admin/quizzes/999', headers=headers, json={}).status_code == 404
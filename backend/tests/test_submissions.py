@@ -0,0 +1,101 @@
+import json
+import pytest
+import redis
+from app import submissions
+from app.cache import redis_client
+from app.models import Score, SubmissionReceipt
+from app.submissions import (
+    QUEUE_KEY, FAILED_KEY, DRAIN_LOCK_KEY, SCHEDULED_KEY, enqueue_submission, drain_submission_queue, submission_status
+)
+from tests.conftest import make_quiz
+
+
+@pytest.fixture(autouse=True)
+def no_celery():
+    # The tests drain the queue themselves
+    redis_client.set(SCHEDULED_KEY, 1)
+
+
+def enqueue(quiz, user, answers=None):
+    return enqueue_submission(quiz.id, user.id, 1, quiz.total_marks, 5, answers or {})
+
+
+def test_drain_persists_each_receipt_once(candidate):
+    quiz = make_quiz()
+    attempt = enqueue(quiz, candidate)
+    # A drain that committed but died before trimming leaves the attempt queued twice
+    redis_client.rpush(QUEUE_KEY, redis_client.lindex(QUEUE_KEY, 0))
+
+    assert drain_submission_queue() == 1
+    assert Score.query.count() == 1
+    status = submission_status(attempt['receipt'])
+    assert status['status'] == 'persisted'
+
+    redis_client.rpush(QUEUE_KEY, json.dumps(attempt))
+    assert drain_submission_queue() == 0
+    assert Score.query.count() == 1
+    assert submission_status(attempt['receipt'])['score_id'] == status['score_id']
+    assert redis_client.llen(QUEUE_KEY) == 0
+
+
+def test_bad_attempt_does_not_block_the_queue(candidate):
+    quiz = make_quiz()
+    good = enqueue(quiz, candidate)
+    bad = dict(good, receipt='bad', quiz_id=None)
+    redis_client.rpush(QUEUE_KEY, json.dumps(bad))
+    later = enqueue(quiz, candidate)
+
+    assert drain_submission_queue() == 2
+    assert {receipt for receipt, in SubmissionReceipt.query.with_entities(SubmissionReceipt.receipt)} == {
+        good['receipt'], later['receipt']
+    }
+    assert redis_client.llen(QUEUE_KEY) == 0
+    assert json.loads(redis_client.lindex(FAILED_KEY, 0))['receipt'] == 'bad'
+    assert submission_status('bad')['status'] == 'failed'
+
+
+def test_drain_skips_while_locked_and_releases_its_lock(candidate):
+    quiz = make_quiz()
+    enqueue(quiz, candidate)
+    redis_client.set(DRAIN_LOCK_KEY, 'other drain')
+    assert drain_submission_queue() == 0
+
+    redis_client.delete(DRAIN_LOCK_KEY)
+    assert drain_submission_queue() == 1
+    assert redis_client.get(DRAIN_LOCK_KEY) is None
+
+
+def test_enqueue_survives_scheduling_failure(candidate, monkeypatch):
+    quiz = make_quiz()
+    redis_client.delete(SCHEDULED_KEY)
+
+    def unavailable(*args, **kwargs):
+        raise redis.ConnectionError('unavailable')
+
+    monkeypatch.setattr(submissions.redis_client, 'set', unavailable)
+    attempt = enqueue(quiz, candidate)
+    assert submission_status(attempt['receipt'])['status'] == 'queued'
+
+
+def test_drain_that_lost_its_lock_leaves_the_queue(candidate, monkeypatch):
+    quiz = make_quiz()
+    first = enqueue(quiz, candidate)
+    save_batch = submissions._save_batch
+
+    def lock_taken_over(attempts):
+        # The lock expires mid-batch and another drain takes it, then a new attempt arrives
+        redis_client.set(DRAIN_LOCK_KEY, 'other drain')
+        enqueue(quiz, candidate)
+        return save_batch(attempts)
+
+    monkeypatch.setattr(submissions, '_save_batch', lock_taken_over)
+    assert drain_submission_queue() == 1
+    assert redis_client.llen(QUEUE_KEY) == 2
+    assert redis_client.get(DRAIN_LOCK_KEY) == 'other drain'
+
+    monkeypatch.setattr(submissions, '_save_batch', save_batch)
+    redis_client.delete(DRAIN_LOCK_KEY)
+    assert drain_submission_queue() == 1
+    assert redis_client.llen(QUEUE_KEY) == 0
+    assert Score.query.count() == 2
+    assert submission_status(first['receipt'])['status'] == 'persisted'
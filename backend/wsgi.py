@@ -0,0 +1,5 @@
+from app import create_app
+
+# Production entry point, served by gunicorn (settings in gunicorn.conf.py):
+#   gunicorn -c gunicorn.conf.py wsgi:app
+app = create_app()